@@ -0,0 +1,155 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .accuracy import format_table, run_accuracy, solver_configs
+from .suite import BENCHMARKS, compare_results, run_benchmarks
+from .workloads import WORKLOADS, Workload
+
+
+def _workloads(args: argparse.Namespace) -> List[Workload]:
+    if args.T or args.W or args.k or args.channels or args.n_fits:
+        base = WORKLOADS[args.workload[0]]
+        return [
+            Workload(
+                T=T,
+                W=W,
+                k=k,
+                channels=channels,
+                n_fits=args.n_fits or base.n_fits,
+            )
+            for T in args.T or [base.T]
+            for W in args.W or [base.W]
+            for k in args.k or [base.k]
+            for channels in args.channels or [base.channels]
+        ]
+    return [WORKLOADS[name] for name in args.workload]
+
+
+def run(args: argparse.Namespace) -> int:
+    results = run_benchmarks(
+        _workloads(args), args.benchmark, args.repeat, log=print
+    )
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Saved results to {args.output}")
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    baseline = json.loads(args.baseline.read_text())
+    current = json.loads(args.current.read_text())
+    comparisons = compare_results(
+        baseline, current, args.threshold, args.statistic
+    )
+    if not comparisons:
+        print("No benchmarks in common")
+        return 1
+
+    width = max(len(comparison.key) for comparison in comparisons)
+    print(f"{'benchmark':<{width}}  baseline    current   ratio")
+    for comparison in comparisons:
+        flag = "  SLOWER" if comparison.regressed else ""
+        print(
+            f"{comparison.key:<{width}}  "
+            f"{comparison.baseline_s * 1e3:8.2f}ms "
+            f"{comparison.current_s * 1e3:8.2f}ms "
+            f"{comparison.ratio:6.2f}x{flag}"
+        )
+    n_regressed = sum(comparison.regressed for comparison in comparisons)
+    print(f"{n_regressed} of {len(comparisons)} benchmarks slowed down")
+    return 1 if n_regressed else 0
+
+
+def accuracy(args: argparse.Namespace) -> int:
+    rows = run_accuracy(
+        args.config,
+        args.n_synthetic,
+        args.intensity_noise,
+        log=print,
+        reference=args.reference,
+    )
+    print(format_table(rows))
+    if args.output is not None:
+        args.output.write_text(json.dumps(rows, indent=2))
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time mms_nirs on synthetic recordings",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument(
+        "-o", "--output", type=Path, default=Path("benchmark.json")
+    )
+    run_parser.add_argument(
+        "--workload",
+        nargs="+",
+        choices=list(WORKLOADS),
+        default=["default"],
+        help="Preset sizes. With size options, the first fills in the rest",
+    )
+    run_parser.add_argument(
+        "--benchmark", nargs="+", choices=list(BENCHMARKS), default=None
+    )
+    run_parser.add_argument("--repeat", type=int, default=5)
+    for name in ("T", "W", "k", "channels"):
+        run_parser.add_argument(f"--{name}", type=int, nargs="+")
+    run_parser.add_argument("--n-fits", type=int, default=None)
+    run_parser.set_defaults(run=run)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Flag slowdowns against a baseline"
+    )
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown flagged, e.g. 0.1 for 10%%",
+    )
+    compare_parser.add_argument(
+        "--statistic", choices=["min_s", "median_s"], default="min_s"
+    )
+    compare_parser.set_defaults(run=compare)
+
+    accuracy_parser = subparsers.add_parser(
+        "accuracy",
+        help="Compare BRUNO configurations' errors and throughput",
+    )
+    accuracy_parser.add_argument(
+        "--config", nargs="+", choices=list(solver_configs()), default=None
+    )
+    accuracy_parser.add_argument(
+        "--n-synthetic",
+        type=int,
+        default=10,
+        help="Synthetic frames fitted per boundary condition",
+    )
+    accuracy_parser.add_argument("--intensity-noise", type=float, default=1e-4)
+    accuracy_parser.add_argument(
+        "--reference",
+        choices=list(solver_configs()),
+        default=None,
+        help="Also report stO2 differences to this configuration",
+    )
+    accuracy_parser.add_argument("-o", "--output", type=Path, default=None)
+    accuracy_parser.set_defaults(run=accuracy)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
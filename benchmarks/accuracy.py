@@ -0,0 +1,361 @@
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from mms_nirs.BRUNO import (
+    Boundaries,
+    BoundaryType,
+    SyntheticRecording,
+    calc_values,
+    calc_values_multistart,
+    physiological_trajectory,
+)
+from mms_nirs.BRUNO.backends import NUMBA_AVAILABLE
+from mms_nirs.profiling import Profiler
+
+FIXTURE_DIR = Path(__file__).parent.parent / "tests" / "BRUNO" / "fixtures"
+
+# calc_values results of the original MATLAB implementation on the fixture
+# recording, as asserted in tests/BRUNO/test_calc_values.py
+MATLAB_REFERENCE = {
+    (BoundaryType.ZBC, None): (
+        84.034715681079630,
+        [0.999231368648997, 3.88496795362238, 20.44887963729289]
+        + [0.132585802300888, 2.555661423244912],
+    ),
+    (BoundaryType.ZBC, 45.0): (
+        84.034715681079630,
+        [0.999231368648997, 3.88496795362238, 20.44887963729289]
+        + [0.132585802300888, 2.555661423244912],
+    ),
+    (BoundaryType.EBC, None): (
+        88.512150155916840,
+        [0.970000000000045, 3.879809932233005, 29.89335027521266]
+        + [0.281392552581535, 1.806582390291361],
+    ),
+    (BoundaryType.EBC, 45.0): (
+        87.030305470331020,
+        [0.970000000000008, 3.884161902993422, 26.063821020645683]
+        + [0.228394781489393, 1.96834071990883],
+    ),
+}
+
+
+@dataclass
+class Case:
+    """A slope to fit and the stO2 and coefficients it should give"""
+
+    dataset: str
+    slope: NDArray
+    extinction: NDArray
+    wavelengths: NDArray
+    boundary_condition_type: BoundaryType
+    distance: float
+    distance_max: Optional[float]
+    stO2: float
+    coefficients: NDArray
+
+
+def fixture_cases() -> List[Case]:
+    """The fixture recording against the MATLAB results"""
+    slope = np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=",")
+    extinction = np.genfromtxt(FIXTURE_DIR / "extinctions.csv", delimiter=",")
+    wavelengths = np.genfromtxt(FIXTURE_DIR / "wavelengths.csv", delimiter=",")
+    return [
+        Case(
+            "matlab",
+            slope,
+            extinction,
+            wavelengths,
+            boundary,
+            22.5,
+            distance_max,
+            stO2,
+            np.array(coefficients),
+        )
+        for (boundary, distance_max), (
+            stO2,
+            coefficients,
+        ) in MATLAB_REFERENCE.items()
+    ]
+
+
+def synthetic_cases(
+    n_frames: int = 10,
+    intensity_noise: float = 1e-4,
+    boundary_condition_type: BoundaryType = BoundaryType.ZBC,
+    seed: int = 0,
+) -> List[Case]:
+    """Slopes simulated from known parameters
+
+    The ground truth is the simulated parameters. Slopes are regressed from
+    noisy intensities at 20 to 35 mm, so even a perfect solver has a
+    non-zero error that grows with `intensity_noise`.
+    """
+    distances = np.array([20.0, 25.0, 30.0, 35.0])
+    recording = SyntheticRecording(
+        distances,
+        boundary_condition_type,
+        intensity_noise=intensity_noise,
+        seed=seed,
+    )
+    # One frame a second samples the whole haemoglobin oscillation
+    parameters = physiological_trajectory(oscillation=0.3, seed=seed)(
+        0, n_frames, 1.0
+    )
+    slopes = recording.measured_slopes(recording.intensities(parameters))
+    return [
+        Case(
+            f"synthetic-{boundary_condition_type.name}",
+            slope,
+            recording.extinction,
+            recording.wavelengths,
+            boundary_condition_type,
+            float(distances.mean()),
+            None,
+            stO2,
+            coefficients,
+        )
+        for slope, stO2, coefficients in zip(
+            slopes, parameters.stO2, parameters.coefficients
+        )
+    ]
+
+
+@dataclass
+class SolverConfig:
+    """A way of running BRUNO, returning (stO2, coefficients) for a case"""
+
+    name: str
+    fit: Callable[[Case], tuple]
+
+
+def _calc_values(**options) -> Callable[[Case], tuple]:
+    def fit(case: Case) -> tuple:
+        stO2, coefficients, *_ = calc_values(
+            case.slope,
+            case.extinction,
+            case.wavelengths,
+            Boundaries.boundaries,
+            case.boundary_condition_type,
+            case.distance,
+            case.distance_max,
+            **options,
+        )
+        return stO2, coefficients
+
+    return fit
+
+
+def _multistart(**options) -> Callable[[Case], tuple]:
+    def fit(case: Case) -> tuple:
+        result = calc_values_multistart(
+            case.slope,
+            case.extinction,
+            case.wavelengths,
+            Boundaries.boundaries,
+            case.boundary_condition_type,
+            case.distance,
+            case.distance_max,
+            n_workers=1,
+            seed=0,
+            **options,
+        )
+        return result.stO2, result.coefficients
+
+    return fit
+
+
+def solver_configs() -> Dict[str, SolverConfig]:
+    """Every configuration available in this environment, by name"""
+    backends = ["numpy"] + (["numba"] if NUMBA_AVAILABLE else [])
+    configs = (
+        [
+            SolverConfig(
+                f"calc_values[{backend}]", _calc_values(backend=backend)
+            )
+            for backend in backends
+        ]
+        + [
+            SolverConfig(
+                f"coarse-to-fine[{backend}]",
+                _calc_values(backend=backend, strides=(10, 1)),
+            )
+            for backend in backends
+        ]
+        + [
+            SolverConfig(
+                f"multistart-4[{backend}]",
+                _multistart(n_starts=4, backend=backend),
+            )
+            for backend in backends
+        ]
+    )
+    return {config.name: config for config in configs}
+
+
+@dataclass
+class AccuracyResult:
+    """Errors of one configuration on one dataset, fits that raised counted
+    as failures"""
+
+    config: str
+    dataset: str
+    stO2_error: NDArray
+    coefficient_error: NDArray
+    seconds: float
+    evaluations: int
+    failures: int = 0
+    # stO2 of every case, NaN where the fit failed
+    stO2: Optional[NDArray] = None
+
+    @property
+    def n_fits(self) -> int:
+        return len(self.stO2_error)
+
+    def summary(
+        self, reference: Optional["AccuracyResult"] = None
+    ) -> Dict[str, Any]:
+        """Absolute stO2 error (percentage points) and maximum relative
+        coefficient error of each fit, summarised. Given the result of a
+        reference configuration on the same cases, also the absolute stO2
+        difference to it"""
+
+        def stats(errors: NDArray, prefix: str) -> Dict[str, float]:
+            if errors.size == 0:
+                return {
+                    f"{prefix}_{s}": np.nan for s in ("median", "p95", "max")
+                }
+            return {
+                f"{prefix}_median": float(np.median(errors)),
+                f"{prefix}_p95": float(np.percentile(errors, 95)),
+                f"{prefix}_max": float(np.max(errors)),
+            }
+
+        attempted = self.n_fits + self.failures
+        row = {
+            "config": self.config,
+            "dataset": self.dataset,
+            "fits": self.n_fits,
+            "failures": self.failures,
+            **stats(self.stO2_error, "stO2_err"),
+            **stats(self.coefficient_error, "coef_rel_err"),
+            "fits_per_s": attempted / self.seconds,
+            "evals_per_fit": self.evaluations / attempted,
+        }
+        if reference is not None:
+            difference = np.abs(self.stO2 - reference.stO2)
+            row.update(stats(difference[~np.isnan(difference)], "stO2_diff"))
+        return row
+
+
+def evaluate(config: SolverConfig, cases: Sequence[Case]) -> AccuracyResult:
+    """Fit every case with a configuration, timing it and counting the
+    objective evaluations"""
+    # Warm up lambdified models and compiled kernels outside the timing
+    config.fit(cases[0])
+
+    stO2_error = []
+    coefficient_error = []
+    estimates = np.full(len(cases), np.nan)
+    failures = 0
+    with Profiler() as profiler:
+        start = time.perf_counter()
+        for i, case in enumerate(cases):
+            try:
+                stO2, coefficients = config.fit(case)
+            except RuntimeError:
+                failures += 1
+                continue
+            estimates[i] = stO2
+            stO2_error.append(abs(stO2 - case.stO2))
+            coefficient_error.append(
+                np.max(
+                    np.abs(coefficients - case.coefficients)
+                    / np.abs(case.coefficients)
+                )
+            )
+        seconds = time.perf_counter() - start
+
+    return AccuracyResult(
+        config.name,
+        cases[0].dataset,
+        np.array(stO2_error),
+        np.array(coefficient_error),
+        seconds,
+        profiler.counters.get("objective_evaluations", 0),
+        failures,
+        estimates,
+    )
+
+
+def run_accuracy(
+    configs: Optional[Sequence[str]] = None,
+    n_synthetic: int = 10,
+    intensity_noise: float = 1e-4,
+    log: Optional[Callable[[str], None]] = None,
+    reference: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Evaluate solver configurations on the MATLAB fixtures and synthetic
+    ground truth
+
+    Args:
+        configs (Optional[Sequence[str]], optional): Names of the
+        configurations to run. Defaults to None, running all available.
+        n_synthetic (int, optional): Synthetic frames per boundary
+        condition. Defaults to 10.
+        intensity_noise (float, optional): Noise of the synthetic
+        intensities. Defaults to 1e-4.
+        log (Optional[Callable[[str], None]], optional): Called as each
+        configuration finishes. Defaults to None.
+        reference (Optional[str], optional): Configuration every other is
+        compared to, adding stO2 difference columns, e.g. "calc_values[numba]"
+        to see what coarse-to-fine fitting changes. Defaults to None.
+
+    Returns:
+        List[Dict[str, Any]]: One summary row per configuration and dataset
+    """
+    available = solver_configs()
+    datasets = [fixture_cases()] + [
+        synthetic_cases(n_synthetic, intensity_noise, boundary)
+        for boundary in BoundaryType
+    ]
+    references = (
+        [None] * len(datasets)
+        if reference is None
+        else [evaluate(available[reference], cases) for cases in datasets]
+    )
+    rows = []
+    for name in configs or available:
+        for cases, baseline in zip(datasets, references):
+            rows.append(evaluate(available[name], cases).summary(baseline))
+            if log is not None:
+                log(f"{name} on {cases[0].dataset} done")
+    return rows
+
+
+def format_table(rows: Sequence[Dict[str, Any]]) -> str:
+    """Fixed width table of the rows returned by run_accuracy"""
+    columns = list(rows[0])
+    cells = [
+        [
+            f"{row[column]:.3g}"
+            if isinstance(row[column], float)
+            else str(row[column])
+            for column in columns
+        ]
+        for row in rows
+    ]
+    widths = [
+        max(len(column), *(len(row[i]) for row in cells))
+        for i, column in enumerate(columns)
+    ]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += [
+        "  ".join(c.rjust(w) for c, w in zip(row, widths)) for row in cells
+    ]
+    return "\n".join(lines)
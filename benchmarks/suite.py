@@ -0,0 +1,315 @@
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import scipy
+
+from mms_nirs.BRUNO import (
+    Boundaries,
+    BoundaryType,
+    QuantityType,
+    calc_values,
+    derivative_fit,
+    reduce_slopes,
+)
+from mms_nirs.BRUNO.backends import NUMBA_AVAILABLE
+from mms_nirs.BRUNO.calc_values import FIT_OPTIONS, WAVE_END, WAVE_START
+from mms_nirs.BRUNO.fminsearchbnd import fminsearchbnd
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+from mms_nirs.utils import calc_attenuation_slope, calc_attenuation_spectra
+
+from .workloads import (
+    Workload,
+    attenuation_spectra,
+    bruno_inputs,
+    intensity_spectra,
+    spectra_wavelengths,
+)
+
+# Number of objective evaluations timed by the derivative_fit benchmark
+N_EVALUATIONS = 200
+
+
+@dataclass
+class Benchmark:
+    """A public API timed on a workload
+
+    `setup` builds the inputs outside the timed region and returns the
+    zero-argument callable that is timed.
+    """
+
+    name: str
+    setup: Callable[[Workload], Callable[[], Any]]
+
+
+def _ucln_instance() -> UCLN:
+    defaults = DefaultValues()
+    return UCLN(
+        UCLNConstants(
+            defaults.extinction_coefficients,
+            defaults.wavelength_dependency,
+            3.0,
+            "adult_head",
+            (780, 900),
+        )
+    )
+
+
+def _ucln(workload: Workload) -> Callable[[], Any]:
+    ucln = _ucln_instance()
+    spectra = intensity_spectra(workload)
+    wavelengths = spectra_wavelengths(workload)
+    return lambda: [
+        ucln.calc_concentrations(channel, wavelengths) for channel in spectra
+    ]
+
+
+def _ucln_multichannel(workload: Workload) -> Callable[[], Any]:
+    ucln = _ucln_instance()
+    spectra = intensity_spectra(workload)
+    wavelengths = spectra_wavelengths(workload)
+    return lambda: ucln.calc_concentrations_multichannel(spectra, wavelengths)
+
+
+def _attenuation_spectra(workload: Workload) -> Callable[[], Any]:
+    spectra = intensity_spectra(workload)
+    return lambda: [
+        calc_attenuation_spectra(channel, channel[0]) for channel in spectra
+    ]
+
+
+def _attenuation_slope(workload: Workload) -> Callable[[], Any]:
+    attenuation = attenuation_spectra(workload)
+    distances = np.linspace(20.0, 35.0, workload.k)
+    return lambda: [
+        calc_attenuation_slope(channel, distances) for channel in attenuation
+    ]
+
+
+def _reduce_slopes(workload: Workload) -> Callable[[], Any]:
+    distances = np.linspace(20.0, 35.0, workload.k)
+    slopes = calc_attenuation_slope(
+        attenuation_spectra(workload)[0], distances
+    )
+    return lambda: [
+        reduce_slopes(slopes, factor=10, method=method)
+        for method in ("block", "ema", "decimate")
+    ]
+
+
+def _fit_arguments(workload: Workload):
+    slopes, extinction, wavelengths, distance = bruno_inputs(workload)
+    slope_diff = np.diff(slopes[0])
+    return (
+        BoundaryType.ZBC,
+        QuantityType.ATTENUATION_SLOPE,
+        slope_diff,
+        extinction,
+        wavelengths,
+        distance,
+        None,
+        WAVE_START,
+        WAVE_END,
+    )
+
+
+def _derivative_fit(workload: Workload) -> Callable[[], Any]:
+    arguments = _fit_arguments(workload)
+    param = Boundaries.boundaries[0].astype(np.float64)
+    return lambda: [
+        derivative_fit(param, *arguments) for _ in range(N_EVALUATIONS)
+    ]
+
+
+def _fminsearchbnd(workload: Workload) -> Callable[[], Any]:
+    arguments = _fit_arguments(workload)
+    boundaries = Boundaries.boundaries
+    return lambda: fminsearchbnd(
+        derivative_fit,
+        x0=boundaries[0],
+        LB=boundaries[1],
+        UB=boundaries[2],
+        func_args=arguments,
+        options=dict(FIT_OPTIONS),
+        tol=1e-10,
+    )
+
+
+def _calc_values(backend: str):
+    def setup(workload: Workload) -> Callable[[], Any]:
+        slopes, extinction, wavelengths, distance = bruno_inputs(workload)
+        return lambda: [
+            calc_values(
+                slope,
+                extinction,
+                wavelengths,
+                Boundaries.boundaries,
+                BoundaryType.ZBC,
+                distance,
+                backend=backend,
+            )
+            for slope in slopes
+        ]
+
+    return setup
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    benchmark.name: benchmark
+    for benchmark in [
+        Benchmark("UCLN.calc_concentrations", _ucln),
+        Benchmark("UCLN.calc_concentrations_multichannel", _ucln_multichannel),
+        Benchmark("calc_attenuation_spectra", _attenuation_spectra),
+        Benchmark("calc_attenuation_slope", _attenuation_slope),
+        Benchmark("reduce_slopes", _reduce_slopes),
+        Benchmark("derivative_fit", _derivative_fit),
+        Benchmark("fminsearchbnd", _fminsearchbnd),
+        Benchmark("calc_values", _calc_values("numpy")),
+    ]
+    + (
+        [Benchmark("calc_values[numba]", _calc_values("numba"))]
+        if NUMBA_AVAILABLE
+        else []
+    )
+}
+
+
+def result_key(name: str, params: Dict[str, int]) -> str:
+    sizes = ",".join(f"{key}={value}" for key, value in params.items())
+    return f"{name}[{sizes}]"
+
+
+def time_benchmark(
+    benchmark: Benchmark, workload: Workload, repeat: int
+) -> Dict[str, Any]:
+    """Time `repeat` runs of a benchmark, then measure its peak memory
+
+    Peak memory is measured in a separate run, as tracing allocations slows
+    them down.
+    """
+    run = benchmark.setup(workload)
+    # Warm up caches, e.g. lambdified models and compiled kernels
+    run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    return {
+        "name": benchmark.name,
+        "params": workload.params(),
+        "times_s": times,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_bytes": peak - baseline,
+    }
+
+
+def run_benchmarks(
+    workloads: Sequence[Workload],
+    names: Optional[Sequence[str]] = None,
+    repeat: int = 5,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """Time benchmarks on each workload
+
+    Args:
+        workloads (Sequence[Workload]): Sizes to run at
+        names (Optional[Sequence[str]], optional): Benchmarks to run.
+        Defaults to None, running all.
+        repeat (int, optional): Timed runs per benchmark. Defaults to 5.
+        log (Optional[Callable[[str], None]], optional): Called with a line
+        per finished benchmark. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: `metadata` describing the machine and `results`
+        keyed by `result_key`
+    """
+    benchmarks = [BENCHMARKS[name] for name in names or BENCHMARKS]
+    results: Dict[str, Any] = {}
+    for workload in workloads:
+        for benchmark in benchmarks:
+            result = time_benchmark(benchmark, workload, repeat)
+            key = result_key(benchmark.name, result["params"])
+            results[key] = result
+            if log is not None:
+                log(
+                    f"{key}: {result['median_s'] * 1e3:.2f} ms, "
+                    f"peak {result['peak_bytes'] / 2**20:.1f} MiB"
+                )
+    return {
+        "metadata": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "numba": NUMBA_AVAILABLE,
+        },
+        "results": results,
+    }
+
+
+@dataclass
+class Comparison:
+    key: str
+    baseline_s: float
+    current_s: float
+    threshold: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current_s / self.baseline_s
+
+    @property
+    def regressed(self) -> bool:
+        return self.ratio > 1 + self.threshold
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.1,
+    statistic: str = "min_s",
+) -> List[Comparison]:
+    """Compare the benchmarks present in both runs
+
+    Args:
+        baseline (Dict[str, Any]): Output of run_benchmarks to compare to
+        current (Dict[str, Any]): Output of run_benchmarks to check
+        threshold (float, optional): Relative slowdown flagged as a
+        regression. Defaults to 0.1.
+        statistic (str, optional): Timing compared, "min_s" or "median_s".
+        Defaults to "min_s", the least noisy.
+
+    Returns:
+        List[Comparison]: One entry per benchmark in both runs
+    """
+    return [
+        Comparison(
+            key,
+            baseline["results"][key][statistic],
+            result[statistic],
+            threshold,
+        )
+        for key, result in current["results"].items()
+        if key in baseline["results"]
+    ]
@@ -0,0 +1,112 @@
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+import numpy as np
+from numpy.typing import NDArray
+
+from mms_nirs.BRUNO import (
+    SyntheticRecording,
+    TissueParameters,
+    physiological_trajectory,
+)
+from mms_nirs.utils import ExtinctionCoefficients
+
+
+@dataclass(frozen=True)
+class Workload:
+    """Size of a synthetic recording
+
+    Attributes:
+        T: Number of timepoints
+        W: Number of spectrometer wavelengths
+        k: Number of source-detector distances
+        channels: Number of channels, each processed separately
+        n_fits: Number of attenuation slopes BRUNO fits. Fits take far
+        longer than the other stages so are sized separately
+    """
+
+    T: int
+    W: int
+    k: int
+    channels: int
+    n_fits: int
+
+    def params(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+WORKLOADS: Dict[str, Workload] = {
+    "smoke": Workload(T=20, W=256, k=2, channels=1, n_fits=1),
+    "default": Workload(T=1000, W=1024, k=4, channels=2, n_fits=5),
+    # An hour of 10 Hz recording on a 4 channel system
+    "production": Workload(T=36000, W=1024, k=4, channels=4, n_fits=20),
+}
+
+# Distances of the BRUNO test fixtures, mm
+DISTANCES = np.array([20.0, 25.0, 30.0, 35.0])
+
+
+def recording(workload: Workload, seed: int = 0) -> SyntheticRecording:
+    """Recording at `k` distances over `W` wavelengths of the extinction
+    table's range"""
+    table = ExtinctionCoefficients["wavelength"]
+    return SyntheticRecording(
+        np.linspace(DISTANCES[0], DISTANCES[-1], workload.k),
+        wavelengths=np.linspace(table.min(), table.max(), workload.W),
+        intensity_noise=1e-3,
+        seed=seed,
+    )
+
+
+def spectra_wavelengths(workload: Workload) -> NDArray:
+    return recording(workload).wavelengths
+
+
+def _parameters(n_frames: int, seed: int) -> TissueParameters:
+    return physiological_trajectory(seed=seed)(0, n_frames, 10.0)
+
+
+def intensity_spectra(workload: Workload, seed: int = 0) -> NDArray:
+    """`channels`x`T`x`W` spectra at the nearest distance"""
+    synthetic = recording(workload, seed)
+    parameters = _parameters(workload.T, seed)
+    return np.stack(
+        [
+            synthetic.intensities(parameters)[0]
+            for _ in range(workload.channels)
+        ]
+    )
+
+
+def attenuation_spectra(workload: Workload, seed: int = 0) -> NDArray:
+    """`channels`x`k`x`T`x`W` attenuation at each distance"""
+    synthetic = recording(workload, seed)
+    parameters = _parameters(workload.T, seed)
+    return np.stack(
+        [
+            np.log10(
+                synthetic.source_intensity / synthetic.intensities(parameters)
+            )
+            for _ in range(workload.channels)
+        ]
+    )
+
+
+def bruno_inputs(workload: Workload, seed: int = 0):
+    """Noisy attenuation slopes of `n_fits` frames
+
+    BRUNO only fits the extinction table's wavelengths, so these ignore `W`.
+
+    Returns:
+        tuple: `n_fits`x`W` slopes, extinction table and wavelengths in the
+        layout calc_values takes, and the mean distance
+    """
+    synthetic = SyntheticRecording(DISTANCES, intensity_noise=1e-4, seed=seed)
+    parameters = _parameters(workload.n_fits, seed)
+    slopes = synthetic.measured_slopes(synthetic.intensities(parameters))
+    return (
+        slopes,
+        synthetic.extinction,
+        synthetic.wavelengths,
+        float(DISTANCES.mean()),
+    )
@@ -1,5 +1,7 @@
 __all__ = [
     "calc_values",
+    "FitBudget",
+    "BudgetedFit",
     "smooth",
     "derivative_fit",
     "get_model",
@@ -8,9 +10,33 @@ __all__ = [
     "BoundaryType",
     "QuantityType",
     "Boundaries",
+    "calc_values_multistart",
+    "latin_hypercube_starts",
+    "MultiStartResult",
+    "BatchFitResult",
+    "calc_values_batch",
+    "FIT_DTYPE",
+    "FitCache",
+    "ResolutionContext",
+    "resolution_contexts",
+    "FrameScreen",
+    "ScreenResult",
+    "RejectReason",
+    "BatchCheckpoint",
+    "calc_values_checkpointed",
+    "SyntheticChunk",
+    "SyntheticRecording",
+    "TissueParameters",
+    "physiological_trajectory",
+    "ReducedSlopes",
+    "reduce_slopes",
+    "reduction_factor",
 ]
+from .batch import FIT_DTYPE, BatchFitResult, calc_values_batch
 from .boundaries import Boundaries
-from .calc_values import calc_values, smooth
+from .checkpoint import BatchCheckpoint, calc_values_checkpointed
+from .cache import FitCache
+from .calc_values import BudgetedFit, FitBudget, calc_values, smooth
 from .derivative_fit import (
     BoundaryType,
     QuantityType,
@@ -18,3 +44,17 @@ from .derivative_fit import (
     get_model,
 )
 from .model_types import ExtrapolatedBoundaryConditions, ZeroBoundaryConditions
+from .multiresolution import ResolutionContext, resolution_contexts
+from .screening import FrameScreen, RejectReason, ScreenResult
+from .synthetic import (
+    SyntheticChunk,
+    SyntheticRecording,
+    TissueParameters,
+    physiological_trajectory,
+)
+from .temporal import ReducedSlopes, reduce_slopes, reduction_factor
+from .multistart import (
+    MultiStartResult,
+    calc_values_multistart,
+    latin_hypercube_starts,
+)
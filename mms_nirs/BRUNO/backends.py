@@ -0,0 +1,555 @@
+import time
+import warnings
+from typing import Literal, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from ..profiling import count, profiled
+from .fminsearchbnd import BoundClass, get_bound_class
+
+try:
+    from numba import njit
+
+    NUMBA_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Identity decorator so the kernels below stay importable and run as
+        # plain NumPy code when numba isn't installed
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+Backend = Literal["numpy", "numba"]
+
+# Integer codes for BoundClass so the bound transforms can be compiled
+_BOUND_CODES = {
+    BoundClass.UNCONSTRAINED: 0,
+    BoundClass.LB: 1,
+    BoundClass.UB: 2,
+    BoundClass.BOTH: 3,
+    BoundClass.FIXED_VAR: 4,
+}
+
+_LOG10 = np.log(10)
+
+
+def resolve_backend(backend: Backend) -> Backend:
+    """Check a requested backend, falling back to NumPy without numba
+
+    Args:
+        backend (Backend): Requested backend, "numpy" or "numba"
+
+    Raises:
+        ValueError: Error if the backend isn't known
+
+    Returns:
+        Backend: Backend that will actually be used
+    """
+    if backend not in ("numpy", "numba"):
+        raise ValueError(
+            f"Unknown backend {backend}. Should be one of 'numpy' or 'numba'"
+        )
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        warnings.warn(
+            "numba is not installed, falling back to the numpy backend",
+            RuntimeWarning,
+            stacklevel=3,
+        )
+        return "numpy"
+    return backend
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~ Model kernels ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ #
+# Closed forms of the sympy models in model_types.py
+
+
+@njit(cache=True)
+def zbc_attenuation_slope_short(mu_s, mu_a, rho):
+    return (np.sqrt(3 * mu_s * mu_a) + 2 / rho) / _LOG10
+
+
+@njit(cache=True)
+def zbc_attenuation_slope_long(mu_s, mu_a, d_s, d_l):
+    return (
+        np.sqrt(3 * mu_s * mu_a) + 2 * (np.log(d_l / d_s) / (d_l - d_s))
+    ) / _LOG10
+
+
+@njit(cache=True)
+def _ebc_source_depths(mu_s, mu_a):
+    z0 = 1 / mu_s
+    D = 1.0 / (3 * (mu_a + mu_s))
+    zb = (1 + 0.493) / (1 - 0.493) * 2 * D
+    return z0, z0 + 2 * zb
+
+
+@njit(cache=True)
+def _ebc_reflectance(mu_s, mu_a, rho):
+    z0, z_image = _ebc_source_depths(mu_s, mu_a)
+    mueff = np.sqrt(3 * mu_a * mu_s)
+    r2 = np.sqrt(z_image**2 + rho**2)
+    return (
+        z0 * (mueff + 1.0 / rho) * np.exp(-mueff * rho) / rho**2
+        + z_image * (mueff + 1.0 / r2) * np.exp(-mueff * r2) / r2**2
+    ) / (4 * np.pi)
+
+
+@njit(cache=True)
+def ebc_attenuation_slope_short(mu_s, mu_a, rho):
+    z0, z_image = _ebc_source_depths(mu_s, mu_a)
+    mueff = np.sqrt(3 * mu_a * mu_s)
+    r2 = np.sqrt(z_image**2 + rho**2)
+    # d/dr of (mueff + 1/r) exp(-mueff r) / r^2
+    d_term1 = (
+        -np.exp(-mueff * rho)
+        * (mueff**2 + 3 * mueff / rho + 3 / rho**2)
+        / rho**2
+    )
+    d_term2 = (
+        -np.exp(-mueff * r2)
+        * (mueff**2 + 3 * mueff / r2 + 3 / r2**2)
+        / r2**2
+    )
+    d_reflectance = (z0 * d_term1 + z_image * d_term2 * rho / r2) / (4 * np.pi)
+    return -d_reflectance / (_ebc_reflectance(mu_s, mu_a, rho) * _LOG10)
+
+
+@njit(cache=True)
+def ebc_attenuation_slope_long(mu_s, mu_a, d_s, d_l):
+    return (
+        np.log10(_ebc_reflectance(mu_s, mu_a, d_s))
+        - np.log10(_ebc_reflectance(mu_s, mu_a, d_l))
+    ) / (d_l - d_s)
+
+
+@njit(cache=True)
+def attenuation_slope(mu_s, mu_a, is_ebc, d_s, d_l):
+    """Attenuation slope model. `d_l` <= 0 selects the short separation"""
+    if is_ebc:
+        if d_l > 0:
+            return ebc_attenuation_slope_long(mu_s, mu_a, d_s, d_l)
+        return ebc_attenuation_slope_short(mu_s, mu_a, d_s)
+    if d_l > 0:
+        return zbc_attenuation_slope_long(mu_s, mu_a, d_s, d_l)
+    return zbc_attenuation_slope_short(mu_s, mu_a, d_s)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~ Bound transforms ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ #
+# Compiled equivalents of fminsearchbnd.xtransform_to_(un)constrained
+
+
+@njit(cache=True)
+def to_unconstrained(x0, LB, UB, codes):
+    n_free = 0
+    for code in codes:
+        if code != 4:
+            n_free += 1
+    x0u = np.empty(n_free)
+    k = 0
+    for i in range(len(x0)):
+        code = codes[i]
+        if code == 0:
+            x0u[k] = x0[i]
+        elif code == 1:
+            x0u[k] = 0.0 if x0[i] <= LB[i] else np.sqrt(x0[i] - LB[i])
+        elif code == 2:
+            x0u[k] = 0.0 if x0[i] >= UB[i] else np.sqrt(UB[i] - x0[i])
+        elif code == 3:
+            if x0[i] <= LB[i]:
+                x0u[k] = -np.pi / 2
+            elif x0[i] >= UB[i]:
+                x0u[k] = np.pi / 2
+            else:
+                temp = 2 * (x0[i] - LB[i]) / (UB[i] - LB[i]) - 1
+                temp = min(max(temp, -1.0), 1.0)
+                x0u[k] = 2 * np.pi + np.arcsin(temp)
+        else:
+            continue
+        k += 1
+    return x0u
+
+
+@njit(cache=True)
+def to_constrained(xu, LB, UB, codes):
+    x = np.empty(len(codes))
+    k = 0
+    for i in range(len(codes)):
+        code = codes[i]
+        if code == 4:
+            x[i] = LB[i]
+            continue
+        if code == 0:
+            x[i] = xu[k]
+        elif code == 1:
+            x[i] = LB[i] + xu[k] ** 2
+        elif code == 2:
+            x[i] = UB[i] - xu[k] ** 2
+        else:
+            temp = ((np.sin(xu[k]) + 1) / 2) * (UB[i] - LB[i]) + LB[i]
+            x[i] = max(LB[i], min(UB[i], temp))
+        k += 1
+    return x
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~ Objective ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ #
+
+
+@njit(cache=True)
+def derivative_fit_window(
+    param,
+    extinction,
+    wavelengths,
+    slope_diff,
+    start_idx,
+    end_idx,
+    is_ebc,
+    d_s,
+    d_l,
+):
+    """Least squares of derivative_fit, evaluating the model on the window"""
+    water_fraction, hhb_fraction, hbo2_fraction, a, b = (
+        param[0],
+        param[1],
+        param[2],
+        param[3],
+        param[4],
+    )
+    stop = end_idx + 2
+    mu_a = water_fraction * extinction[start_idx:stop, 3] + _LOG10 * (
+        hhb_fraction * extinction[start_idx:stop, 1]
+        + hbo2_fraction * extinction[start_idx:stop, 2]
+    )
+    mu_s = a * (wavelengths[start_idx:stop] * 0.001) ** (-b)
+    model = attenuation_slope(mu_s, mu_a, is_ebc, d_s, d_l)
+
+    least_square = 0.0
+    for i in range(end_idx - start_idx + 1):
+        difference = (model[i + 1] - model[i]) - slope_diff[start_idx + i]
+        least_square += difference**2
+    return least_square
+
+
+@njit(cache=True)
+def _bounded_objective(
+    xu, LB, UB, codes, extinction, wavelengths, slope_diff, window, model
+):
+    return derivative_fit_window(
+        to_constrained(xu, LB, UB, codes),
+        extinction,
+        wavelengths,
+        slope_diff,
+        window[0],
+        window[1],
+        model[0] > 0,
+        model[1],
+        model[2],
+    )
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~ Nelder-Mead ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~ #
+# Port of scipy's non-adaptive Nelder-Mead so the whole loop is compiled
+
+
+@njit(cache=True)
+def _sort_simplex(sim, fsim):
+    ind = np.argsort(fsim)
+    return sim[ind], fsim[ind]
+
+
+@njit(cache=True)
+def _initial_simplex(x0u, nonzdelt, args):
+    zdelt = 0.00025
+    N = len(x0u)
+    sim = np.empty((N + 1, N))
+    sim[0] = x0u
+    for k in range(N):
+        y = x0u.copy()
+        if y[k] != 0:
+            y[k] = (1 + nonzdelt) * y[k]
+        else:
+            y[k] = zdelt
+        sim[k + 1] = y
+
+    fsim = np.empty(N + 1)
+    for k in range(N + 1):
+        fsim[k] = _bounded_objective(sim[k], *args)
+    sim, fsim = _sort_simplex(sim, fsim)
+    return sim, fsim
+
+
+@njit(cache=True)
+def _nelder_mead_iterate(
+    sim, fsim, iterations, fcalls, args, xatol, fatol, maxiter, maxfev
+):
+    """Iterate a sorted simplex until converged or out of iterations or
+    evaluations. The returned state can be passed back in to continue"""
+    rho, chi, psi, sigma = 1.0, 2.0, 0.5, 0.5
+    N = sim.shape[1]
+
+    while fcalls < maxfev and iterations < maxiter:
+        if (
+            np.max(np.abs(sim[1:] - sim[0])) <= xatol
+            and np.max(np.abs(fsim[0] - fsim[1:])) <= fatol
+        ):
+            return sim, fsim, iterations, fcalls, 0
+
+        xbar = np.zeros(N)
+        for j in range(N):
+            xbar += sim[j]
+        xbar /= N
+        xr = (1 + rho) * xbar - rho * sim[-1]
+        fxr = _bounded_objective(xr, *args)
+        fcalls += 1
+        doshrink = False
+
+        if fxr < fsim[0]:
+            xe = (1 + rho * chi) * xbar - rho * chi * sim[-1]
+            fxe = _bounded_objective(xe, *args)
+            fcalls += 1
+            if fxe < fxr:
+                sim[-1] = xe
+                fsim[-1] = fxe
+            else:
+                sim[-1] = xr
+                fsim[-1] = fxr
+        elif fxr < fsim[-2]:
+            sim[-1] = xr
+            fsim[-1] = fxr
+        elif fxr < fsim[-1]:
+            xc = (1 + psi * rho) * xbar - psi * rho * sim[-1]
+            fxc = _bounded_objective(xc, *args)
+            fcalls += 1
+            if fxc <= fxr:
+                sim[-1] = xc
+                fsim[-1] = fxc
+            else:
+                doshrink = True
+        else:
+            xcc = (1 - psi) * xbar + psi * sim[-1]
+            fxcc = _bounded_objective(xcc, *args)
+            fcalls += 1
+            if fxcc < fsim[-1]:
+                sim[-1] = xcc
+                fsim[-1] = fxcc
+            else:
+                doshrink = True
+
+        if doshrink:
+            for j in range(1, N + 1):
+                sim[j] = sim[0] + sigma * (sim[j] - sim[0])
+                fsim[j] = _bounded_objective(sim[j], *args)
+            fcalls += N
+
+        iterations += 1
+        sim, fsim = _sort_simplex(sim, fsim)
+
+    status = 1 if fcalls >= maxfev else 2
+    return sim, fsim, iterations, fcalls, status
+
+
+@njit(cache=True)
+def nelder_mead(
+    x0u,
+    LB,
+    UB,
+    codes,
+    extinction,
+    wavelengths,
+    slope_diff,
+    window,
+    model,
+    xatol,
+    fatol,
+    maxiter,
+    maxfev,
+    nonzdelt=0.05,
+):
+    args = (LB, UB, codes, extinction, wavelengths, slope_diff, window, model)
+    sim, fsim = _initial_simplex(x0u, nonzdelt, args)
+    sim, fsim, iterations, fcalls, status = _nelder_mead_iterate(
+        sim, fsim, 1, len(x0u) + 1, args, xatol, fatol, maxiter, maxfev
+    )
+    return sim[0].copy(), fsim[0], iterations, fcalls, status
+
+
+# Evaluations between clock checks of time limited fits, well under a
+# millisecond of compiled evaluations
+_EVALUATIONS_PER_CLOCK_CHECK = 32
+
+_MESSAGES = {
+    0: "Optimization terminated successfully.",
+    1: "Maximum number of function evaluations has been exceeded.",
+    2: "Maximum number of iterations has been exceeded.",
+    3: "Time limit has been exceeded.",
+}
+
+
+def _window_indices(
+    wavelengths: NDArray[np.float64], wave_start: float, wave_end: float
+) -> NDArray[np.int64]:
+    start_idx = np.argwhere(wavelengths == wave_start)
+    end_idx = np.argwhere(wavelengths == wave_end)
+
+    if (start_idx.shape != (1, 1)) or (end_idx.shape != (1, 1)):
+        raise ValueError("Couldn't find unique start and end wavelengths")
+
+    return np.array([start_idx[0][0], end_idx[0][0]], dtype=np.int64)
+
+
+def _model_parameters(
+    is_ebc: bool, distance: float, distance_max: Optional[float]
+) -> NDArray[np.float64]:
+    return np.array(
+        [float(is_ebc), distance, distance_max if distance_max else 0.0]
+    )
+
+
+def derivative_fit_objective(
+    param: NDArray[np.float64],
+    is_ebc: bool,
+    slope_diff: NDArray[np.float64],
+    extinction: NDArray[np.float64],
+    wavelengths: NDArray[np.float64],
+    distance: float,
+    distance_max: Optional[float] = None,
+    wave_start: float = 710.0,
+    wave_end: float = 900.0,
+) -> float:
+    """Compiled equivalent of derivative_fit for the attenuation slope"""
+    start_idx, end_idx = _window_indices(wavelengths, wave_start, wave_end)
+    _, d_s, d_l = _model_parameters(is_ebc, distance, distance_max)
+    return derivative_fit_window(
+        np.asarray(param, dtype=np.float64),
+        np.ascontiguousarray(extinction, dtype=np.float64),
+        np.ascontiguousarray(wavelengths, dtype=np.float64),
+        np.ascontiguousarray(slope_diff, dtype=np.float64),
+        start_idx,
+        end_idx,
+        is_ebc,
+        d_s,
+        d_l,
+    )
+
+
+@profiled("fminsearchbnd_attenuation_slope")
+def fminsearchbnd_attenuation_slope(
+    x0: NDArray[np.float64],
+    LB: NDArray[np.float64],
+    UB: NDArray[np.float64],
+    is_ebc: bool,
+    slope_diff: NDArray[np.float64],
+    extinction: NDArray[np.float64],
+    wavelengths: NDArray[np.float64],
+    distance: float,
+    distance_max: Optional[float] = None,
+    wave_start: float = 710.0,
+    wave_end: float = 900.0,
+    options: Optional[dict] = None,
+) -> OptimizeResult:
+    """Compiled equivalent of fminsearchbnd(derivative_fit, ...)
+
+    Args:
+        x0 (NDArray[np.float64]): Starting parameters
+        LB (NDArray[np.float64]): Lower bounds
+        UB (NDArray[np.float64]): Upper bounds
+        is_ebc (bool): Use extrapolated rather than zero boundary conditions
+        slope_diff (NDArray[np.float64]): Differential of slope
+        extinction (NDArray[np.float64]): Extinction co-efficients matrix
+        wavelengths (NDArray[np.float64]): W x 1 array of wavelengths
+        distance (float): (Minimal) source-detector distance
+        distance_max (Optional[float], optional): Maximal source-detector
+        distance. Defaults to None.
+        wave_start (float, optional): Start of fitting range. Defaults to 710.
+        wave_end (float, optional): End of fitting range. Defaults to 900.
+        options (Optional[dict], optional): Nelder-Mead options as accepted
+        by scipy, plus "initial_step" and "max_time" as taken by
+        fminsearchbnd. Defaults to None.
+
+    Returns:
+        OptimizeResult: Result with `x` in constrained space, the best
+        vertex if the evaluation, iteration or time budget ran out first,
+        flagged by `budget_exhausted`
+    """
+    options = options or {}
+    x0 = np.asarray(x0, dtype=np.float64).ravel()
+    LB = np.asarray(LB, dtype=np.float64).ravel()
+    UB = np.asarray(UB, dtype=np.float64).ravel()
+    codes = np.array(
+        [_BOUND_CODES[get_bound_class(lb, ub)] for lb, ub in zip(LB, UB)],
+        dtype=np.int64,
+    )
+
+    x0u = to_unconstrained(x0, LB, UB, codes)
+    extinction = np.ascontiguousarray(extinction, dtype=np.float64)
+    wavelengths = np.ascontiguousarray(wavelengths, dtype=np.float64)
+    slope_diff = np.ascontiguousarray(slope_diff, dtype=np.float64)
+    window = _window_indices(wavelengths, wave_start, wave_end)
+    model = _model_parameters(is_ebc, distance, distance_max)
+    xatol = float(options.get("xatol", 1e-4))
+    fatol = float(options.get("fatol", 1e-4))
+    maxiter = int(options.get("maxiter", 200 * len(x0)))
+    maxfev = int(options.get("maxfev", 200 * len(x0)))
+    initial_step = float(options.get("initial_step", 0.05))
+
+    if options.get("max_time") is None:
+        x_u, fun, nit, nfev, status = nelder_mead(
+            x0u,
+            LB,
+            UB,
+            codes,
+            extinction,
+            wavelengths,
+            slope_diff,
+            window,
+            model,
+            xatol,
+            fatol,
+            maxiter,
+            maxfev,
+            initial_step,
+        )
+    else:
+        # Compiled code can't read the clock, so iterate in slices of
+        # evaluations and check the deadline in between
+        deadline = time.perf_counter() + float(options["max_time"])
+        args = (
+            LB,
+            UB,
+            codes,
+            extinction,
+            wavelengths,
+            slope_diff,
+            window,
+            model,
+        )
+        sim, fsim = _initial_simplex(x0u, initial_step, args)
+        nit, nfev = 1, len(x0u) + 1
+        while True:
+            limit = min(maxfev, nfev + _EVALUATIONS_PER_CLOCK_CHECK)
+            sim, fsim, nit, nfev, status = _nelder_mead_iterate(
+                sim, fsim, nit, nfev, args, xatol, fatol, maxiter, limit
+            )
+            if status != 1 or nfev >= maxfev:
+                break
+            if time.perf_counter() >= deadline:
+                status = 3
+                break
+        x_u, fun = sim[0], fsim[0]
+
+    count("objective_evaluations", nfev)
+
+    return OptimizeResult(
+        x=to_constrained(x_u, LB, UB, codes),
+        fun=fun,
+        nit=nit,
+        nfev=nfev,
+        status=status,
+        success=status == 0,
+        budget_exhausted=status != 0,
+        message=_MESSAGES[status],
+    )
@@ -0,0 +1,246 @@
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from numpy.lib import recfunctions
+from numpy.typing import NDArray
+
+from .backends import Backend
+from .boundaries import Boundaries
+from .cache import FitCache
+from .calc_values import calc_values
+from .derivative_fit import BoundaryType
+from .screening import FrameScreen, ScreenResult
+
+# Scalar outputs of calc_values, one record per fit
+FIT_DTYPE = np.dtype(
+    [("stO2", np.float64)]
+    + [(name, np.float64) for name in Boundaries.columns]
+    + [("sum_residual", np.float64), ("score", np.float64)]
+)
+
+
+class BatchFitResult:
+    """Preallocated results of many BRUNO fits
+
+    Scalar results live in one structured array, `fits`, with the fields of
+    FIT_DTYPE, and residuals (if kept) in contiguous `T`x`W` blocks. Rows of
+    fits that failed are NaN. Indexing with a slice returns a view.
+    """
+
+    def __init__(
+        self,
+        n_fits: int,
+        n_residuals: Optional[int] = None,
+        time: Optional[NDArray] = None,
+        residual_dtype: Union[np.dtype, type] = np.float32,
+    ) -> None:
+        """
+        Args:
+            n_fits (int): Number of fits `T`
+            n_residuals (Optional[int], optional): Length `W` of the residual
+            arrays returned by calc_values. None doesn't keep residuals.
+            Defaults to None.
+            time (Optional[NDArray], optional): Sorted timestamps of the
+            fits. Defaults to None, in which case time ranges are fit
+            indices.
+            residual_dtype (Union[np.dtype, type], optional): Type residuals
+            are stored as. Defaults to float32.
+        """
+        self.fits: NDArray = np.full(n_fits, np.nan, dtype=FIT_DTYPE)
+        self.time: Optional[NDArray[np.float64]] = (
+            None if time is None else np.asarray(time, dtype=np.float64)
+        )
+        self.residual: Optional[NDArray] = None
+        self.residual_norm: Optional[NDArray] = None
+        if n_residuals is not None:
+            self.residual = np.full(
+                (n_fits, n_residuals), np.nan, residual_dtype
+            )
+            self.residual_norm = np.full_like(self.residual, np.nan)
+
+    @classmethod
+    def _view(
+        cls,
+        fits: NDArray,
+        time: Optional[NDArray],
+        residual: Optional[NDArray],
+        residual_norm: Optional[NDArray],
+    ) -> "BatchFitResult":
+        result = cls.__new__(cls)
+        result.fits = fits
+        result.time = time
+        result.residual = residual
+        result.residual_norm = residual_norm
+        return result
+
+    def __len__(self) -> int:
+        return len(self.fits)
+
+    def __getitem__(self, index: slice) -> "BatchFitResult":
+        if not isinstance(index, slice):
+            raise TypeError("BatchFitResult can only be sliced")
+        return self._view(
+            self.fits[index],
+            None if self.time is None else self.time[index],
+            None if self.residual is None else self.residual[index],
+            None if self.residual_norm is None else self.residual_norm[index],
+        )
+
+    def set(self, i: int, fit: tuple) -> None:
+        """Store the tuple returned by calc_values as fit `i`"""
+        stO2, coefficients, residual, residual_norm, sum_residual, score = fit
+        self.fits[i] = (stO2, *coefficients, sum_residual, score)
+        if self.residual is not None and self.residual_norm is not None:
+            self.residual[i] = residual
+            self.residual_norm[i] = residual_norm
+
+    def clear(self, i: Union[int, NDArray]) -> None:
+        """Mark fit `i`, or the fits an index array selects, as failed"""
+        self.fits[i] = (np.nan,) * len(FIT_DTYPE)
+        if self.residual is not None and self.residual_norm is not None:
+            self.residual[i] = np.nan
+            self.residual_norm[i] = np.nan
+
+    def time_range(self, start: float, stop: float) -> "BatchFitResult":
+        """View of the fits with `start` <= time < `stop`"""
+        time = np.arange(len(self)) if self.time is None else self.time
+        first, last = np.searchsorted(time, [start, stop])
+        return self[first:last]
+
+    @property
+    def stO2(self) -> NDArray[np.float64]:
+        return self.fits["stO2"]
+
+    @property
+    def coefficients(self) -> NDArray[np.float64]:
+        """`T`x5 coefficients. A view while `fits` is contiguous"""
+        return recfunctions.structured_to_unstructured(
+            self.fits[Boundaries.columns]
+        )
+
+    @property
+    def sum_residual(self) -> NDArray[np.float64]:
+        return self.fits["sum_residual"]
+
+    @property
+    def score(self) -> NDArray[np.float64]:
+        return self.fits["score"]
+
+    @property
+    def success(self) -> NDArray[np.bool_]:
+        return ~np.isnan(self.fits["stO2"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (
+                self.fits,
+                self.time,
+                self.residual,
+                self.residual_norm,
+            )
+            if array is not None
+        )
+
+
+def calc_values_batch(
+    slopes: np.ndarray,
+    extinction: np.ndarray,
+    wavelengths: np.ndarray,
+    boundaries: np.ndarray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float] = None,
+    backend: Backend = "numpy",
+    keep_residuals: bool = False,
+    time: Optional[NDArray] = None,
+    out: Optional[BatchFitResult] = None,
+    cache: Optional[FitCache] = None,
+    strides: Optional[Sequence[int]] = None,
+    screen: Optional[ScreenResult] = None,
+) -> BatchFitResult:
+    """Run calc_values on each row of a `T`x`W` matrix of slopes
+
+    Slopes are screened first, and frames the screen rejects are left as
+    failed without running the solver.
+
+    Args:
+        slopes (np.ndarray): Attenuation slope at each timepoint
+        extinction (np.ndarray): Matrix of extinction co-efficients for each
+        species and wavelength
+        wavelengths (np.ndarray): Wavelengths of light used
+        boundaries (np.ndarray): Boundaries for parameters. First row is start,
+        second is lower bound, third is upper bound
+        boundary_condition_type (BoundaryType): Zero or Extrapolated boundary
+        condition
+        distance (float): Distance between source and detector. If one
+        distance used this is it. If maximal distance used, this is the
+        minimal.
+        distance_max (Optional[float], optional): Optional maximum distance.
+        Defaults to None.
+        backend (Backend, optional): Solver backend. Defaults to "numpy".
+        keep_residuals (bool, optional): Store residual and residual_norm.
+        Ignored if `out` is given. Defaults to False.
+        time (Optional[NDArray], optional): Timestamps of the slopes. Ignored
+        if `out` is given. Defaults to None.
+        out (Optional[BatchFitResult], optional): Preallocated results of
+        length `T` to fill. Defaults to None.
+        cache (Optional[FitCache], optional): Store to look fits up in and
+        save new fits to. Defaults to None.
+        strides (Optional[Sequence[int]], optional): Coarse to fine strides,
+        see calc_values. Defaults to None.
+        screen (Optional[ScreenResult], optional): Rejections of each slope,
+        e.g. from FrameScreen.screen with the intensities and thresholds of
+        the recording. Defaults to None, rejecting slopes that aren't finite
+        in the fitting window.
+
+    Raises:
+        ValueError: Error if `out` or `screen` doesn't have a row per slope
+
+    Returns:
+        BatchFitResult: Results, with NaN rows for fits that failed or were
+        rejected
+    """
+    slopes = np.atleast_2d(slopes)
+    if out is None:
+        out = BatchFitResult(
+            slopes.shape[0],
+            slopes.shape[1] - 1 if keep_residuals else None,
+            time,
+        )
+    elif len(out) != slopes.shape[0]:
+        raise ValueError(
+            f"Mismatch between numbers of slopes and results.\n\
+                Got {slopes.shape[0]} and {len(out)} respectively."
+        )
+    if screen is None:
+        screen = FrameScreen().screen(slopes, wavelengths)
+    elif len(screen) != slopes.shape[0]:
+        raise ValueError(
+            f"Mismatch between numbers of slopes and screened frames.\n\
+                Got {slopes.shape[0]} and {len(screen)} respectively."
+        )
+
+    out.clear(~screen.valid)
+    for i in np.flatnonzero(screen.valid):
+        slope = slopes[i]
+        try:
+            out.set(
+                i,
+                calc_values(
+                    slope,
+                    extinction,
+                    wavelengths,
+                    boundaries,
+                    boundary_condition_type,
+                    distance,
+                    distance_max,
+                    backend,
+                    cache,
+                    strides,
+                ),
+            )
+        except RuntimeError:
+            out.clear(i)
+    return out
@@ -0,0 +1,215 @@
+import enum
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple, Union
+
+import numpy as np
+
+# Number of scalars stored ahead of the arrays: stO2, sum_residual, score
+_N_SCALARS = 3
+_N_COEFFICIENTS = 5
+
+
+def _hash_part(digest, part: Any) -> None:
+    # Scalars by value rather than repr, which depends on their type and on
+    # the NumPy version, so 1.0, np.float64(1.0) and np.float32(1.0) match
+    if isinstance(part, np.ndarray):
+        array = np.ascontiguousarray(part)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    elif isinstance(part, (bool, np.bool_)):
+        digest.update(f"bool:{bool(part)}".encode())
+    elif isinstance(part, (int, float, np.integer, np.floating)):
+        digest.update(f"float:{float(part).hex()}".encode())
+    elif isinstance(part, enum.Enum):
+        digest.update(f"enum:{type(part).__name__}.{part.name}".encode())
+    elif isinstance(part, (tuple, list)):
+        digest.update(b"(")
+        for item in part:
+            _hash_part(digest, item)
+        digest.update(b")")
+    elif isinstance(part, dict):
+        digest.update(b"{")
+        for name in sorted(part):
+            _hash_part(digest, name)
+            _hash_part(digest, part[name])
+        digest.update(b"}")
+    else:
+        digest.update(repr(part).encode())
+    digest.update(b"\0")
+
+
+class FitCache:
+    """On-disk store of calc_values results keyed by a hash of the inputs
+
+    Results are kept in an SQLite database so one cache can be shared by
+    concurrent worker processes. Once the stored results exceed `max_bytes`
+    the least recently used ones are evicted.
+
+    Example:
+        cache = FitCache("fits.sqlite")
+        calc_values(slope, ..., cache=cache)  # fits and stores
+        calc_values(slope, ..., cache=cache)  # looks up
+    """
+
+    def __init__(
+        self, path: Union[str, Path], max_bytes: int = 256 * 2**20
+    ) -> None:
+        """
+        Args:
+            path (Union[str, Path]): Database file, created if missing
+            max_bytes (int, optional): Size limit of the stored results.
+            Defaults to 256 MiB.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fits ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS fits_last_access "
+                "ON fits (last_access)"
+            )
+
+    def __getstate__(self) -> dict:
+        # Connections can't be pickled, workers open their own
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not be shared with forked processes
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """Hash the inputs of a fit
+
+        Arrays are hashed by dtype, shape and contents, numbers by value,
+        enums by name, sequences and dicts item by item and anything else,
+        e.g. strings and None, by its repr.
+
+        Returns:
+            str: Hex digest
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            _hash_part(digest, part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple]:
+        """Look up a fit, marking it as recently used
+
+        Returns:
+            Optional[Tuple]: Tuple returned by calc_values, or None
+        """
+        connection = self._connect()
+        row = connection.execute(
+            "SELECT value FROM fits WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        connection.execute(
+            "UPDATE fits SET last_access = ? WHERE key = ?",
+            (time.time(), key),
+        )
+        self.hits += 1
+        return _unpack(row[0])
+
+    def put(self, key: str, fit: Tuple) -> None:
+        """Store a fit, evicting least recently used fits beyond the limit"""
+        value = _pack(fit)
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            total = connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM fits"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(connection, total - self.max_bytes)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _evict(connection: sqlite3.Connection, excess: int) -> None:
+        freed = 0
+        stale = []
+        for key, size in connection.execute(
+            "SELECT key, size FROM fits ORDER BY last_access"
+        ):
+            if freed >= excess:
+                break
+            stale.append((key,))
+            freed += size
+        connection.executemany("DELETE FROM fits WHERE key = ?", stale)
+
+    def __len__(self) -> int:
+        return (
+            self._connect().execute("SELECT COUNT(*) FROM fits").fetchone()[0]
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the stored results"""
+        return (
+            self._connect()
+            .execute("SELECT COALESCE(SUM(size), 0) FROM fits")
+            .fetchone()[0]
+        )
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM fits")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _pack(fit: Tuple) -> bytes:
+    stO2, coefficients, residual, residual_norm, sum_residual, score = fit
+    return np.concatenate(
+        [[stO2, sum_residual, score], coefficients, residual, residual_norm],
+        dtype=np.float64,
+    ).tobytes()
+
+
+def _unpack(value: bytes) -> Tuple:
+    values = np.frombuffer(value, dtype=np.float64)
+    stO2, sum_residual, score = values[:_N_SCALARS]
+    coefficients = values[_N_SCALARS : _N_SCALARS + _N_COEFFICIENTS].copy()
+    residual, residual_norm = np.split(
+        values[_N_SCALARS + _N_COEFFICIENTS :].copy(), 2
+    )
+    return (
+        np.float64(stO2),
+        coefficients,
+        residual,
+        residual_norm,
+        np.float64(sum_residual),
+        np.float64(score),
+    )
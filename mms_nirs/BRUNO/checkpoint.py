@@ -0,0 +1,390 @@
+import hashlib
+import json
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from .backends import Backend
+from .batch import FIT_DTYPE, BatchFitResult, calc_values_batch
+from .cache import FitCache
+from .derivative_fit import BoundaryType
+
+MANIFEST = "manifest.json"
+_VERSION = 1
+
+
+def _replace(path: Path, write) -> None:
+    # Write to a temporary file then rename over `path`, so a file is either
+    # complete or absent however the process dies
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _chunk_paths(directory: Path, index: int) -> Dict[str, Path]:
+    stem = f"chunk_{index:06d}"
+    return {
+        name: directory / f"{stem}{suffix}.npy"
+        for name, suffix in (
+            ("fits", ""),
+            ("residual", "_residual"),
+            ("residual_norm", "_residual_norm"),
+        )
+    }
+
+
+def _write_chunk(directory: Path, index: int, result: BatchFitResult) -> None:
+    paths = _chunk_paths(directory, index)
+    arrays = {
+        "fits": result.fits,
+        "residual": result.residual,
+        "residual_norm": result.residual_norm,
+    }
+    # Fits last, their file marks the chunk as written
+    for name in ("residual", "residual_norm", "fits"):
+        if arrays[name] is not None:
+            _replace(
+                paths[name],
+                lambda f, array=arrays[name]: np.save(f, array),
+            )
+
+
+class BatchCheckpoint:
+    """Completed chunks of a batch of fits on disk, listed in a manifest
+
+    The fits of rows `index * chunk_size` onwards are saved as
+    `chunk_<index>.npy` (and residual files if kept), and `manifest.json`
+    records the inputs' key, the layout and which chunks are complete.
+    Every file is written under a temporary name and renamed into place, so
+    after a crash each is either complete or absent and at most the chunks
+    in flight are lost.
+
+    Example:
+        checkpoint = BatchCheckpoint("fits.ckpt", key, n_fits, 1000)
+        for index in checkpoint.pending():
+            rows = checkpoint.rows(index)
+            checkpoint.save(index, calc_values_batch(slopes[rows], ...))
+        fits = checkpoint.load()
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        key: str,
+        n_fits: int,
+        chunk_size: int,
+        n_residuals: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            directory (Union[str, Path]): Checkpoint directory, created if
+            missing
+            key (str): Hash of the inputs, e.g. from FitCache.key. Resuming
+            with a different key raises
+            n_fits (int): Number of fits `T`
+            chunk_size (int): Fits per chunk
+            n_residuals (Optional[int], optional): Length `W` of the kept
+            residuals. Defaults to None, not keeping residuals.
+
+        Raises:
+            ValueError: Error if `chunk_size` is below 1, or the directory
+            holds the checkpoint of other inputs or another layout
+        """
+        if chunk_size < 1:
+            raise ValueError(
+                f"chunk_size must be at least 1, got {chunk_size}"
+            )
+        self.directory = Path(directory)
+        self.key = key
+        self.n_fits = n_fits
+        self.chunk_size = chunk_size
+        self.n_residuals = n_residuals
+        self.completed: Set[int] = set()
+
+        manifest_path = self.directory / MANIFEST
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text())
+            expected = self._manifest()
+            for field in (
+                "version",
+                "key",
+                "n_fits",
+                "chunk_size",
+                "n_residuals",
+            ):
+                if manifest[field] != expected[field]:
+                    raise ValueError(
+                        f"Checkpoint in {self.directory} was made with "
+                        f"{field}={manifest[field]}, not {expected[field]}"
+                    )
+            self.completed = set(manifest["completed"])
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write_manifest()
+
+    def _manifest(self) -> dict:
+        return {
+            "version": _VERSION,
+            "key": self.key,
+            "n_fits": self.n_fits,
+            "chunk_size": self.chunk_size,
+            "n_residuals": self.n_residuals,
+            "completed": sorted(self.completed),
+        }
+
+    def _write_manifest(self) -> None:
+        text = json.dumps(self._manifest()).encode()
+        _replace(self.directory / MANIFEST, lambda f: f.write(text))
+
+    @property
+    def n_chunks(self) -> int:
+        return -(-self.n_fits // self.chunk_size)
+
+    @property
+    def complete(self) -> bool:
+        return len(self.completed) == self.n_chunks
+
+    def rows(self, index: int) -> slice:
+        """Rows of the batch held by chunk `index`"""
+        start = index * self.chunk_size
+        return slice(start, min(start + self.chunk_size, self.n_fits))
+
+    def pending(self) -> List[int]:
+        """Chunks still to be fitted, in order"""
+        return [i for i in range(self.n_chunks) if i not in self.completed]
+
+    def save(self, index: int, result: BatchFitResult) -> None:
+        """Write the fits of chunk `index` and mark it complete
+
+        Raises:
+            ValueError: Error if `result` doesn't have a fit per row of the
+            chunk
+        """
+        rows = self.rows(index)
+        if len(result) != rows.stop - rows.start:
+            raise ValueError(
+                f"Chunk {index} holds {rows.stop - rows.start} fits, got "
+                f"{len(result)}"
+            )
+        _write_chunk(self.directory, index, result)
+        self.mark_completed(index)
+
+    def mark_completed(self, index: int) -> None:
+        """Record in the manifest that chunk `index` has been written, e.g.
+        by a worker process"""
+        self.completed.add(index)
+        self._write_manifest()
+
+    def chunks(self) -> Iterator[BatchFitResult]:
+        """Completed chunks in order, memory mapped rather than read
+
+        Raises:
+            ValueError: Error if any chunk is still pending
+        """
+        if not self.complete:
+            raise ValueError(
+                f"{len(self.pending())} of {self.n_chunks} chunks are still "
+                "pending"
+            )
+        for index in range(self.n_chunks):
+            yield self._read(index)
+
+    def _read(self, index: int) -> BatchFitResult:
+        paths = _chunk_paths(self.directory, index)
+        fits = np.load(paths["fits"], mmap_mode="r")
+        if fits.dtype != FIT_DTYPE:
+            raise ValueError(f"Chunk {index} doesn't hold BRUNO fits")
+        residuals = [
+            (
+                None
+                if self.n_residuals is None
+                else np.load(paths[name], mmap_mode="r")
+            )
+            for name in ("residual", "residual_norm")
+        ]
+        return BatchFitResult._view(fits, None, *residuals)
+
+    def load(self, time: Optional[NDArray] = None) -> BatchFitResult:
+        """Merge the completed chunks into one BatchFitResult
+
+        Each chunk is copied once into its rows, so the result is ordered by
+        row however many workers fitted it. Pending chunks are left NaN.
+
+        Args:
+            time (Optional[NDArray], optional): Timestamps of the fits.
+            Defaults to None.
+
+        Returns:
+            BatchFitResult: Fits of every row
+        """
+        out = BatchFitResult(self.n_fits, self.n_residuals, time)
+        for index in sorted(self.completed):
+            chunk = self._read(index)
+            view = out[self.rows(index)]
+            view.fits[...] = chunk.fits
+            if view.residual is not None and view.residual_norm is not None:
+                view.residual[...] = chunk.residual
+                view.residual_norm[...] = chunk.residual_norm
+        return out
+
+
+def _fit_chunk(directory: Path, index: int, slopes: NDArray, *args) -> int:
+    # Worker side, writing the chunk itself so only its index is sent back
+    _write_chunk(directory, index, calc_values_batch(slopes, *args))
+    return index
+
+
+def _slopes_key(slopes: NDArray, chunk_size: int) -> str:
+    # Hash block by block, so memory mapped slopes aren't read all at once
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{slopes.dtype.str}{slopes.shape}".encode())
+    for start in range(0, slopes.shape[0], chunk_size):
+        digest.update(
+            np.ascontiguousarray(slopes[start : start + chunk_size]).tobytes()
+        )
+    return digest.hexdigest()
+
+
+def calc_values_checkpointed(
+    slopes: np.ndarray,
+    extinction: np.ndarray,
+    wavelengths: np.ndarray,
+    boundaries: np.ndarray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    directory: Union[str, Path],
+    distance_max: Optional[float] = None,
+    chunk_size: int = 1000,
+    n_workers: int = 1,
+    backend: Backend = "numpy",
+    keep_residuals: bool = False,
+    time: Optional[NDArray] = None,
+    cache: Optional[FitCache] = None,
+    strides: Optional[Sequence[int]] = None,
+) -> BatchFitResult:
+    """calc_values_batch in chunks saved to a BatchCheckpoint as they finish
+
+    Rerunning with the same inputs and directory after a crash resumes from
+    the chunks already saved. Each chunk's fits depend only on its slopes, so
+    the result is the same however many workers ran, or how often the job
+    was interrupted.
+
+    Args:
+        slopes (np.ndarray): `T`x`W` attenuation slopes, possibly memory
+        mapped
+        extinction (np.ndarray): Matrix of extinction co-efficients for each
+        species and wavelength
+        wavelengths (np.ndarray): Wavelengths of light used
+        boundaries (np.ndarray): Boundaries for parameters. First row is start,
+        second is lower bound, third is upper bound
+        boundary_condition_type (BoundaryType): Zero or Extrapolated boundary
+        condition
+        distance (float): Distance between source and detector. If one
+        distance used this is it. If maximal distance used, this is the
+        minimal.
+        directory (Union[str, Path]): Checkpoint directory
+        distance_max (Optional[float], optional): Optional maximum distance.
+        Defaults to None.
+        chunk_size (int, optional): Fits per chunk, the most work a crash
+        loses per worker. Defaults to 1000.
+        n_workers (int, optional): Number of worker processes. 1 fits the
+        chunks in this process. Defaults to 1.
+        backend (Backend, optional): Solver backend. Defaults to "numpy".
+        keep_residuals (bool, optional): Store residual and residual_norm.
+        Defaults to False.
+        time (Optional[NDArray], optional): Timestamps of the slopes.
+        Defaults to None.
+        cache (Optional[FitCache], optional): Store to look fits up in and
+        save new fits to. Defaults to None.
+        strides (Optional[Sequence[int]], optional): Coarse to fine strides,
+        see calc_values. Defaults to None.
+
+    Raises:
+        ValueError: Error if the directory holds the checkpoint of other
+        inputs
+
+    Returns:
+        BatchFitResult: Results, with NaN rows for fits that failed
+    """
+    slopes = np.atleast_2d(slopes)
+    n_residuals = slopes.shape[1] - 1 if keep_residuals else None
+    key = FitCache.key(
+        _slopes_key(slopes, chunk_size),
+        extinction,
+        wavelengths,
+        boundaries,
+        boundary_condition_type.name,
+        distance,
+        distance_max,
+        backend,
+        None if strides is None else tuple(strides),
+    )
+    checkpoint = BatchCheckpoint(
+        directory, key, slopes.shape[0], chunk_size, n_residuals
+    )
+    fit_args = (
+        extinction,
+        wavelengths,
+        boundaries,
+        boundary_condition_type,
+        distance,
+        distance_max,
+        backend,
+        keep_residuals,
+        None,
+        None,
+        cache,
+        strides,
+    )
+
+    if n_workers == 1:
+        for index in checkpoint.pending():
+            checkpoint.save(
+                index,
+                calc_values_batch(
+                    np.asarray(slopes[checkpoint.rows(index)]), *fit_args
+                ),
+            )
+    else:
+        executor: Executor = ProcessPoolExecutor(max_workers=n_workers)
+        in_flight: Set[Future] = set()
+
+        def mark_finished() -> None:
+            nonlocal in_flight
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                checkpoint.mark_completed(future.result())
+
+        try:
+            for index in checkpoint.pending():
+                in_flight.add(
+                    executor.submit(
+                        _fit_chunk,
+                        checkpoint.directory,
+                        index,
+                        np.asarray(slopes[checkpoint.rows(index)]),
+                        *fit_args,
+                    )
+                )
+                # Bound memory by keeping at most two chunks per worker
+                while len(in_flight) >= 2 * n_workers:
+                    mark_finished()
+            while in_flight:
+                mark_finished()
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    return checkpoint.load(time)
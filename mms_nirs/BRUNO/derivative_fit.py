@@ -1,9 +1,12 @@
 from enum import Enum, auto
+from functools import lru_cache
 from typing import Optional
 
 import numpy as np
 from numpy.typing import NDArray
 
+from ..profiling import profiled
+from .backends import Backend, derivative_fit_objective, resolve_backend
 from .model_types import ExtrapolatedBoundaryConditions, ZeroBoundaryConditions
 
 
@@ -22,6 +25,19 @@ def get_model(
     boundary_condition_type: BoundaryType,
     quantity: QuantityType,
     distance_max: Optional[float],
+):
+    return _model(boundary_condition_type, quantity, distance_max is not None)
+
+
+# Lambdifying the sympy models is far more expensive than evaluating them and
+# derivative_fit requests the same model on every objective evaluation. Keyed
+# on whether there is a maximum distance, not its value, so there is one
+# model per combination however many separations are fitted
+@lru_cache(maxsize=None)
+def _model(
+    boundary_condition_type: BoundaryType,
+    quantity: QuantityType,
+    is_long_separation: bool,
 ):
     model_choice = (boundary_condition_type, quantity)
     match model_choice:
@@ -31,7 +47,7 @@ def get_model(
             model_function = ZeroBoundaryConditions.attenuation()
         case (BoundaryType.ZBC, QuantityType.ATTENUATION_SLOPE):
             model_function = ZeroBoundaryConditions.attenuation_slope(
-                is_long_separation=(distance_max is not None)
+                is_long_separation=is_long_separation
             )
         case (BoundaryType.EBC, QuantityType.REFLECTANCE):
             model_function = ExtrapolatedBoundaryConditions.reflectance()
@@ -39,7 +55,7 @@ def get_model(
             model_function = ExtrapolatedBoundaryConditions.attenuation()
         case (BoundaryType.EBC, QuantityType.ATTENUATION_SLOPE):
             model_function = ExtrapolatedBoundaryConditions.attenuation_slope(
-                is_long_separation=(distance_max is not None)
+                is_long_separation=is_long_separation
             )
         case _:
             raise ValueError(
@@ -50,6 +66,7 @@ def get_model(
     return model_function
 
 
+@profiled("derivative_fit")
 def derivative_fit(
     param: NDArray[np.float64],
     boundary_condition_type: BoundaryType,
@@ -61,6 +78,7 @@ def derivative_fit(
     distance_max: Optional[float] = None,
     wave_start: float = 710.0,
     wave_end: float = 900.0,
+    backend: Backend = "numpy",
 ) -> np.floating:
     """Create objective function to fit derivative
 
@@ -99,6 +117,11 @@ def derivative_fit(
         wave_end (int, optional): End of wavelength range fitting is performed
         on. Defaults to 900.
 
+        backend (Backend, optional): "numpy" evaluates the sympy models,
+        "numba" the compiled kernels in backends.py. Only the attenuation
+        slope is available compiled. Falls back to "numpy" if numba isn't
+        installed. Defaults to "numpy".
+
     Raises:
         ValueError: ValueError for unable to find unique start and end
         wavelengths
@@ -106,6 +129,24 @@ def derivative_fit(
     Returns:
         np.floating: sum of least square differences
     """
+    if (
+        resolve_backend(backend) == "numba"
+        and quantity == QuantityType.ATTENUATION_SLOPE
+    ):
+        return np.float64(
+            derivative_fit_objective(
+                param,
+                boundary_condition_type == BoundaryType.EBC,
+                slope_diff,
+                extinction,
+                wavelengths,
+                distance,
+                distance_max,
+                wave_start,
+                wave_end,
+            )
+        )
+
     start_idx = np.argwhere(wavelengths == wave_start)
     end_idx = np.argwhere(wavelengths == wave_end)
 
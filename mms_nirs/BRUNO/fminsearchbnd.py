@@ -1,8 +1,11 @@
+import time
 from enum import Enum, auto
 
 import numpy as np
 from scipy.optimize import OptimizeResult, minimize
 
+from ..profiling import count, profiled
+
 # ADapted from the Matlab fminsearchbnd function
 # https://uk.mathworks.com/matlabcentral/fileexchange/8277-fminsearchbnd-fminsearchcon
 
@@ -107,12 +110,36 @@ def xtransform_to_constrained(x0u, params):
     return np.array(xtrans)
 
 
+def _initial_simplex(x0u, step):
+    # scipy's default starting simplex with a chosen relative step
+    simplex = np.tile(np.asarray(x0u, dtype=np.float64), (len(x0u) + 1, 1))
+    for k in range(len(x0u)):
+        if simplex[k + 1, k] != 0:
+            simplex[k + 1, k] *= 1 + step
+        else:
+            simplex[k + 1, k] = 0.00025
+    return simplex
+
+
+class _TimeLimitExceeded(Exception):
+    pass
+
+
 Nfeval = 1
 
 
+@profiled("fminsearchbnd")
 def fminsearchbnd(
     fun, x0, LB=None, UB=None, options=None, func_args=[], *args, **kwargs
 ):
+    """Bounded Nelder-Mead of `fun`, as MATLAB's fminsearchbnd
+
+    Besides scipy's Nelder-Mead options, `options` takes "initial_step",
+    the relative size of the starting simplex, and "max_time", a wall
+    clock limit in seconds. If "maxfev", "maxiter" or "max_time" runs out
+    the best vertex so far is returned with `budget_exhausted` set.
+    """
+
     def intrafun(x, params):
         xtrans = xtransform_to_constrained(x, params).reshape(params["xsize"])
         return fun(xtrans, *params["args"])
@@ -175,15 +202,67 @@ def fminsearchbnd(
     if options["disp"]:
         callback = callbackFn
 
-    result = minimize(
-        intrafun,
-        x0_unconstrained,
-        args=(params,),
-        **kwargs,
-        options=options,
-        method="Nelder-Mead",
-        callback=callback,
-    )
+    if "initial_step" in options:
+        # Relative size of the starting simplex, 0.05 as scipy's default
+        options = dict(options)
+        options["initial_simplex"] = _initial_simplex(
+            x0_unconstrained, options.pop("initial_step")
+        )
+
+    deadline = None
+    if options.get("max_time") is not None:
+        options = dict(options)
+        deadline = time.perf_counter() + options.pop("max_time")
+    elif "max_time" in options:
+        options = {k: v for k, v in options.items() if k != "max_time"}
+
+    if deadline is None:
+        objective = intrafun
+    else:
+        # Nelder-Mead never discards its best vertex, so the best point
+        # evaluated is the best vertex when time runs out. The start is
+        # always evaluated so there is a point to return
+        best = {"x": x0_unconstrained, "fun": np.inf, "nfev": 0, "nit": 0}
+
+        def objective(x, params):
+            if best["nfev"] and time.perf_counter() >= deadline:
+                raise _TimeLimitExceeded
+            f = intrafun(x, params)
+            best["nfev"] += 1
+            if f < best["fun"]:
+                best["x"], best["fun"] = np.array(x), f
+            return f
+
+        user_callback = callback
+
+        def callback(Xi):
+            best["nit"] += 1
+            if user_callback is not None:
+                user_callback(Xi)
+
+    try:
+        result = minimize(
+            objective,
+            x0_unconstrained,
+            args=(params,),
+            **kwargs,
+            options=options,
+            method="Nelder-Mead",
+            callback=callback,
+        )
+    except _TimeLimitExceeded:
+        result = OptimizeResult(
+            x=best["x"],
+            fun=best["fun"],
+            nit=best["nit"],
+            nfev=best["nfev"],
+            status=3,
+            success=False,
+            message="Time limit has been exceeded.",
+        )
+    result["budget_exhausted"] = result["status"] in (1, 2, 3)
+
+    count("objective_evaluations", result.nfev)
 
     x_unconstrained = result.x
     x = xtransform_to_constrained(x_unconstrained, params).reshape(xsize)
@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+@dataclass(frozen=True)
+class ResolutionContext:
+    """Wavelengths a fit is evaluated on at one resolution
+
+    Every `stride`th wavelength from the start of the fitting window, plus
+    the one after the window, so the model's first difference covers the
+    whole window. Differences of the smoothed slope at these wavelengths
+    sum the 1 nm differences, so coarse fits see the same data as the full
+    grid, only less finely.
+
+    Attributes:
+        stride: Wavelength samples per step
+        indices: Indices of the wavelengths kept
+        extinction: Extinction co-efficients at those wavelengths
+        wavelengths: Wavelengths kept
+        wave_start: First wavelength of the fitting window
+        wave_end: Last wavelength of the fitting window, a multiple of
+        `stride` after `wave_start`
+    """
+
+    stride: int
+    indices: NDArray
+    extinction: NDArray
+    wavelengths: NDArray
+    wave_start: float
+    wave_end: float
+
+    @classmethod
+    def of(
+        cls,
+        extinction: NDArray,
+        wavelengths: NDArray,
+        stride: int,
+        wave_start: float,
+        wave_end: float,
+    ) -> "ResolutionContext":
+        """Context of a stride, stride 1 keeping the full grid
+
+        Raises:
+            ValueError: Error for a stride below 1 or if the window isn't
+            found in `wavelengths`
+        """
+        if stride < 1:
+            raise ValueError(f"Strides must be at least 1, got {stride}")
+        start_idx = np.argwhere(wavelengths == wave_start)
+        end_idx = np.argwhere(wavelengths == wave_end)
+        if (start_idx.shape != (1, 1)) or (end_idx.shape != (1, 1)):
+            raise ValueError("Couldn't find unique start and end wavelengths")
+
+        if stride == 1:
+            indices = np.arange(len(wavelengths))
+        else:
+            indices = np.arange(start_idx[0][0], end_idx[0][0] + 1, stride)
+            if indices[-1] + stride < len(wavelengths):
+                indices = np.append(indices, indices[-1] + stride)
+            if len(indices) < 2:
+                raise ValueError(
+                    f"Stride {stride} leaves no differences in the window"
+                )
+            wave_end = wavelengths[indices[-2]]
+        return cls(
+            stride,
+            indices,
+            np.ascontiguousarray(extinction[indices]),
+            np.ascontiguousarray(wavelengths[indices]),
+            wave_start,
+            wave_end,
+        )
+
+    def slope_diff(self, smoothed_slope: NDArray) -> NDArray:
+        """First difference of a smoothed slope at this resolution"""
+        return np.diff(smoothed_slope[self.indices])
+
+
+class _ContextCache:
+    # Contexts by grid, stride and window. Each frame of a recording fits on
+    # the same grids, so they are built once
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._contexts: OrderedDict[tuple, ResolutionContext] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        extinction: NDArray,
+        wavelengths: NDArray,
+        stride: int,
+        wave_start: float,
+        wave_end: float,
+    ) -> ResolutionContext:
+        key = (
+            np.ascontiguousarray(extinction).tobytes(),
+            np.ascontiguousarray(wavelengths).tobytes(),
+            extinction.shape,
+            stride,
+            wave_start,
+            wave_end,
+        )
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is not None:
+                self._contexts.move_to_end(key)
+                return context
+        context = ResolutionContext.of(
+            extinction, wavelengths, stride, wave_start, wave_end
+        )
+        with self._lock:
+            self._contexts[key] = context
+            while len(self._contexts) > self.maxsize:
+                self._contexts.popitem(last=False)
+        return context
+
+    def clear(self) -> None:
+        with self._lock:
+            self._contexts.clear()
+
+
+_contexts = _ContextCache()
+
+
+def resolution_contexts(
+    extinction: NDArray,
+    wavelengths: NDArray,
+    strides: Sequence[int],
+    wave_start: float,
+    wave_end: float,
+) -> Tuple[ResolutionContext, ...]:
+    """Contexts of each stage of a coarse to fine fit, from a shared cache
+
+    Args:
+        extinction (NDArray): Extinction co-efficients matrix
+        wavelengths (NDArray): Wavelengths of light used
+        strides (Sequence[int]): Stride of each stage, ending with 1
+        wave_start (float): Start of the fitting window
+        wave_end (float): End of the fitting window
+
+    Raises:
+        ValueError: Error if `strides` is empty or doesn't end on the full
+        grid
+
+    Returns:
+        Tuple[ResolutionContext, ...]: One context per stage
+    """
+    if len(strides) == 0 or strides[-1] != 1:
+        raise ValueError(
+            f"Strides must end with 1, the full grid, got {tuple(strides)}"
+        )
+    return tuple(
+        _contexts.get(extinction, wavelengths, stride, wave_start, wave_end)
+        for stride in strides
+    )
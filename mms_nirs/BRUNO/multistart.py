@@ -0,0 +1,280 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.stats import qmc
+
+from .backends import Backend
+from .calc_values import _fit_coefficients, _score_coefficients, smooth
+from .derivative_fit import BoundaryType
+
+
+@dataclass
+class MultiStartResult:
+    """Best fit of a multi-start search plus the spread of all solutions
+
+    `stO2`, `coefficients`, `residual`, `residual_norm`, `sum_residual` and
+    `score` are those of the start with the lowest objective and match the
+    values returned by `calc_values`. The remaining fields describe every
+    start that completed before the search stopped, `start_indices` giving
+    the row of `starts` each solution came from. `n_failed` counts the
+    starts whose fit didn't succeed, which are left out of the others.
+    """
+
+    stO2: float
+    coefficients: NDArray[np.float64]
+    residual: NDArray[np.float64]
+    residual_norm: NDArray[np.float64]
+    sum_residual: float
+    score: float
+    starts: NDArray[np.float64]
+    start_indices: NDArray[np.intp]
+    solutions: NDArray[np.float64]
+    objectives: NDArray[np.float64]
+    solution_stO2: NDArray[np.float64]
+    n_agreeing: int
+    n_failed: int
+
+    @property
+    def n_completed(self) -> int:
+        return self.solutions.shape[0]
+
+    @property
+    def stO2_spread(self) -> float:
+        return float(np.std(self.solution_stO2))
+
+    @property
+    def coefficient_spread(self) -> NDArray[np.float64]:
+        return np.std(self.solutions, axis=0)
+
+
+def latin_hypercube_starts(
+    boundaries: np.ndarray, n_starts: int, seed: Optional[int] = None
+) -> NDArray[np.float64]:
+    """Generate Latin-hypercube distributed starting points
+
+    Args:
+        boundaries (np.ndarray): Boundaries for parameters. First row is
+        start, second is lower bound, third is upper bound
+        n_starts (int): Number of starting points `K`
+        seed (Optional[int], optional): Seed for the sampler. Defaults to
+        None.
+
+    Returns:
+        NDArray[np.float64]: `K`x`P` array of starts within the bounds
+    """
+    LB = boundaries[1]
+    UB = boundaries[2]
+    sample = qmc.LatinHypercube(d=len(LB), seed=seed).random(n_starts)
+    # Scale by hand as qmc.scale rejects fixed (LB == UB) parameters
+    return LB + sample * (UB - LB)
+
+
+def _solve_from_start(
+    start: np.ndarray,
+    slope_1stdiff: np.ndarray,
+    extinction: np.ndarray,
+    wavelengths: np.ndarray,
+    boundaries: np.ndarray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float],
+    backend: Backend,
+) -> tuple[NDArray[np.float64], float, bool]:
+    start_boundaries = boundaries.copy()
+    start_boundaries[0] = start
+    result = _fit_coefficients(
+        slope_1stdiff,
+        extinction,
+        wavelengths,
+        start_boundaries,
+        boundary_condition_type,
+        distance,
+        distance_max,
+        backend,
+    )
+    return result["x"], float(result["fun"]), bool(result["success"])
+
+
+def _count_agreeing(
+    objectives: list[float],
+    stO2: list[float],
+    agreement_tol: float,
+    objective_rtol: float,
+) -> int:
+    best = int(np.argmin(objectives))
+    close_objective = np.asarray(objectives) <= objectives[best] * (
+        1 + objective_rtol
+    )
+    close_stO2 = np.abs(np.asarray(stO2) - stO2[best]) <= agreement_tol
+    return int(np.sum(close_objective & close_stO2))
+
+
+def calc_values_multistart(
+    slope: np.ndarray,
+    extinction: np.ndarray,
+    wavelengths: np.ndarray,
+    boundaries: np.ndarray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float] = None,
+    n_starts: int = 8,
+    n_workers: Optional[int] = None,
+    min_agreement: Optional[int] = 3,
+    agreement_tol: float = 0.1,
+    objective_rtol: float = 1e-3,
+    seed: Optional[int] = None,
+    backend: Backend = "numpy",
+) -> MultiStartResult:
+    """Calculate parameters from several Latin-hypercube starts
+
+    Each start is fitted exactly as in `calc_values`. Starts run
+    concurrently on a process pool and the search stops early once
+    `min_agreement` of the completed starts agree with the current best.
+    Starts still queued are then cancelled and those already running are
+    waited for, so no worker outlives the call. Their results are
+    discarded.
+
+    Two starts agree when their objectives are within `objective_rtol`
+    (relative) of the best objective and their stO2 is within
+    `agreement_tol` percentage points of the best stO2.
+
+    Args:
+        slope (np.ndarray): Attenuation slope
+        extinction (np.ndarray): Matrix of extinction co-efficients for each
+        species and wavelength
+        wavelengths (np.ndarray): Wavelengths of light used
+        boundaries (np.ndarray): Boundaries for parameters. Only the lower
+        and upper bound rows are used
+        boundary_condition_type (BoundaryType): Zero or Extrapolated boundary
+        condition
+        distance (float): Distance between source and detector. If one
+        distance used this is it. If maximal distance used, this is the
+        minimal.
+        distance_max (Optional[float], optional): Optional maximum distance.
+        Defaults to None.
+        n_starts (int, optional): Number of starts `K`. Defaults to 8.
+        n_workers (Optional[int], optional): Number of worker processes. 1
+        runs the starts serially in this process. Defaults to None, the
+        number of CPUs.
+        min_agreement (Optional[int], optional): Number of agreeing starts
+        needed to stop early. None always runs every start. Defaults to 3.
+        agreement_tol (float, optional): stO2 tolerance for agreement.
+        Defaults to 0.1.
+        objective_rtol (float, optional): Relative objective tolerance for
+        agreement. Defaults to 1e-3.
+        seed (Optional[int], optional): Seed for the Latin hypercube.
+        Defaults to None.
+        backend (Backend, optional): Solver backend used for every start.
+        Defaults to "numpy".
+
+    Raises:
+        RuntimeError: Error if no start obtains co-efficients, with the
+        number of starts that failed.
+
+    Returns:
+        MultiStartResult: Best fit and spread of the completed starts
+    """
+    slope_1stdiff = np.diff(smooth(slope, 5))
+    starts = latin_hypercube_starts(boundaries, n_starts, seed)
+    fit_args = (
+        slope_1stdiff,
+        extinction,
+        wavelengths,
+        boundaries,
+        boundary_condition_type,
+        distance,
+        distance_max,
+        backend,
+    )
+
+    start_indices: list[int] = []
+    solutions: list[NDArray[np.float64]] = []
+    objectives: list[float] = []
+    solution_stO2: list[float] = []
+    n_agreeing = 0
+    n_failed = 0
+
+    def record(
+        index: int, x: NDArray[np.float64], fun: float, success: bool
+    ) -> bool:
+        nonlocal n_agreeing, n_failed
+        if not success:
+            n_failed += 1
+            return False
+        start_indices.append(index)
+        solutions.append(x)
+        objectives.append(fun)
+        solution_stO2.append(x[2] / (x[1] + x[2]) * 100)
+        n_agreeing = _count_agreeing(
+            objectives, solution_stO2, agreement_tol, objective_rtol
+        )
+        return min_agreement is not None and n_agreeing >= min_agreement
+
+    if n_workers == 1:
+        for index, start in enumerate(starts):
+            if record(index, *_solve_from_start(start, *fit_args)):
+                break
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+        try:
+            indices: dict[Future, int] = {
+                executor.submit(_solve_from_start, start, *fit_args): index
+                for index, start in enumerate(starts)
+            }
+            pending = set(indices)
+            stop = False
+            while pending and not stop:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stop = record(indices[future], *future.result()) or stop
+        finally:
+            # Running starts can't be interrupted, wait for them rather
+            # than leave them computing after returning
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if not solutions:
+        raise RuntimeError(
+            f"Failed to solve for coefficients, {n_failed} starts failed."
+        )
+
+    best = int(np.argmin(objectives))
+    (
+        stO2,
+        coefficients,
+        residual,
+        residual_norm,
+        sum_residual,
+        score,
+    ) = _score_coefficients(
+        solutions[best],
+        slope_1stdiff,
+        extinction,
+        wavelengths,
+        boundary_condition_type,
+        distance,
+        distance_max,
+    )
+
+    return MultiStartResult(
+        stO2=stO2,
+        coefficients=coefficients,
+        residual=residual,
+        residual_norm=residual_norm,
+        sum_residual=sum_residual,
+        score=score,
+        starts=starts,
+        start_indices=np.array(start_indices, dtype=np.intp),
+        solutions=np.array(solutions),
+        objectives=np.array(objectives),
+        solution_stO2=np.array(solution_stO2),
+        n_agreeing=n_agreeing,
+        n_failed=n_failed,
+    )
@@ -0,0 +1,203 @@
+import enum
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..profiling import count
+from .calc_values import WAVE_END, WAVE_START
+
+# Half the span calc_values smooths slopes over, the wavelengths either side
+# of the fitting window that still reach the fit
+_SMOOTH_MARGIN = 2
+# Scale of the median absolute second difference to the standard deviation
+# of white noise, 1.4826 / sqrt(6)
+_NOISE_SCALE = 1.4826 / np.sqrt(6)
+
+
+class RejectReason(enum.IntFlag):
+    """Why a frame was rejected before fitting, combined as flags"""
+
+    # NaN or inf slopes or intensities, or intensities of zero or below that
+    # calc_attenuation_spectra turns into them
+    INVALID = 1
+    # Intensities at or above the detector's saturation level
+    SATURATED = 2
+    # Intensity spectrum too dark to rise above its noise or min_intensity
+    LOW_SNR = 4
+    # Spike or step in the slope spectrum, far above its noise
+    DISCONTINUITY = 8
+
+
+@dataclass
+class ScreenResult:
+    """RejectReason flags of each frame, 0 for frames to fit"""
+
+    reasons: NDArray[np.uint8]
+
+    def __len__(self) -> int:
+        return len(self.reasons)
+
+    @property
+    def valid(self) -> NDArray[np.bool_]:
+        return self.reasons == 0
+
+    def counts(self) -> Dict[str, int]:
+        """Frames rejected for each reason, and in total. A frame can be
+        rejected for more than one reason"""
+        counts = {
+            reason.name.lower(): int(np.count_nonzero(self.reasons & reason))
+            for reason in RejectReason
+        }
+        counts["rejected"] = int(np.count_nonzero(self.reasons))
+        return counts
+
+
+def _window(wavelengths: NDArray, wave_start: float, wave_end: float) -> slice:
+    start, end = np.searchsorted(wavelengths, [wave_start, wave_end], "right")
+    return slice(max(start - 1 - _SMOOTH_MARGIN, 0), end + 1 + _SMOOTH_MARGIN)
+
+
+def _noise(spectra: NDArray) -> NDArray:
+    # Robust standard deviation of the noise of each spectrum from its second
+    # differences, which smooth spectra leave near zero
+    return _NOISE_SCALE * np.median(np.abs(np.diff(spectra, 2)), axis=-1)
+
+
+@dataclass(frozen=True)
+class FrameScreen:
+    """Vectorised checks of a batch of frames, run before fitting
+
+    Each check is a few passes over the `T`x`W` batch, so frames that would
+    only make calc_values exhaust its evaluations and raise are rejected for
+    a fraction of the cost of one fit. Only the wavelengths that reach the
+    fit are checked. Non-finite values are always rejected, the other checks
+    run when their threshold is set.
+
+    Attributes:
+        saturation: Intensity at which the detector saturates. Frames with
+        any intensity at or above it are rejected.
+        min_snr: Least median intensity over its noise, estimated from the
+        second differences of the spectrum, at every distance. Spectra
+        whose noise estimate is zero, noise free or coarsely quantised, pass.
+        Synthetic spectra with 0.1% noise stay above 700.
+        min_intensity: Least median intensity at every distance, e.g. a few
+        counts above the detector's dark level. Also catches flat dark
+        frames, whose noise estimate is zero. Rejected as LOW_SNR.
+        max_jump: Largest second difference of the slope spectrum, in
+        multiples of its noise estimated in the same way. Synthetic slopes
+        stay below 12.
+        wave_start: Start of the fitting window. Defaults to WAVE_START.
+        wave_end: End of the fitting window. Defaults to WAVE_END.
+    """
+
+    saturation: Optional[float] = None
+    min_snr: Optional[float] = None
+    min_intensity: Optional[float] = None
+    max_jump: Optional[float] = None
+    wave_start: float = WAVE_START
+    wave_end: float = WAVE_END
+
+    def screen(
+        self,
+        slopes: NDArray,
+        wavelengths: NDArray,
+        intensities: Optional[NDArray] = None,
+        intensity_wavelengths: Optional[NDArray] = None,
+    ) -> ScreenResult:
+        """Screen a batch of frames
+
+        Frames rejected for each reason are counted as `screen.<reason>`
+        and `screen.rejected` by an active Profiler.
+
+        Args:
+            slopes (NDArray): `T`x`W` attenuation slopes
+            wavelengths (NDArray): Sorted wavelengths of the slopes
+            intensities (Optional[NDArray], optional): `T`x`N` or
+            `k`x`T`x`N` intensity spectra the slopes came from. Saturation
+            and SNR are only checked when given. Defaults to None.
+            intensity_wavelengths (Optional[NDArray], optional): Wavelengths
+            of the intensities. Defaults to None, `wavelengths`.
+
+        Raises:
+            ValueError: Error if the intensities don't have a frame per
+            slope
+
+        Returns:
+            ScreenResult: Rejections of each frame
+        """
+        slopes = np.atleast_2d(slopes)
+        window = slopes[
+            :, _window(wavelengths, self.wave_start, self.wave_end)
+        ]
+        reasons = np.zeros(slopes.shape[0], np.uint8)
+        invalid = ~np.isfinite(window).all(axis=1)
+        reasons[invalid] |= RejectReason.INVALID
+
+        if self.max_jump is not None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                jump = np.max(np.abs(np.diff(window, 2)), axis=1) / _noise(
+                    window
+                )
+            reasons[
+                ~invalid & (jump > self.max_jump)
+            ] |= RejectReason.DISCONTINUITY
+
+        if intensities is not None:
+            reasons |= self._screen_intensities(
+                intensities,
+                (
+                    wavelengths
+                    if intensity_wavelengths is None
+                    else intensity_wavelengths
+                ),
+                slopes.shape[0],
+            )
+
+        result = ScreenResult(reasons)
+        for name, n in result.counts().items():
+            if n:
+                count(f"screen.{name}", n)
+        return result
+
+    def _screen_intensities(
+        self, intensities: NDArray, wavelengths: NDArray, n_frames: int
+    ) -> NDArray[np.uint8]:
+        # `k`x`T`x`N` view, one layer per distance
+        intensities = np.asarray(intensities)
+        if intensities.ndim == 2:
+            intensities = intensities[np.newaxis]
+        if intensities.shape[1] != n_frames:
+            raise ValueError(
+                f"Mismatch between numbers of slopes and intensity frames.\n\
+                    Got {n_frames} and {intensities.shape[1]} respectively."
+            )
+        window = intensities[
+            ..., _window(wavelengths, self.wave_start, self.wave_end)
+        ]
+        reasons = np.zeros(n_frames, np.uint8)
+        with np.errstate(invalid="ignore"):
+            positive = (window > 0) & np.isfinite(window)
+        invalid = ~positive.all(axis=(0, 2))
+        reasons[invalid] |= RejectReason.INVALID
+
+        if self.saturation is not None:
+            saturated = (window >= self.saturation).any(axis=(0, 2))
+            reasons[saturated] |= RejectReason.SATURATED
+
+        if self.min_snr is not None or self.min_intensity is not None:
+            median = np.median(window, axis=-1)
+            dark = np.zeros(n_frames, bool)
+            if self.min_snr is not None:
+                noise = _noise(window)
+                # Zero noise says nothing about how dark a spectrum is, only
+                # that it varies less than its quantisation step, so leave
+                # flat dark frames to min_intensity
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    snr = np.where(noise > 0, median / noise, np.inf)
+                dark |= (snr < self.min_snr).any(axis=0)
+            if self.min_intensity is not None:
+                dark |= (median < self.min_intensity).any(axis=0)
+            reasons[~invalid & dark] |= RejectReason.LOW_SNR
+        return reasons
@@ -0,0 +1,286 @@
+from dataclasses import dataclass, fields
+from typing import Callable, Iterator, Optional, Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..utils.dpf import calc_mua
+from ..utils.extinction_coefficients import ExtinctionCoefficients
+from .derivative_fit import BoundaryType, QuantityType, get_model
+
+
+@dataclass
+class TissueParameters:
+    """Trajectories of the parameters BRUNO fits, one value per frame
+
+    Concentrations and scattering follow the conventions of calc_values:
+    mu_a from `calc_mua` and mu_s = a * lambda^-b with lambda in micrometers.
+    """
+
+    water_frac: NDArray
+    hhb: NDArray
+    hbo2: NDArray
+    a: NDArray
+    b: NDArray
+
+    def __len__(self) -> int:
+        return len(self.water_frac)
+
+    def __getitem__(self, index: slice) -> "TissueParameters":
+        return TissueParameters(
+            *(getattr(self, field.name)[index] for field in fields(self))
+        )
+
+    @property
+    def stO2(self) -> NDArray:
+        return self.hbo2 / (self.hhb + self.hbo2) * 100
+
+    @property
+    def coefficients(self) -> NDArray:
+        """`T`x5 coefficients in the order calc_values returns them"""
+        return np.column_stack(
+            [getattr(self, field.name) for field in fields(self)]
+        )
+
+    def mua(self, extinction: NDArray) -> NDArray:
+        """`T`x`W` absorption coefficient"""
+        return calc_mua(self.water_frac, self.hhb, self.hbo2, extinction)
+
+    def mus(self, wavelengths: NDArray) -> NDArray:
+        """`T`x`W` reduced scattering coefficient"""
+        # Not calc_mus, which computes (a * lambda)^-b
+        return self.a[:, np.newaxis] * np.power(
+            wavelengths * 0.001, -self.b[:, np.newaxis]
+        )
+
+
+# Signature of functions giving the parameters of frames [start, stop)
+Trajectory = Callable[[int, int, float], TissueParameters]
+
+
+def physiological_trajectory(
+    water_frac: float = 0.99,
+    hhb: float = 5.0,
+    hbo2: float = 20.0,
+    a: float = 0.15,
+    b: float = 2.5,
+    oscillation: float = 0.1,
+    seed: Optional[int] = None,
+) -> Trajectory:
+    """Parameters oscillating at cardiac, respiratory and Mayer wave rates
+
+    Haemoglobin varies by the relative amplitude `oscillation`, split across
+    1, 0.25 and 0.1 Hz components with random phases, and HHb moves against
+    HbO2. The trajectory is a function of time only, so it is identical
+    however a recording is chunked.
+
+    Args:
+        water_frac (float, optional): Water fraction. Defaults to 0.99.
+        hhb (float, optional): Mean HHb. Defaults to 5.0.
+        hbo2 (float, optional): Mean HbO2. Defaults to 20.0.
+        a (float, optional): Scattering amplitude. Defaults to 0.15.
+        b (float, optional): Scattering power. Defaults to 2.5.
+        oscillation (float, optional): Relative amplitude of the
+        haemoglobin oscillations. Defaults to 0.1.
+        seed (Optional[int], optional): Seed of the phases. Defaults to None.
+
+    Returns:
+        Trajectory: Function of (start, stop, frame_rate)
+    """
+    frequencies = np.array([1.0, 0.25, 0.1])
+    weights = np.array([0.2, 0.3, 0.5]) * oscillation
+    phases = np.random.default_rng(seed).uniform(0, 2 * np.pi, 3)
+
+    def trajectory(
+        start: int, stop: int, frame_rate: float
+    ) -> TissueParameters:
+        time = np.arange(start, stop) / frame_rate
+        wave = np.sin(
+            2 * np.pi * frequencies * time[:, np.newaxis] + phases
+        ) @ (weights)
+        n = stop - start
+        return TissueParameters(
+            water_frac=np.full(n, water_frac),
+            hhb=hhb * (1 - 0.5 * wave),
+            hbo2=hbo2 * (1 + wave),
+            a=np.full(n, a),
+            b=np.full(n, b),
+        )
+
+    return trajectory
+
+
+@dataclass
+class SyntheticChunk:
+    """Consecutive frames of a synthetic recording
+
+    Attributes:
+        start: Index of the first frame
+        time: Time of each frame, s
+        parameters: Ground truth of each frame
+        intensities: `k`x`T`x`W` noisy intensity spectra, one layer per
+        distance
+        slopes: `T`x`W` attenuation slopes regressed from the intensities
+    """
+
+    start: int
+    time: NDArray
+    parameters: TissueParameters
+    intensities: NDArray
+    slopes: NDArray
+
+
+class SyntheticRecording:
+    """Multi-distance recordings simulated with the BRUNO diffusion models
+
+    Example:
+        recording = SyntheticRecording([30, 35, 40], intensity_noise=1e-3)
+        for chunk in recording.stream(36000, chunk_size=1000):
+            conc = ucln.calc_concentrations(chunk.intensities[0], ...)
+            fits = calc_values_batch(chunk.slopes, ...)
+    """
+
+    def __init__(
+        self,
+        distances: Sequence[float],
+        boundary_condition_type: BoundaryType = BoundaryType.ZBC,
+        extinction: Optional[NDArray] = None,
+        wavelengths: Optional[NDArray] = None,
+        source_intensity: float = 1e7,
+        intensity_noise: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            distances (Sequence[float]): Source-detector distances, mm
+            boundary_condition_type (BoundaryType, optional): Model simulated.
+            Defaults to BoundaryType.ZBC.
+            extinction (Optional[NDArray], optional): Extinction table with
+            columns wavelength, HHb, HbO2 and water. Defaults to None, using
+            ExtinctionCoefficients.
+            wavelengths (Optional[NDArray], optional): Wavelengths to
+            simulate, within the extinction table. Defaults to None, those of
+            the extinction table.
+            source_intensity (float, optional): Detected intensity with no
+            attenuation. Defaults to 1e7.
+            intensity_noise (float, optional): Standard deviation of the
+            multiplicative Gaussian noise on intensities. Defaults to 0.
+            seed (Optional[int], optional): Seed of the noise. Defaults to
+            None.
+        """
+        table = (
+            ExtinctionCoefficients.to_numpy()
+            if extinction is None
+            else np.asarray(extinction, dtype=np.float64)
+        )
+        if wavelengths is not None:
+            wavelengths = np.asarray(wavelengths, dtype=np.float64)
+            table = np.column_stack(
+                [wavelengths]
+                + [
+                    np.interp(wavelengths, table[:, 0], table[:, i])
+                    for i in range(1, table.shape[1])
+                ]
+            )
+        self.extinction: NDArray = table
+        self.wavelengths: NDArray = table[:, 0]
+        self.distances: NDArray = np.asarray(distances, dtype=np.float64)
+        self.boundary_condition_type = boundary_condition_type
+        self.source_intensity = source_intensity
+        self.intensity_noise = intensity_noise
+        self._rng = np.random.default_rng(seed)
+
+        # Least squares slope of attenuation against distance
+        design = np.column_stack(
+            [self.distances, np.ones_like(self.distances)]
+        )
+        self._slope_weights: NDArray = np.linalg.pinv(design)[0]
+
+    def attenuation(self, parameters: TissueParameters) -> NDArray:
+        """`k`x`T`x`W` noise free attenuation at each distance"""
+        model = get_model(
+            self.boundary_condition_type, QuantityType.ATTENUATION, None
+        )
+        mus = parameters.mus(self.wavelengths)
+        mua = parameters.mua(self.extinction)
+        return np.stack([model(mus, mua, d) for d in self.distances])
+
+    def model_slopes(
+        self,
+        parameters: TissueParameters,
+        distance: Optional[float] = None,
+        distance_max: Optional[float] = None,
+    ) -> NDArray:
+        """`T`x`W` noise free attenuation slopes as calc_values models them
+
+        Args:
+            parameters (TissueParameters): Parameters of each frame
+            distance (Optional[float], optional): (Minimal) distance.
+            Defaults to None, the mean distance.
+            distance_max (Optional[float], optional): Maximal distance for
+            the long separation model. Defaults to None.
+        """
+        model = get_model(
+            self.boundary_condition_type,
+            QuantityType.ATTENUATION_SLOPE,
+            distance_max,
+        )
+        if distance is None:
+            distance = float(self.distances.mean())
+        mus = parameters.mus(self.wavelengths)
+        mua = parameters.mua(self.extinction)
+        if distance_max:
+            return model(mus, mua, distance, distance_max)
+        return model(mus, mua, distance)
+
+    def intensities(self, parameters: TissueParameters) -> NDArray:
+        """`k`x`T`x`W` intensity spectra with noise"""
+        intensities = self.source_intensity * np.power(
+            10.0, -self.attenuation(parameters)
+        )
+        if self.intensity_noise:
+            intensities *= 1 + self._rng.normal(
+                0, self.intensity_noise, intensities.shape
+            )
+        return intensities
+
+    def measured_slopes(self, intensities: NDArray) -> NDArray:
+        """`T`x`W` attenuation slopes regressed across the distances"""
+        attenuation = np.log10(self.source_intensity / intensities)
+        return np.tensordot(self._slope_weights, attenuation, axes=(0, 0))
+
+    def stream(
+        self,
+        n_frames: int,
+        chunk_size: int = 1000,
+        frame_rate: float = 10.0,
+        trajectory: Optional[Trajectory] = None,
+    ) -> Iterator[SyntheticChunk]:
+        """Simulate a recording chunk by chunk
+
+        Only one chunk is held in memory at a time. The same seed and chunk
+        size reproduce the same recording.
+
+        Args:
+            n_frames (int): Length of the recording
+            chunk_size (int, optional): Frames per chunk. Defaults to 1000.
+            frame_rate (float, optional): Frames per second. Defaults to 10.
+            trajectory (Optional[Trajectory], optional): Parameters of each
+            frame. Defaults to None, physiological_trajectory().
+
+        Yields:
+            Iterator[SyntheticChunk]: Consecutive chunks
+        """
+        if trajectory is None:
+            trajectory = physiological_trajectory(seed=0)
+        for start in range(0, n_frames, chunk_size):
+            stop = min(start + chunk_size, n_frames)
+            parameters = trajectory(start, stop, frame_rate)
+            intensities = self.intensities(parameters)
+            yield SyntheticChunk(
+                start=start,
+                time=np.arange(start, stop) / frame_rate,
+                parameters=parameters,
+                intensities=intensities,
+                slopes=self.measured_slopes(intensities),
+            )
@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+import numpy as np
+from numpy.lib import recfunctions
+from numpy.typing import NDArray
+from scipy.signal import lfilter
+
+from .batch import FIT_DTYPE, BatchFitResult
+
+TemporalReduction = Literal["block", "ema", "decimate"]
+Expansion = Literal["linear", "previous"]
+
+
+def reduction_factor(n_frames: int, n_fits: int) -> int:
+    """Frames per fit so a recording of `n_frames` takes at most `n_fits`
+
+    Raises:
+        ValueError: Error if `n_fits` is below 1
+    """
+    if n_fits < 1:
+        raise ValueError(f"Need at least one fit, got n_fits={n_fits}")
+    return max(1, -(-n_frames // n_fits))
+
+
+@dataclass
+class ReducedSlopes:
+    """Slopes reduced in time and where they sit on the original timebase
+
+    Attributes:
+        slopes: `R`x`W` reduced slopes to fit
+        time: Time of each reduced slope, on the original timebase
+        original_time: Time of each of the `T` original frames, frame
+        indices if no timestamps were given
+        factor: Frames per reduced slope
+        method: Reduction used
+    """
+
+    slopes: NDArray
+    time: NDArray
+    original_time: NDArray
+    factor: int
+    method: TemporalReduction
+
+    def __len__(self) -> int:
+        return len(self.slopes)
+
+    def expand(self, values: NDArray, kind: Expansion = "linear") -> NDArray:
+        """Interpolate per slope results back to the original frames
+
+        Rows containing NaN, e.g. failed fits, are skipped, so their frames
+        are interpolated from the neighbouring results. Frames outside the
+        reduced times take the nearest result.
+
+        Args:
+            values (NDArray): `R`x`...` results, one row per reduced slope
+            kind (Expansion, optional): "linear" interpolation or "previous",
+            holding each result until the next. Defaults to "linear".
+
+        Raises:
+            ValueError: Error if `values` doesn't have a row per slope
+
+        Returns:
+            NDArray: `T`x`...` results
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[0] != len(self):
+            raise ValueError(
+                f"Expected {len(self)} rows of results, got {values.shape[0]}"
+            )
+        rows = values.reshape(len(self), -1)
+        valid = ~np.isnan(rows).any(axis=1)
+        out = np.full((len(self.original_time), rows.shape[1]), np.nan)
+        if valid.any():
+            out[:] = _interpolate_rows(
+                self.time[valid], rows[valid], self.original_time, kind
+            )
+        return out.reshape(len(self.original_time), *values.shape[1:])
+
+    def expand_fits(
+        self, result: BatchFitResult, kind: Expansion = "linear"
+    ) -> BatchFitResult:
+        """BatchFitResult of the reduced slopes expanded to every frame
+
+        Coefficients and scores are interpolated and stO2 recomputed from
+        the expanded HHb and HbO2, as interpolating the ratio itself would
+        disagree with them. Residuals aren't expanded.
+        """
+        expanded = self.expand(
+            recfunctions.structured_to_unstructured(result.fits), kind
+        )
+        out = BatchFitResult(len(self.original_time), time=self.original_time)
+        out.fits[:] = recfunctions.unstructured_to_structured(
+            expanded, FIT_DTYPE
+        )
+        out.fits["stO2"] = (
+            out.fits["HbO2"] / (out.fits["HHb"] + out.fits["HbO2"]) * 100
+        )
+        return out
+
+
+def _interpolate_rows(
+    source: NDArray, values: NDArray, target: NDArray, kind: Expansion
+) -> NDArray:
+    # np.interp for every column at once, holding the end values
+    if len(source) == 1:
+        return np.broadcast_to(values, (len(target), values.shape[1]))
+    left = np.clip(
+        np.searchsorted(source, target, side="right") - 1,
+        0,
+        len(source) - 1,
+    )
+    if kind == "previous":
+        return values[left]
+    if kind != "linear":
+        raise ValueError(f"Unknown expansion {kind}")
+    left = np.minimum(left, len(source) - 2)
+    weight = np.clip(
+        (target - source[left]) / (source[left + 1] - source[left]), 0, 1
+    )[:, np.newaxis]
+    return values[left] * (1 - weight) + values[left + 1] * weight
+
+
+def reduce_slopes(
+    slopes: NDArray,
+    factor: Optional[int] = None,
+    n_fits: Optional[int] = None,
+    method: TemporalReduction = "block",
+    time: Optional[NDArray] = None,
+    alpha: Optional[float] = None,
+) -> ReducedSlopes:
+    """Reduce a `T`x`W` slope series in time ahead of BRUNO
+
+    Saturation changes far slower than spectrometer frame rates, so fitting
+    one slope per `factor` frames loses little. Each method is one
+    vectorised pass over the series:
+
+    - "block" averages consecutive blocks of `factor` frames, leaving out
+      non-finite values, e.g. masked frames. Each mean sits at the centre
+      of its block.
+    - "ema" exponentially averages every frame, y = alpha * x + (1 - alpha)
+      * y_prev, sampled at the last frame of each block. Causal, so results
+      suit streaming, but lag the block mean. Non-finite values are skipped,
+      the weights of the finite ones renormalised, so a NaN frame doesn't
+      spread to every later slope.
+    - "decimate" keeps the middle frame of each block without averaging.
+
+    Example:
+        reduced = reduce_slopes(slopes, n_fits=600, time=time)
+        fits = calc_values_batch(reduced.slopes, ..., time=reduced.time)
+        every_frame = reduced.expand_fits(fits)
+
+    Args:
+        slopes (NDArray): `T`x`W` attenuation slopes
+        factor (Optional[int], optional): Frames per reduced slope.
+        Defaults to None.
+        n_fits (Optional[int], optional): Alternatively, the number of
+        reduced slopes wanted, e.g. the fits compute allows per recording.
+        Defaults to None.
+        method (TemporalReduction, optional): "block", "ema" or "decimate".
+        Defaults to "block".
+        time (Optional[NDArray], optional): Sorted timestamps of the frames.
+        Defaults to None, frame indices.
+        alpha (Optional[float], optional): Smoothing of "ema". Defaults to
+        None, 2 / (factor + 1), averaging over about one block.
+
+    Raises:
+        ValueError: Error if there are no slopes, unless exactly one of
+        `factor` and `n_fits` is given, or for an unknown method or
+        mismatched `time`
+
+    Returns:
+        ReducedSlopes: Reduced slopes with their times
+    """
+    slopes = np.atleast_2d(slopes)
+    n_frames = slopes.shape[0]
+    if slopes.size == 0:
+        raise ValueError(
+            f"Need at least one frame of slopes to reduce, got {slopes.shape}"
+        )
+    if (factor is None) == (n_fits is None):
+        raise ValueError("Give exactly one of factor and n_fits")
+    if factor is None:
+        factor = reduction_factor(n_frames, n_fits)  # type: ignore
+    if factor < 1:
+        raise ValueError(f"factor must be at least 1, got {factor}")
+    if time is None:
+        time = np.arange(n_frames, dtype=np.float64)
+    else:
+        time = np.asarray(time, dtype=np.float64)
+        if time.shape != (n_frames,):
+            raise ValueError(
+                f"Expected {n_frames} timestamps, got {time.shape[0]}"
+            )
+
+    starts = np.arange(0, n_frames, factor)
+    counts = np.diff(np.append(starts, n_frames))
+    if method == "block":
+        finite = np.isfinite(slopes)
+        sums = np.add.reduceat(
+            np.where(finite, slopes, 0.0), starts, axis=0, dtype=np.float64
+        )
+        n_finite = np.add.reduceat(finite, starts, axis=0, dtype=np.int64)
+        reduced = np.divide(
+            sums,
+            n_finite,
+            out=np.full(sums.shape, np.nan),
+            where=n_finite > 0,
+        )
+        positions = starts + (counts - 1) / 2
+    elif method == "ema":
+        if alpha is None:
+            alpha = 2 / (factor + 1)
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+        # Average the finite values and, alongside, the weight they carry,
+        # so non-finite frames are skipped by renormalising rather than
+        # carried forward. Both start from the first finite frame of each
+        # wavelength rather than zero
+        finite = np.isfinite(slopes)
+        first = np.where(
+            finite.any(axis=0),
+            slopes[finite.argmax(axis=0), np.arange(slopes.shape[1])],
+            0.0,
+        )
+        sums, weights = (
+            lfilter(
+                [alpha],
+                [1, alpha - 1],
+                values,
+                axis=0,
+                zi=(1 - alpha) * initial[np.newaxis],
+            )[0]
+            for values, initial in (
+                (np.where(finite, slopes, 0.0), first),
+                (finite.astype(np.float64), finite.any(axis=0)),
+            )
+        )
+        averaged = np.divide(
+            sums,
+            weights,
+            out=np.full(sums.shape, np.nan),
+            where=weights > 0,
+        )
+        last = starts + counts - 1
+        reduced = averaged[last]
+        positions = last.astype(np.float64)
+    elif method == "decimate":
+        middle = starts + (counts - 1) // 2
+        reduced = slopes[middle].astype(np.float64)
+        positions = middle.astype(np.float64)
+    else:
+        raise ValueError(f"Unknown reduction method {method}")
+
+    return ReducedSlopes(
+        reduced,
+        np.interp(positions, np.arange(n_frames), time),
+        time,
+        factor,
+        method,
+    )
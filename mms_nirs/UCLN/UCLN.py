@@ -1,8 +1,20 @@
-from typing import Literal, Optional, Tuple, TypedDict
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    TypedDict,
+    Union,
+)
 
 import numpy as np
 from numpy import linalg
-from scipy.interpolate import interp1d
+from numpy.typing import DTypeLike
+
+from ..profiling import profiled, stage
+from ..utils.interpolation import check_interpolation_range, spline_operator
 
 
 class DifferentialPathlengthFactors(TypedDict):
@@ -14,6 +26,35 @@ class DifferentialPathlengthFactors(TypedDict):
 
 DpfType = Literal["baby_head", "adult_head", "adult_arm", "adult_leg"]
 
+OutputLayout = Literal["channel", "time", "species"]
+
+# Order of the channel, time and species axes in memory for each layout
+_LAYOUT_AXES = {"channel": (0, 1, 2), "time": (1, 0, 2), "species": (2, 0, 1)}
+
+
+@dataclass(frozen=True)
+class ExtinctionFactorisation:
+    """Thin SVD `U diag(s) Vt` of an extinction co-efficients matrix
+
+    Singular values below numpy's default `pinv` cutoff are dropped, so
+    `pinv` matches `linalg.pinv` and `U` spans the space of spectra the
+    species can explain.
+    """
+
+    u: np.ndarray
+    s: np.ndarray
+    vt: np.ndarray
+    pinv: np.ndarray
+
+    @classmethod
+    def of(
+        cls, extinction_coefficients: np.ndarray
+    ) -> "ExtinctionFactorisation":
+        u, s, vt = linalg.svd(extinction_coefficients, full_matrices=False)
+        rank = int(np.sum(s > 1e-15 * s.max())) if s.size else 0
+        u, s, vt = u[:, :rank], s[:rank], vt[:rank]
+        return cls(u, s, vt, (vt.T / s) @ u.T)
+
 
 class UCLNConstants:
     """Class for holding MBL constants"""
@@ -43,61 +84,326 @@ class UCLNConstants:
         self.interp_wavelengths: np.ndarray = np.arange(
             min_wavelength, max_wavelength + 1
         )
+        self._factorisations: Dict[
+            Optional[Tuple[int, ...]], ExtinctionFactorisation
+        ] = {}
+
+    def factorisation(
+        self, species: Optional[Sequence[int]] = None
+    ) -> ExtinctionFactorisation:
+        """Factorisation of the extinction co-efficients of some species
+
+        Computed on first use and cached, so `extinction_coefficients` must
+        not be modified in place afterwards.
+
+        Args:
+            species (Optional[Sequence[int]], optional): Columns of
+            `extinction_coefficients` to solve for. Defaults to None, all.
+
+        Returns:
+            ExtinctionFactorisation: Cached factorisation
+        """
+        key = None if species is None else tuple(species)
+        if key not in self._factorisations:
+            extinction = (
+                self.extinction_coefficients
+                if key is None
+                else self.extinction_coefficients[:, list(key)]
+            )
+            self._factorisations[key] = ExtinctionFactorisation.of(extinction)
+        return self._factorisations[key]
 
 
 class UCLN:
     """Class for calculating conc. using the Modified Beer-Lambert Law"""
 
-    def __init__(self, constants: UCLNConstants) -> None:
+    def __init__(
+        self, constants: UCLNConstants, chunk_size: int = 1024
+    ) -> None:
+        """
+        Args:
+            constants (UCLNConstants): MBL constants
+            chunk_size (int, optional): Spectra converted to attenuation and
+            interpolated at a time, bounding the working memory. Defaults to
+            1024.
+        """
         self.constants: UCLNConstants = constants
+        self.chunk_size = chunk_size
         self.attenuation_interp_wavelength_dependency: Optional[
             np.ndarray
         ] = None
+        self._operator_key: Optional[bytes] = None
+        self._operator_matrix: Optional[np.ndarray] = None
 
     def _calc_change_in_attenuation(
-        self, spectra: np.ndarray, spectra_wavelengths: np.ndarray
+        self,
+        spectra: np.ndarray,
+        spectra_wavelengths: np.ndarray,
+        wavelength_dependency: Optional[np.ndarray] = None,
+        dtype: DTypeLike = np.float64,
     ) -> None:
-        # Preallocate arrays
-        n_spectra = spectra.shape[0]
-        attenuation: np.ndarray = np.zeros(spectra.shape)
-        attenuation_interp: np.ndarray = np.zeros(
-            (self.constants.interp_wavelengths.size, n_spectra)
-        )
+        interp_wavelengths = self.constants.interp_wavelengths
+        check_interpolation_range(spectra_wavelengths, interp_wavelengths)
 
-        for i in range(n_spectra):
-            attenuation[i, :] = np.log10(spectra[0, :] / spectra[i, :])
-            attenuation_interp[:, i] = interp1d(
-                spectra_wavelengths,
-                attenuation[i, :].T,
-                kind="cubic",
-            )(self.constants.interp_wavelengths)
+        with stage("UCLN.interpolation"):
+            # Factorised once per pair of grids and shared by every instance
+            operator = spline_operator(spectra_wavelengths, interp_wavelengths)
+            attenuation_interp = np.empty(
+                (spectra.shape[0], interp_wavelengths.size), dtype
+            )
+            # Only a chunk of attenuation on the source grid exists at once
+            for start in range(0, spectra.shape[0], self.chunk_size):
+                stop = start + self.chunk_size
+                attenuation = np.divide(
+                    spectra[:1, :], spectra[start:stop], dtype=dtype
+                )
+                np.log10(attenuation, out=attenuation)
+                operator.apply(
+                    attenuation,
+                    out=attenuation_interp[start:stop],
+                    chunk_size=self.chunk_size,
+                )
 
+        if wavelength_dependency is None:
+            wavelength_dependency = self.constants.wavelength_dependency
         self.attenuation_interp_wavelength_dependency = np.divide(
-            attenuation_interp.T, self.constants.wavelength_dependency
+            attenuation_interp, wavelength_dependency, dtype=dtype
         )
 
+    @profiled("UCLN.calc_concentrations")
     def calc_concentrations(
-        self, spectra: np.ndarray, spectra_wavelengths: np.ndarray
-    ) -> Optional[np.ndarray]:
+        self,
+        spectra: np.ndarray,
+        spectra_wavelengths: np.ndarray,
+        dpf: Optional[Union[float, np.ndarray]] = None,
+        species: Optional[Sequence[int]] = None,
+        return_residuals: bool = False,
+        dtype: DTypeLike = np.float64,
+    ) -> Union[Optional[np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        """Calculate concentration changes relative to the first spectrum
+
+        The least squares problem is solved with the factorisation cached in
+        the constants. Residuals are reconstructed as x - U U^T x from the
+        projection onto the space the species span, a second pass over the
+        attenuation only taken when `return_residuals`. The cheaper identity
+        |r|^2 = |x|^2 - |U^T x|^2 cancels to nothing for near exact fits,
+        in float32 especially.
+
+        Args:
+            spectra (np.ndarray): `T`x`W` intensity spectra
+            spectra_wavelengths (np.ndarray): Wavelengths of the spectra
+            dpf (Optional[Union[float, np.ndarray]], optional): Differential
+            pathlength factor replacing `constants.dpf`. A length `T` array
+            gives one factor per frame, still scaled by the wavelength
+            dependency. A `T`x`M` array, on `constants.interp_wavelengths`,
+            is the full time-varying DPF, e.g. from calc_dpf_series, and
+            replaces the wavelength dependency. Defaults to None, using
+            `constants.dpf`.
+            species (Optional[Sequence[int]], optional): Columns of the
+            extinction co-efficients to solve for. Defaults to None, all.
+            return_residuals (bool, optional): Also return the norm of each
+            frame's least squares residual, in units of the wavelength
+            dependency scaled attenuation. Defaults to False.
+            dtype (DTypeLike, optional): Type of the attenuation and
+            concentration arrays, e.g. np.float32 to halve memory for
+            integer counts. Residuals are taken in this type, their norms
+            accumulated in float64.
+            Defaults to np.float64.
+
+        Raises:
+            ValueError: Error if `dpf` doesn't match the spectra, or the
+            spectra don't cover the interpolation wavelengths
+
+        Returns:
+            Union[Optional[np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+            `T`x`species` concentrations, and length `T` residual norms if
+            `return_residuals`
+        """
+        n_spectra = spectra.shape[0]
+        n_wavelengths = self.constants.interp_wavelengths.size
+        wavelength_dependency: Optional[np.ndarray] = None
+        pathlength_factor: Union[float, np.ndarray] = self.constants.dpf
+        if dpf is not None:
+            dpf = np.asarray(dpf, dtype=np.float64)
+            if dpf.ndim == 2:
+                if dpf.shape != (n_spectra, n_wavelengths):
+                    raise ValueError(
+                        "Expected a DPF of shape "
+                        f"{(n_spectra, n_wavelengths)}, got {dpf.shape}"
+                    )
+                # The DPF spectrum replaces the wavelength dependency
+                wavelength_dependency, pathlength_factor = dpf, 1.0
+            elif dpf.ndim == 1 and dpf.size != n_spectra:
+                raise ValueError(
+                    f"Expected one DPF per spectrum, got {dpf.size} DPFs for "
+                    f"{n_spectra} spectra"
+                )
+            else:
+                # Broadcasts along the time axis of the T x species result
+                pathlength_factor = dpf[..., np.newaxis]
+
         # Calculate change in attenuation
-        self._calc_change_in_attenuation(spectra, spectra_wavelengths)
+        self._calc_change_in_attenuation(
+            spectra, spectra_wavelengths, wavelength_dependency, dtype
+        )
 
         # Note: The inverse of the matrix isn't unique meaning these differ
         # from the MATLAB equivalents
-        ext_coeffs_inv: np.ndarray = linalg.pinv(
-            self.constants.extinction_coefficients
+        with stage("UCLN.pinv"):
+            factorisation = self.constants.factorisation(species)
+
+        attenuation = self.attenuation_interp_wavelength_dependency
+        if attenuation is None:
+            return None
+
+        # Coordinates of each frame in the space the species span
+        projected = attenuation @ factorisation.u.astype(dtype)
+        concentrations = (
+            projected / factorisation.s.astype(dtype)
+        ) @ factorisation.vt.astype(dtype)
+        concentrations *= np.asarray(
+            1 / (self.constants.optode_dist * pathlength_factor), dtype
         )
+        if not return_residuals:
+            return concentrations
 
-        optode_dist = self.constants.optode_dist
-        dpf = self.constants.dpf
+        # Subtract the projection rather than its squared norm, as
+        # |x|^2 - |U^T x|^2 cancels to nothing for near exact fits
+        residual = attenuation - projected @ factorisation.u.T.astype(dtype)
+        return concentrations, np.sqrt(
+            np.einsum("ij,ij->i", residual, residual, dtype=np.float64)
+        )
 
-        if self.attenuation_interp_wavelength_dependency is not None:
-            return np.transpose(
-                np.matmul(
-                    ext_coeffs_inv,
-                    self.attenuation_interp_wavelength_dependency.T,
-                )
-                * (1 / (optode_dist * dpf))
+    def _operator(self, spectra_wavelengths: np.ndarray) -> np.ndarray:
+        """`species`x`W` operator from attenuation spectra to
+        concentrations per unit pathlength
+
+        Interpolation, the wavelength dependency and the pseudo-inverse are
+        all linear, so they collapse into one matrix, cached for the last
+        spectra wavelengths seen. The dense interpolation matrix is never
+        formed.
+        """
+        key = np.asarray(spectra_wavelengths, dtype=np.float64).tobytes()
+        if self._operator_key != key:
+            check_interpolation_range(
+                spectra_wavelengths, self.constants.interp_wavelengths
             )
-        else:
-            return None
+            with stage("UCLN.pinv"):
+                ext_coeffs_inv = self.constants.factorisation().pinv
+            with stage("UCLN.interpolation"):
+                self._operator_matrix = spline_operator(
+                    spectra_wavelengths, self.constants.interp_wavelengths
+                ).fold(ext_coeffs_inv / self.constants.wavelength_dependency)
+            self._operator_key = key
+        return self._operator_matrix
+
+    @profiled("UCLN.calc_concentrations_multichannel")
+    def calc_concentrations_multichannel(
+        self,
+        spectra: np.ndarray,
+        spectra_wavelengths: np.ndarray,
+        optode_dist: Optional[Union[float, np.ndarray]] = None,
+        dpf: Optional[Union[float, np.ndarray]] = None,
+        layout: OutputLayout = "channel",
+        dtype: DTypeLike = np.float64,
+    ) -> np.ndarray:
+        """Calculate concentration changes of every channel at once
+
+        Each channel is measured against its own first spectrum, as in
+        calc_concentrations, and every channel shares one precomputed
+        operator, so the work is a batched contraction. It runs over
+        `chunk_size` frames at a time, so attenuation only exists as a
+        `C`x`chunk_size`x`W` block.
+
+        Args:
+            spectra (np.ndarray): `C`x`T`x`W` intensity spectra of `C`
+            channels
+            spectra_wavelengths (np.ndarray): Wavelengths of the spectra,
+            shared by all channels
+            optode_dist (Optional[Union[float, np.ndarray]], optional):
+            Optode distance, or length `C` array of one per channel.
+            Defaults to None, using `constants.optode_dist`.
+            dpf (Optional[Union[float, np.ndarray]], optional): Differential
+            pathlength factor, length `C` array of one per channel or
+            `C`x`T` array of one per channel and frame. Defaults to None,
+            using `constants.dpf`.
+            layout (OutputLayout, optional): Axis that is outermost in
+            memory: "channel" makes each channel's `T`x`species` block
+            contiguous, "time" each frame's `C`x`species` block and
+            "species" each species' `C`x`T` block. Defaults to "channel".
+            dtype (DTypeLike, optional): Type of the attenuation and
+            concentration arrays, e.g. np.float32 to halve memory for
+            integer counts. Defaults to np.float64.
+
+        Raises:
+            ValueError: Error if the spectra aren't 3D, the distances or
+            DPFs don't match them, or the spectra don't cover the
+            interpolation wavelengths
+
+        Returns:
+            np.ndarray: `C`x`T`x`species` concentrations, laid out in memory
+            as `layout` describes
+        """
+        spectra = np.asarray(spectra)
+        if spectra.ndim != 3:
+            raise ValueError(
+                f"Expected C x T x W spectra, got {spectra.ndim} dimensions"
+            )
+        n_channels, n_spectra, _ = spectra.shape
+        if layout not in _LAYOUT_AXES:
+            raise ValueError(
+                f"Unknown layout {layout}, expected one of "
+                f"{list(_LAYOUT_AXES)}"
+            )
+
+        optode_dist = np.asarray(
+            self.constants.optode_dist if optode_dist is None else optode_dist,
+            dtype=np.float64,
+        )
+        dpf = np.asarray(
+            self.constants.dpf if dpf is None else dpf, dtype=np.float64
+        )
+        if optode_dist.ndim > 1 or optode_dist.size not in (1, n_channels):
+            raise ValueError(
+                f"Expected one optode distance per channel, got "
+                f"{optode_dist.shape} for {n_channels} channels"
+            )
+        if dpf.ndim == 1 and dpf.size not in (1, n_channels):
+            raise ValueError(
+                f"Expected one DPF per channel, got {dpf.size} DPFs for "
+                f"{n_channels} channels"
+            )
+        if dpf.ndim == 2 and dpf.shape != (n_channels, n_spectra):
+            raise ValueError(
+                f"Expected a DPF of shape {(n_channels, n_spectra)}, got "
+                f"{dpf.shape}"
+            )
+        if dpf.ndim > 2:
+            raise ValueError(f"Expected at most a 2D DPF, got {dpf.ndim}D")
+
+        operator = self._operator(spectra_wavelengths).astype(dtype)
+
+        # Allocate with `layout`'s axis first and view it as C x T x species
+        axes = _LAYOUT_AXES[layout]
+        shape = (n_channels, n_spectra, operator.shape[0])
+        concentrations = np.empty(
+            [shape[axis] for axis in axes], dtype
+        ).transpose(np.argsort(axes))
+
+        for start in range(0, n_spectra, self.chunk_size):
+            stop = start + self.chunk_size
+            # Attenuation against the first spectrum of each channel
+            attenuation = np.divide(
+                spectra[:, :1, :], spectra[:, start:stop], dtype=dtype
+            )
+            np.log10(attenuation, out=attenuation)
+            np.matmul(
+                attenuation, operator.T, out=concentrations[:, start:stop]
+            )
+
+        # Broadcasts to C x T
+        pathlength = optode_dist.reshape(-1, 1) * (
+            dpf[:, np.newaxis] if dpf.ndim == 1 else dpf
+        )
+        concentrations /= pathlength[:, :, np.newaxis].astype(dtype)
+        return concentrations
@@ -1,3 +1,16 @@
-__all__ = ["UCLN", "UCLNConstants", "DefaultValues", "DpfType"]
+__all__ = [
+    "UCLN",
+    "UCLNConstants",
+    "DefaultValues",
+    "DpfType",
+    "OutputLayout",
+    "ExtinctionFactorisation",
+]
 from .DefaultValues import DefaultValues
-from .UCLN import UCLN, DpfType, UCLNConstants
+from .UCLN import (
+    UCLN,
+    DpfType,
+    ExtinctionFactorisation,
+    OutputLayout,
+    UCLNConstants,
+)
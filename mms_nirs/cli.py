@@ -0,0 +1,395 @@
+import argparse
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Sequence,
+    Sized,
+    Tuple,
+)
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+from .BRUNO import (
+    BatchCheckpoint,
+    BatchFitResult,
+    Boundaries,
+    BoundaryType,
+    FitCache,
+    calc_values_batch,
+)
+from .BRUNO.backends import Backend
+from .BRUNO.temporal import TemporalReduction, reduce_slopes
+from .UCLN import UCLN, DefaultValues, UCLNConstants
+from .utils.result_writer import ConcentrationWriter, FitWriter
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+
+def read_chunks(path: Path, chunk_size: int) -> Iterator[NDArray]:
+    """Read a `T`x`W` matrix of spectra in chunks of rows
+
+    `.npy` files are memory mapped, anything else is read as headerless CSV.
+
+    Args:
+        path (Path): File to read
+        chunk_size (int): Number of rows per chunk
+
+    Yields:
+        Iterator[NDArray]: Chunks of at most `chunk_size` rows, none for an
+        empty file
+    """
+    if path.suffix == ".npy":
+        spectra = np.load(path, mmap_mode="r")
+        for start in range(0, spectra.shape[0], chunk_size):
+            yield np.asarray(spectra[start : start + chunk_size])
+    else:
+        try:
+            reader = pd.read_csv(path, header=None, chunksize=chunk_size)
+        except pd.errors.EmptyDataError:
+            return
+        for chunk in reader:
+            yield chunk.to_numpy(dtype=np.float64)
+
+
+def count_rows(path: Path) -> int:
+    """Number of spectra in a file read by read_chunks"""
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode="r").shape[0]
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def read_vector(path: Path) -> NDArray:
+    if path.suffix == ".npy":
+        return np.load(path)
+    return np.genfromtxt(path, delimiter=",")
+
+
+def _ucln_chunk(
+    constants: UCLNConstants,
+    reference: NDArray,
+    spectra: NDArray,
+    spectra_wavelengths: NDArray,
+) -> NDArray:
+    # UCLN measures attenuation against the first spectrum, so prepend the
+    # first spectrum of the recording and drop its row from the output
+    conc = UCLN(constants).calc_concentrations(
+        np.vstack([reference, spectra]), spectra_wavelengths
+    )
+    assert conc is not None
+    return conc[1:]
+
+
+def _bruno_chunk(
+    slopes: NDArray,
+    extinction: NDArray,
+    wavelengths: NDArray,
+    boundaries: NDArray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float],
+    backend: Backend,
+    cache: Optional[FitCache] = None,
+    frames_per_fit: int = 1,
+    reduction: TemporalReduction = "block",
+) -> BatchFitResult:
+    if frames_per_fit == 1:
+        return calc_values_batch(
+            slopes,
+            extinction,
+            wavelengths,
+            boundaries,
+            boundary_condition_type,
+            distance,
+            distance_max,
+            backend,
+            cache=cache,
+        )
+
+    # Fit the reduced slopes and interpolate the fits back to every frame
+    reduced = reduce_slopes(slopes, frames_per_fit, method=reduction)
+    fits = calc_values_batch(
+        reduced.slopes,
+        extinction,
+        wavelengths,
+        boundaries,
+        boundary_condition_type,
+        distance,
+        distance_max,
+        backend,
+        cache=cache,
+    )
+    expanded = reduced.expand_fits(fits)
+    # Times are local to the chunk, the writer numbers frames itself
+    expanded.time = None
+    return expanded
+
+
+def _run_chunks(
+    chunks: Iterator[NDArray],
+    work: Callable[[NDArray], Tuple[Callable, tuple]],
+    write: Callable[[Any], None],
+    workers: int,
+) -> int:
+    """Process chunks on `workers` processes, writing them out in order"""
+    n_frames = 0
+
+    def write_result(result: Sized) -> None:
+        nonlocal n_frames
+        write(result)
+        n_frames += len(result)
+
+    if workers == 1:
+        for chunk in chunks:
+            fn, args = work(chunk)
+            write_result(fn(*args))
+        return n_frames
+
+    executor: Executor = ProcessPoolExecutor(max_workers=workers)
+    in_flight: Dict[int, Future] = {}
+    next_to_write = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            fn, args = work(chunk)
+            in_flight[i] = executor.submit(fn, *args)
+            # Bound memory by keeping at most two chunks per worker
+            while len(in_flight) >= 2 * workers:
+                write_result(in_flight.pop(next_to_write).result())
+                next_to_write += 1
+        while in_flight:
+            write_result(in_flight.pop(next_to_write).result())
+            next_to_write += 1
+    finally:
+        executor.shutdown(cancel_futures=True)
+    return n_frames
+
+
+def _peak_memory_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return usage / 1024
+
+
+def run_ucln(args: argparse.Namespace) -> int:
+    defaults = DefaultValues(species=args.species)
+    constants = UCLNConstants(
+        extinction_coefficients=defaults.extinction_coefficients,
+        wavelength_dependency_of_pathlength=defaults.wavelength_dependency,
+        optode_dist=args.optode_dist,
+        dpf_type=args.dpf_type,
+        wavelengths=(args.min_wavelength, args.max_wavelength),
+    )
+    spectra_wavelengths = read_vector(args.wavelengths)
+    chunks = read_chunks(args.spectra, args.chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        raise SystemExit(f"No spectra in {args.spectra}")
+    reference = first[:1]
+
+    def all_chunks() -> Iterator[NDArray]:
+        yield first
+        yield from chunks
+
+    with ConcentrationWriter(args.output, args.species) as writer:
+        return _run_chunks(
+            all_chunks(),
+            lambda chunk: (
+                _ucln_chunk,
+                (constants, reference, chunk, spectra_wavelengths),
+            ),
+            writer.write,
+            args.workers,
+        )
+
+
+def run_bruno(args: argparse.Namespace) -> int:
+    extinction = np.genfromtxt(args.extinction, delimiter=",")
+    wavelengths = read_vector(args.wavelengths)
+    boundaries = Boundaries.boundaries
+    cache = None if args.cache is None else FitCache(args.cache)
+    fit_args = (
+        extinction,
+        wavelengths,
+        boundaries,
+        BoundaryType[args.boundary],
+        args.distance,
+        args.distance_max,
+        args.backend,
+        cache,
+        args.frames_per_fit,
+        args.reduce,
+    )
+
+    if args.checkpoint is None:
+        with FitWriter(args.output) as writer:
+            return _run_chunks(
+                read_chunks(args.spectra, args.chunk_size),
+                lambda chunk: (_bruno_chunk, (chunk, *fit_args)),
+                writer.write_results,
+                args.workers,
+            )
+
+    # The input file is keyed by its size and modification time rather than
+    # read in full to hash it
+    stat = args.spectra.stat()
+    checkpoint = BatchCheckpoint(
+        args.checkpoint,
+        FitCache.key(
+            str(args.spectra.resolve()),
+            stat.st_size,
+            stat.st_mtime_ns,
+            *fit_args[:7],
+            args.frames_per_fit,
+            args.reduce,
+        ),
+        count_rows(args.spectra),
+        args.chunk_size,
+    )
+    # Chunks are written in order, so the pending indices are saved to in
+    # the order they were submitted
+    submitted: deque = deque()
+
+    def pending_chunks() -> Iterator[NDArray]:
+        for index, chunk in enumerate(
+            read_chunks(args.spectra, args.chunk_size)
+        ):
+            if index not in checkpoint.completed:
+                submitted.append(index)
+                yield chunk
+
+    n_spectra = _run_chunks(
+        pending_chunks(),
+        lambda chunk: (_bruno_chunk, (chunk, *fit_args)),
+        lambda result: checkpoint.save(submitted.popleft(), result),
+        args.workers,
+    )
+    with FitWriter(args.output) as writer:
+        for result in checkpoint.chunks():
+            writer.write_results(result)
+    return n_spectra
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mms-nirs",
+        description="Batch process NIRS spectra with UCLN and BRUNO",
+    )
+    subparsers = parser.add_subparsers(dest="algorithm", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "spectra",
+        type=Path,
+        help="T x W matrix, one spectrum per row (.csv or memmapped .npy)",
+    )
+    common.add_argument(
+        "--wavelengths",
+        type=Path,
+        required=True,
+        help="Wavelengths of the columns of the spectra (.csv or .npy)",
+    )
+    common.add_argument(
+        "-o", "--output", type=Path, required=True, help="Parquet file"
+    )
+    common.add_argument("--chunk-size", type=int, default=1000)
+    common.add_argument("-j", "--workers", type=int, default=1)
+
+    ucln = subparsers.add_parser(
+        "ucln", parents=[common], help="Concentrations from intensities"
+    )
+    ucln.add_argument("--optode-dist", type=float, default=3.0)
+    ucln.add_argument(
+        "--dpf-type",
+        default="adult_head",
+        choices=["baby_head", "adult_head", "adult_arm", "adult_leg"],
+    )
+    ucln.add_argument("--min-wavelength", type=float, default=780.0)
+    ucln.add_argument("--max-wavelength", type=float, default=900.0)
+    ucln.add_argument("--species", nargs="+", default=["HbO2", "HHb", "CCO"])
+    ucln.set_defaults(run=run_ucln)
+
+    bruno = subparsers.add_parser(
+        "bruno", parents=[common], help="stO2 from attenuation slopes"
+    )
+    bruno.add_argument(
+        "--extinction",
+        type=Path,
+        required=True,
+        help="Extinction co-efficients CSV, W x 4 as used by calc_values",
+    )
+    bruno.add_argument("--distance", type=float, required=True)
+    bruno.add_argument("--distance-max", type=float, default=None)
+    bruno.add_argument(
+        "--boundary", choices=[bc.name for bc in BoundaryType], default="ZBC"
+    )
+    bruno.add_argument(
+        "--backend", choices=["numpy", "numba"], default="numpy"
+    )
+    bruno.add_argument(
+        "--cache",
+        type=Path,
+        default=None,
+        help="SQLite file to reuse fits of unchanged slopes from",
+    )
+    bruno.add_argument(
+        "--frames-per-fit",
+        type=int,
+        default=1,
+        help="Fit one reduced slope per this many frames, interpolating the "
+        "fits back to every frame. Best a divisor of --chunk-size",
+    )
+    bruno.add_argument(
+        "--reduce",
+        choices=["block", "ema", "decimate"],
+        default="block",
+        help="How --frames-per-fit frames are reduced to one slope",
+    )
+    bruno.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=None,
+        help="Directory completed chunks are saved to, so rerunning an "
+        "interrupted job resumes from them",
+    )
+    bruno.set_defaults(run=run_bruno)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    start = time.perf_counter()
+    n_spectra = args.run(args)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Processed {n_spectra} spectra in {elapsed:.2f}s "
+        f"({n_spectra / elapsed:.1f} spectra/s)"
+    )
+    peak_memory = _peak_memory_mb()
+    if peak_memory is not None:
+        print(f"Peak memory: {peak_memory:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
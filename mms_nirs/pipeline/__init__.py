@@ -0,0 +1,27 @@
+__all__ = [
+    "AdaptiveBudget",
+    "AsyncFitter",
+    "FramePipeline",
+    "FrameResult",
+    "FrameRingBuffer",
+    "SharedArray",
+    "SharedArrays",
+    "StageLatencies",
+    "StreamingFitter",
+    "calc_concentrations_shared",
+    "calc_values_shared",
+]
+from .async_jobs import AsyncFitter
+from .frame_pipeline import (
+    FramePipeline,
+    FrameResult,
+    FrameRingBuffer,
+    StageLatencies,
+)
+from .shared_memory import (
+    SharedArray,
+    SharedArrays,
+    calc_concentrations_shared,
+    calc_values_shared,
+)
+from .streaming import AdaptiveBudget, StreamingFitter
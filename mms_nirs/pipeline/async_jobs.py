@@ -0,0 +1,203 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..BRUNO import BoundaryType, calc_values
+from ..BRUNO.backends import Backend
+from ..UCLN import UCLN, UCLNConstants
+
+
+def _run_ucln(
+    constants: UCLNConstants, spectra: NDArray, spectra_wavelengths: NDArray
+) -> Optional[NDArray]:
+    return UCLN(constants).calc_concentrations(spectra, spectra_wavelengths)
+
+
+class _Job:
+    def __init__(
+        self,
+        fn: Callable,
+        args: tuple,
+        future: asyncio.Future,
+        key: Optional[Hashable],
+    ) -> None:
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.key = key
+
+
+class AsyncFitter:
+    """asyncio front-end running BRUNO and UCLN jobs on an executor
+
+    Jobs wait in a bounded queue until one of `max_workers` dispatchers
+    hands them to the executor, so at most `max_workers` jobs run at once
+    and submitting blocks (applying backpressure) once `max_pending` jobs
+    are waiting.
+
+    Jobs submitted with a `key`, e.g. a channel name, supersede any job with
+    the same key that is still waiting: the stale job is replaced in its
+    queue slot and its future is cancelled.
+
+    Example:
+        async with AsyncFitter(max_workers=2) as fitter:
+            result = await fitter.submit_bruno(..., key="channel 1")
+            stO2, coefficients, *_ = await result
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_pending: int = 8,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """
+        Args:
+            max_workers (int, optional): Maximum number of jobs running at
+            once. Defaults to 1.
+            max_pending (int, optional): Maximum number of jobs waiting to
+            run. Defaults to 8.
+            executor (Optional[Executor], optional): Executor to run jobs on.
+            Defaults to None, creating a process pool with `max_workers`
+            processes that is shut down on close.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._owns_executor = executor is None
+        self._executor: Executor = executor or ProcessPoolExecutor(
+            max_workers=max_workers
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Dict[Hashable, _Job] = {}
+        self._dispatchers: List[asyncio.Task] = []
+        self.superseded = 0
+
+    async def __aenter__(self) -> "AsyncFitter":
+        self._start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._dispatchers = [
+                asyncio.create_task(self._dispatch())
+                for _ in range(self.max_workers)
+            ]
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        assert self._queue is not None
+        while True:
+            job: _Job = await self._queue.get()
+            if job.key is not None:
+                self._pending.pop(job.key, None)
+            try:
+                if job.future.cancelled():
+                    continue
+                try:
+                    result = await loop.run_in_executor(
+                        self._executor, job.fn, *job.args
+                    )
+                except asyncio.CancelledError:
+                    job.future.cancel()
+                    raise
+                except Exception as error:
+                    if not job.future.done():
+                        job.future.set_exception(error)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def submit(
+        self, fn: Callable, *args: Any, key: Optional[Hashable] = None
+    ) -> asyncio.Future:
+        """Queue `fn(*args)` to run on the executor
+
+        Waits while the queue is full, unless the job supersedes a waiting
+        job with the same `key`.
+
+        Args:
+            fn (Callable): Picklable function to run
+            key (Optional[Hashable], optional): Jobs with the same key
+            supersede each other while waiting. Defaults to None.
+
+        Returns:
+            asyncio.Future: Awaitable resolving to the return value of `fn`
+        """
+        self._start()
+        assert self._queue is not None
+        future = asyncio.get_running_loop().create_future()
+
+        stale = self._pending.get(key) if key is not None else None
+        if stale is not None:
+            stale.future.cancel()
+            stale.fn, stale.args, stale.future = fn, args, future
+            self.superseded += 1
+            return future
+
+        job = _Job(fn, args, future, key)
+        if key is not None:
+            self._pending[key] = job
+        await self._queue.put(job)
+        return future
+
+    async def submit_bruno(
+        self,
+        slope: np.ndarray,
+        extinction: np.ndarray,
+        wavelengths: np.ndarray,
+        boundaries: np.ndarray,
+        boundary_condition_type: BoundaryType,
+        distance: float,
+        distance_max: Optional[float] = None,
+        backend: Backend = "numpy",
+        key: Optional[Hashable] = None,
+    ) -> asyncio.Future:
+        """Queue a `calc_values` fit. See `calc_values` and `submit`"""
+        return await self.submit(
+            calc_values,
+            slope,
+            extinction,
+            wavelengths,
+            boundaries,
+            boundary_condition_type,
+            distance,
+            distance_max,
+            backend,
+            key=key,
+        )
+
+    async def submit_ucln(
+        self,
+        constants: UCLNConstants,
+        spectra: np.ndarray,
+        spectra_wavelengths: np.ndarray,
+        key: Optional[Hashable] = None,
+    ) -> asyncio.Future:
+        """Queue a `UCLN.calc_concentrations` batch. See `submit`"""
+        return await self.submit(
+            _run_ucln, constants, spectra, spectra_wavelengths, key=key
+        )
+
+    async def close(self) -> None:
+        """Cancel waiting jobs, stop the dispatchers and owned executor"""
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+                self._queue.task_done()
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self._pending.clear()
+        self._queue = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
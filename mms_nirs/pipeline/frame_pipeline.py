@@ -0,0 +1,355 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy import linalg
+from numpy.typing import NDArray
+
+from ..BRUNO import BoundaryType, Boundaries, calc_values
+from ..BRUNO.calc_values import FitBudget
+from ..BRUNO.screening import FrameScreen
+from ..BRUNO.backends import Backend
+from ..UCLN import UCLNConstants
+from ..utils.interpolation import (
+    SplineOperator,
+    check_interpolation_range,
+    spline_operator,
+)
+
+STAGES = ("attenuation", "ucln", "slope", "bruno", "total")
+
+
+class FrameRingBuffer:
+    """Fixed size ring buffer of intensity frames
+
+    Storage is allocated once. When the buffer is full, pushing a new frame
+    overwrites the oldest one and increments `dropped`.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        frame_shape: Sequence[int],
+        dtype: np.dtype = np.dtype(np.float64),
+    ) -> None:
+        self._frames: NDArray = np.zeros((capacity, *frame_shape), dtype)
+        self._capacity = capacity
+        self._head = 0
+        self._size = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, frame: NDArray) -> None:
+        tail = (self._head + self._size) % self._capacity
+        self._frames[tail] = frame
+        if self._size == self._capacity:
+            self._head = (self._head + 1) % self._capacity
+            self.dropped += 1
+        else:
+            self._size += 1
+
+    def pop(self) -> Optional[NDArray]:
+        """Remove the oldest frame
+
+        Returns:
+            Optional[NDArray]: View of the oldest frame, valid until the slot
+            is overwritten by a later push. None if the buffer is empty
+        """
+        if self._size == 0:
+            return None
+        frame = self._frames[self._head]
+        self._head = (self._head + 1) % self._capacity
+        self._size -= 1
+        return frame
+
+
+@dataclass
+class FrameResult:
+    concentrations: Optional[NDArray[np.float64]]
+    stO2: Optional[float]
+    coefficients: Optional[NDArray[np.float64]]
+    score: Optional[float]
+    # BRUNO ran out of its FitBudget, returning its best vertex
+    budget_exhausted: bool = False
+    # RejectReason flags of a frame FrameScreen kept from BRUNO, 0 if fitted
+    rejected: int = 0
+
+
+class StageLatencies:
+    """Rolling record of the most recent latencies of each stage"""
+
+    def __init__(self, history: int = 4096) -> None:
+        self._latencies: NDArray[np.float64] = np.zeros((len(STAGES), history))
+        self._counts: NDArray[np.int64] = np.zeros(len(STAGES), np.int64)
+        self._history = history
+
+    def record(self, stage: str, seconds: float) -> None:
+        i = STAGES.index(stage)
+        self._latencies[i, self._counts[i] % self._history] = seconds
+        self._counts[i] += 1
+
+    def last(self, stage: str) -> float:
+        """Most recent latency of a stage in seconds, NaN if it hasn't run"""
+        i = STAGES.index(stage)
+        if self._counts[i] == 0:
+            return np.nan
+        return float(self._latencies[i, (self._counts[i] - 1) % self._history])
+
+    def percentiles(
+        self, q: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, Dict[float, float]]:
+        """Latency percentiles in seconds for each stage that has run
+
+        Args:
+            q (Sequence[float], optional): Percentiles to compute. Defaults
+            to (50, 90, 99).
+
+        Returns:
+            Dict[str, Dict[float, float]]: Percentiles keyed by stage then by
+            percentile
+        """
+        result = {}
+        for i, stage in enumerate(STAGES):
+            n = min(self._counts[i], self._history)
+            if n:
+                values = np.percentile(self._latencies[i, :n], q)
+                result[stage] = dict(zip(q, values.tolist()))
+        return result
+
+
+class FramePipeline:
+    """Real-time pipeline from raw intensity frames to UCLN and BRUNO
+
+    Every constant - the UCLN interpolation, pathlength and pseudo-inverse
+    operator, the attenuation slope regression weights and the BRUNO
+    resampling - is derived once on construction, and each frame is then
+    processed into preallocated buffers.
+
+    A frame is a `k`x`W` array of intensity spectra, one row per
+    source-detector distance.
+    """
+
+    def __init__(
+        self,
+        spectra_wavelengths: NDArray,
+        reference_spectra: NDArray,
+        distances: NDArray,
+        ucln_constants: Optional[UCLNConstants] = None,
+        ucln_channel: int = 0,
+        extinction: Optional[NDArray] = None,
+        boundaries: NDArray = Boundaries.boundaries,
+        boundary_condition_type: BoundaryType = BoundaryType.ZBC,
+        bruno_distance: Optional[float] = None,
+        bruno_distance_max: Optional[float] = None,
+        backend: Backend = "numpy",
+        latency_history: int = 4096,
+        screen: Optional[FrameScreen] = None,
+    ) -> None:
+        """
+        Args:
+            spectra_wavelengths (NDArray): Spectrometer wavelengths, length
+            `W`
+            reference_spectra (NDArray): `k`x`W` reference intensities
+            distances (NDArray): Source-detector distances, length `k`
+            ucln_constants (Optional[UCLNConstants], optional): Constants for
+            UCLN. None skips UCLN. Defaults to None.
+            ucln_channel (int, optional): Row of the frame UCLN is run on.
+            Defaults to 0.
+            extinction (Optional[NDArray], optional): BRUNO extinction
+            co-efficients matrix, first column wavelength. None skips BRUNO.
+            Defaults to None.
+            boundaries (NDArray, optional): BRUNO parameter boundaries.
+            Defaults to Boundaries.boundaries.
+            boundary_condition_type (BoundaryType, optional): BRUNO boundary
+            condition. Defaults to BoundaryType.ZBC.
+            bruno_distance (Optional[float], optional): Distance passed to
+            `calc_values`. Defaults to the mean of `distances`.
+            bruno_distance_max (Optional[float], optional): Maximum distance
+            passed to `calc_values`. Defaults to None.
+            backend (Backend, optional): BRUNO solver backend. Defaults to
+            "numpy".
+            latency_history (int, optional): Number of frames latencies are
+            kept for. Defaults to 4096.
+            screen (Optional[FrameScreen], optional): Checks of the frame and
+            its slope before BRUNO. Rejected frames skip the fit. Defaults
+            to None, fitting every frame.
+        """
+        spectra_wavelengths = np.asarray(spectra_wavelengths, np.float64)
+        self.reference_spectra = np.asarray(reference_spectra, np.float64)
+        distances = np.asarray(distances, np.float64)
+        k, W = self.reference_spectra.shape
+
+        if len(distances) != k:
+            raise ValueError(
+                f"Mismatch between numbers of distances and reference\
+                    spectra.\n\
+                    Got {len(distances)} and {k} respectively."
+            )
+
+        self.ucln_channel = ucln_channel
+        self._ucln_operator: Optional[NDArray] = None
+        if ucln_constants is not None:
+            check_interpolation_range(
+                spectra_wavelengths, ucln_constants.interp_wavelengths
+            )
+            self._ucln_operator = spline_operator(
+                spectra_wavelengths, ucln_constants.interp_wavelengths
+            ).fold(
+                ucln_constants.factorisation().pinv
+                / ucln_constants.wavelength_dependency
+                / (ucln_constants.optode_dist * ucln_constants.dpf)
+            )
+
+        self.extinction = extinction
+        self._slope_weights: Optional[NDArray] = None
+        self._bruno_resample: Optional[SplineOperator] = None
+        if extinction is not None:
+            if k < 2:
+                raise ValueError(
+                    "BRUNO needs at least two source-detector distances"
+                )
+            # Row of the pseudo-inverse of [d, 1] giving the regression slope
+            design = np.vstack([distances, np.ones(k)]).T
+            self._slope_weights = linalg.pinv(design)[0]
+            self.bruno_wavelengths = extinction[:, 0]
+            if not np.array_equal(self.bruno_wavelengths, spectra_wavelengths):
+                check_interpolation_range(
+                    spectra_wavelengths, self.bruno_wavelengths
+                )
+                self._bruno_resample = spline_operator(
+                    spectra_wavelengths, self.bruno_wavelengths
+                )
+
+        self.boundaries = boundaries
+        self.boundary_condition_type = boundary_condition_type
+        self.bruno_distance = (
+            float(np.mean(distances))
+            if bruno_distance is None
+            else bruno_distance
+        )
+        self.bruno_distance_max = bruno_distance_max
+        self.backend: Backend = backend
+        self.screen = screen
+        self.spectra_wavelengths = spectra_wavelengths
+
+        # Preallocated per-frame buffers
+        self._attenuation: NDArray[np.float64] = np.zeros((k, W))
+        self._slope: NDArray[np.float64] = np.zeros(W)
+        self._bruno_slope: Optional[NDArray[np.float64]] = (
+            None
+            if self._bruno_resample is None
+            else np.zeros(self._bruno_resample.shape[0])
+        )
+        self._concentrations: Optional[NDArray[np.float64]] = (
+            None
+            if self._ucln_operator is None
+            else np.zeros(self._ucln_operator.shape[0])
+        )
+
+        self.latencies = StageLatencies(latency_history)
+
+    def _timed(self, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        self.latencies.record(stage, now - start)
+        return now
+
+    def process(
+        self, frame: NDArray, budget: Optional[FitBudget] = None
+    ) -> FrameResult:
+        """Run UCLN and BRUNO on a single `k`x`W` intensity frame
+
+        Args:
+            frame (NDArray): Intensity spectra at each distance
+            budget (Optional[FitBudget], optional): Limit on the BRUNO fit,
+            see calc_values. Defaults to None.
+
+        Raises:
+            RuntimeError: Error if BRUNO fails to obtain co-efficients.
+
+        Returns:
+            FrameResult: Concentrations and BRUNO fit for the frame, the fit
+            None if the screen rejected the frame
+        """
+        frame_start = start = time.perf_counter()
+
+        np.divide(self.reference_spectra, frame, out=self._attenuation)
+        np.log10(self._attenuation, out=self._attenuation)
+        start = self._timed("attenuation", start)
+
+        concentrations = None
+        if self._ucln_operator is not None:
+            np.matmul(
+                self._ucln_operator,
+                self._attenuation[self.ucln_channel],
+                out=self._concentrations,
+            )
+            concentrations = self._concentrations
+            start = self._timed("ucln", start)
+
+        stO2 = coefficients = score = None
+        budget_exhausted = False
+        rejected = 0
+        if self._slope_weights is not None:
+            np.matmul(self._slope_weights, self._attenuation, out=self._slope)
+            slope = self._slope
+            if self._bruno_resample is not None:
+                self._bruno_resample.apply(slope, out=self._bruno_slope)
+                slope = self._bruno_slope
+            start = self._timed("slope", start)
+
+            if self.screen is not None:
+                rejected = int(
+                    self.screen.screen(
+                        slope,
+                        self.bruno_wavelengths,
+                        frame[:, np.newaxis],
+                        self.spectra_wavelengths,
+                    ).reasons[0]
+                )
+            if not rejected:
+                fit = calc_values(
+                    slope,
+                    self.extinction,  # type: ignore
+                    self.bruno_wavelengths,
+                    self.boundaries,
+                    self.boundary_condition_type,
+                    self.bruno_distance,
+                    self.bruno_distance_max,
+                    self.backend,
+                    budget=budget,
+                )
+                if budget is not None:
+                    budget_exhausted = fit.budget_exhausted
+                    fit = fit.astuple()
+                stO2, coefficients, _, _, _, score = fit
+            start = self._timed("bruno", start)
+
+        self._timed("total", frame_start)
+        return FrameResult(
+            concentrations=(
+                None if concentrations is None else concentrations.copy()
+            ),
+            stO2=stO2,
+            coefficients=coefficients,
+            score=score,
+            budget_exhausted=budget_exhausted,
+            rejected=rejected,
+        )
+
+    def process_buffer(self, buffer: FrameRingBuffer) -> List[FrameResult]:
+        """Drain a ring buffer, processing frames oldest first"""
+        results = []
+        frame = buffer.pop()
+        while frame is not None:
+            results.append(self.process(frame))
+            frame = buffer.pop()
+        return results
+
+    def latency_percentiles(
+        self, q: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, Dict[float, float]]:
+        """Per-stage latency percentiles in seconds. See StageLatencies"""
+        return self.latencies.percentiles(q)
@@ -0,0 +1,329 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..BRUNO import FIT_DTYPE, BatchFitResult, BoundaryType, calc_values_batch
+from ..BRUNO.backends import Backend
+from ..UCLN import UCLN, UCLNConstants
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """Picklable handle to a NumPy array held in a shared memory block"""
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: np.dtype
+
+    def attach(self) -> Tuple[SharedMemory, NDArray]:
+        """Map the block into this process without copying it
+
+        Only the creating process should unlink the block. From Python 3.13
+        attaching doesn't track it at all. Before, workers share the
+        creator's resource tracker, so their registration duplicates the
+        creator's and unlinking it still releases the block.
+
+        Returns:
+            Tuple[SharedMemory, NDArray]: The block, which must be kept
+            alive and closed once done with, and an array view of it
+        """
+        if sys.version_info >= (3, 13):
+            block = SharedMemory(name=self.name, track=False)
+        else:
+            block = SharedMemory(name=self.name)
+        return block, np.ndarray(self.shape, self.dtype, buffer=block.buf)
+
+
+class SharedArrays:
+    """Owner of shared memory blocks, unlinked when the context exits
+
+    Blocks are released on normal exit, errors and KeyboardInterrupt.
+    """
+
+    def __init__(self) -> None:
+        self._blocks: List[SharedMemory] = []
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    @property
+    def names(self) -> List[str]:
+        return [block.name for block in self._blocks]
+
+    def create(
+        self,
+        shape: Tuple[int, ...],
+        dtype: np.dtype,
+        fill: Optional[float] = None,
+    ) -> Tuple[SharedArray, NDArray]:
+        """Allocate a shared array
+
+        Returns:
+            Tuple[SharedArray, NDArray]: Handle to pass to workers and a view
+            for this process
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        block = SharedMemory(create=True, size=max(nbytes, 1))
+        self._blocks.append(block)
+        array: NDArray = np.ndarray(shape, dtype, buffer=block.buf)
+        if fill is not None:
+            array[...] = fill
+        return SharedArray(block.name, tuple(shape), dtype), array
+
+    def copy_from(self, array: NDArray) -> Tuple[SharedArray, NDArray]:
+        """Allocate a shared array holding a copy of `array`"""
+        handle, shared = self.create(array.shape, array.dtype)
+        shared[...] = array
+        return handle, shared
+
+    def release(self) -> None:
+        while self._blocks:
+            block = self._blocks.pop()
+            try:
+                block.close()
+            except BufferError:
+                # A view is still alive, the mapping goes with it
+                pass
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _row_chunks(n_rows: int, workers: int, chunk_size: Optional[int]):
+    chunk_size = chunk_size or max(1, -(-n_rows // (4 * workers)))
+    return [
+        (start, min(start + chunk_size, n_rows))
+        for start in range(0, n_rows, chunk_size)
+    ]
+
+
+def _close(blocks: List[SharedMemory]) -> None:
+    # A worker that raised can still hold views, through its traceback, and
+    # close then raises BufferError. Leave those mappings to go with the
+    # views rather than mask the worker's exception
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+
+def _bruno_rows(
+    slopes: SharedArray,
+    extinction: SharedArray,
+    wavelengths: SharedArray,
+    fits: SharedArray,
+    residual: Optional[SharedArray],
+    residual_norm: Optional[SharedArray],
+    rows: Tuple[int, int],
+    boundaries: NDArray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float],
+    backend: Backend,
+) -> None:
+    blocks = []
+    try:
+        views = []
+        for handle in (slopes, extinction, wavelengths, fits):
+            block, view = handle.attach()
+            blocks.append(block)
+            views.append(view)
+        residual_views: List[Optional[NDArray]] = [None, None]
+        if residual is not None and residual_norm is not None:
+            for i, handle in enumerate((residual, residual_norm)):
+                block, view = handle.attach()
+                blocks.append(block)
+                residual_views[i] = view[rows[0] : rows[1]]
+
+        slope_view, extinction_view, wavelength_view, fit_view = views
+        out = BatchFitResult._view(
+            fit_view[rows[0] : rows[1]], None, *residual_views
+        )
+        calc_values_batch(
+            slope_view[rows[0] : rows[1]],
+            extinction_view,
+            wavelength_view,
+            boundaries,
+            boundary_condition_type,
+            distance,
+            distance_max,
+            backend,
+            out=out,
+        )
+        del views, residual_views, out
+    finally:
+        _close(blocks)
+
+
+def _ucln_rows(
+    spectra: SharedArray,
+    concentrations: SharedArray,
+    rows: Tuple[int, int],
+    constants: UCLNConstants,
+    spectra_wavelengths: NDArray,
+) -> None:
+    spectra_block, spectra_view = spectra.attach()
+    out_block, out_view = concentrations.attach()
+    try:
+        start, stop = rows
+        # UCLN measures attenuation against the first spectrum
+        conc = UCLN(constants).calc_concentrations(
+            np.vstack([spectra_view[:1], spectra_view[start:stop]]),
+            spectra_wavelengths,
+        )
+        assert conc is not None
+        out_view[start:stop] = conc[1:]
+        del spectra_view, out_view
+    finally:
+        _close([spectra_block, out_block])
+
+
+def calc_values_shared(
+    slopes: np.ndarray,
+    extinction: np.ndarray,
+    wavelengths: np.ndarray,
+    boundaries: np.ndarray,
+    boundary_condition_type: BoundaryType,
+    distance: float,
+    distance_max: Optional[float] = None,
+    backend: Backend = "numpy",
+    keep_residuals: bool = False,
+    workers: int = 2,
+    chunk_size: Optional[int] = None,
+) -> BatchFitResult:
+    """calc_values_batch across worker processes sharing memory
+
+    The slopes, extinction table and wavelengths are copied once into
+    shared memory. Workers map them without copying and write fits directly
+    into shared output arrays.
+
+    Args:
+        slopes (np.ndarray): `T`x`W` attenuation slopes
+        extinction (np.ndarray): Matrix of extinction co-efficients for each
+        species and wavelength
+        wavelengths (np.ndarray): Wavelengths of light used
+        boundaries (np.ndarray): Boundaries for parameters
+        boundary_condition_type (BoundaryType): Zero or Extrapolated boundary
+        condition
+        distance (float): (Minimal) source-detector distance
+        distance_max (Optional[float], optional): Optional maximum distance.
+        Defaults to None.
+        backend (Backend, optional): Solver backend. Defaults to "numpy".
+        keep_residuals (bool, optional): Store residual and residual_norm.
+        Defaults to False.
+        workers (int, optional): Number of worker processes. Defaults to 2.
+        chunk_size (Optional[int], optional): Rows per task. Defaults to
+        None, four tasks per worker.
+
+    Returns:
+        BatchFitResult: Results, with NaN rows for fits that failed
+    """
+    slopes = np.atleast_2d(slopes)
+    T, W = slopes.shape
+    result = BatchFitResult(T, W - 1 if keep_residuals else None)
+
+    with SharedArrays() as arrays, ProcessPoolExecutor(workers) as executor:
+        slope_handle, _ = arrays.copy_from(slopes)
+        extinction_handle, _ = arrays.copy_from(np.asarray(extinction))
+        wavelength_handle, _ = arrays.copy_from(np.asarray(wavelengths))
+        fit_handle, fit_view = arrays.create((T,), FIT_DTYPE, fill=np.nan)
+        residual_handles: List[Optional[SharedArray]] = [None, None]
+        residual_views: List[NDArray] = []
+        if keep_residuals:
+            for i in range(2):
+                handle, view = arrays.create((T, W - 1), np.float32, np.nan)
+                residual_handles[i] = handle
+                residual_views.append(view)
+
+        futures = [
+            executor.submit(
+                _bruno_rows,
+                slope_handle,
+                extinction_handle,
+                wavelength_handle,
+                fit_handle,
+                *residual_handles,
+                rows,
+                boundaries,
+                boundary_condition_type,
+                distance,
+                distance_max,
+                backend,
+            )
+            for rows in _row_chunks(T, workers, chunk_size)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        result.fits[...] = fit_view
+        if result.residual is not None and result.residual_norm is not None:
+            result.residual[...] = residual_views[0]
+            result.residual_norm[...] = residual_views[1]
+        del fit_view, residual_views
+    return result
+
+
+def calc_concentrations_shared(
+    constants: UCLNConstants,
+    spectra: np.ndarray,
+    spectra_wavelengths: np.ndarray,
+    workers: int = 2,
+    chunk_size: Optional[int] = None,
+) -> NDArray:
+    """UCLN.calc_concentrations across worker processes sharing memory
+
+    Args:
+        constants (UCLNConstants): UCLN constants
+        spectra (np.ndarray): `T`x`W` intensity spectra. Attenuation is
+        measured against the first spectrum
+        spectra_wavelengths (np.ndarray): Wavelengths of the spectra
+        workers (int, optional): Number of worker processes. Defaults to 2.
+        chunk_size (Optional[int], optional): Rows per task. Defaults to
+        None, four tasks per worker.
+
+    Returns:
+        NDArray: `T`x`S` concentrations
+    """
+    T = spectra.shape[0]
+    n_species = constants.extinction_coefficients.shape[1]
+
+    with SharedArrays() as arrays, ProcessPoolExecutor(workers) as executor:
+        spectra_handle, _ = arrays.copy_from(np.asarray(spectra))
+        conc_handle, conc_view = arrays.create((T, n_species), np.float64)
+        futures = [
+            executor.submit(
+                _ucln_rows,
+                spectra_handle,
+                conc_handle,
+                rows,
+                constants,
+                spectra_wavelengths,
+            )
+            for rows in _row_chunks(T, workers, chunk_size)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        concentrations = conc_view.copy()
+        del conc_view
+    return concentrations
@@ -0,0 +1,165 @@
+import time
+from typing import Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from ..BRUNO.calc_values import FitBudget
+from .frame_pipeline import FramePipeline, FrameResult, FrameRingBuffer
+
+
+class AdaptiveBudget:
+    """Per-frame BRUNO time budget following the observed frame interval
+
+    The budget is `utilisation` of the frame interval less the time the
+    other stages take, both exponentially averaged, so fits finish before
+    the next frame arrives however the frame rate changes.
+    """
+
+    def __init__(
+        self,
+        utilisation: float = 0.8,
+        smoothing: float = 0.1,
+        min_seconds: float = 5e-4,
+        interval: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            utilisation (float, optional): Fraction of the frame interval
+            spent processing. Defaults to 0.8.
+            smoothing (float, optional): Weight of each new observation in
+            the averages. Defaults to 0.1.
+            min_seconds (float, optional): Least budget given, so fits still
+            make progress when frames come faster than they can be
+            processed. Defaults to 0.5 ms.
+            interval (Optional[float], optional): Expected frame interval in
+            seconds. Defaults to None, unbudgeted until two frames are
+            observed.
+
+        Raises:
+            ValueError: Error if `utilisation` or `smoothing` isn't in (0, 1]
+        """
+        for name, value in (
+            ("utilisation", utilisation),
+            ("smoothing", smoothing),
+        ):
+            if not 0 < value <= 1:
+                raise ValueError(f"{name} must be in (0, 1], got {value}")
+        self.utilisation = utilisation
+        self.smoothing = smoothing
+        self.min_seconds = min_seconds
+        self.interval = interval
+        self.overhead: Optional[float] = None
+        self._last_timestamp: Optional[float] = None
+
+    def _average(self, current: Optional[float], value: float) -> float:
+        if current is None:
+            return value
+        return current + self.smoothing * (value - current)
+
+    def observe_frame(self, timestamp: float) -> None:
+        """Record the arrival time of a frame, in seconds"""
+        if self._last_timestamp is not None:
+            elapsed = timestamp - self._last_timestamp
+            if elapsed > 0:
+                self.interval = self._average(self.interval, elapsed)
+        self._last_timestamp = timestamp
+
+    def observe_overhead(self, seconds: float) -> None:
+        """Record the time a frame spent outside the BRUNO fit"""
+        if np.isfinite(seconds):
+            self.overhead = self._average(self.overhead, seconds)
+
+    def seconds(self, backlog: int = 0) -> Optional[float]:
+        """Fit time available per frame, shared with `backlog` frames
+        waiting behind it. None until the frame interval is known"""
+        if self.interval is None:
+            return None
+        available = self.utilisation * self.interval - (self.overhead or 0.0)
+        return max(available / (1 + backlog), self.min_seconds)
+
+    def budget(self, backlog: int = 0) -> Optional[FitBudget]:
+        """FitBudget of the next frame, None until the interval is known"""
+        seconds = self.seconds(backlog)
+        return None if seconds is None else FitBudget(max_seconds=seconds)
+
+
+class StreamingFitter:
+    """Run a FramePipeline on a live stream, budgeting each BRUNO fit
+
+    Each frame's fit is limited to what the AdaptiveBudget allows, so a
+    result is ready for every frame at the bedside, if less precise when
+    time runs short. Frames that ran out of budget are counted in
+    `exhausted`.
+
+    Example:
+        fitter = StreamingFitter(FramePipeline(..., extinction=extinction))
+        for result in fitter.run(spectrometer_frames()):
+            display(result.stO2)
+    """
+
+    def __init__(
+        self,
+        pipeline: FramePipeline,
+        budget: Optional[AdaptiveBudget] = None,
+    ) -> None:
+        """
+        Args:
+            pipeline (FramePipeline): Pipeline processing each frame
+            budget (Optional[AdaptiveBudget], optional): Budget controller.
+            Defaults to None, an AdaptiveBudget with default settings.
+        """
+        self.pipeline = pipeline
+        self.budget = AdaptiveBudget() if budget is None else budget
+        self.n_frames = 0
+        self.exhausted = 0
+
+    def process(
+        self,
+        frame: NDArray,
+        timestamp: Optional[float] = None,
+        backlog: int = 0,
+    ) -> FrameResult:
+        """Process a frame within the current budget
+
+        Args:
+            frame (NDArray): `k`x`W` intensity frame
+            timestamp (Optional[float], optional): Acquisition time of the
+            frame in seconds. Defaults to None, the time it is processed.
+            backlog (int, optional): Frames waiting behind this one, which
+            share its budget. Defaults to 0.
+
+        Returns:
+            FrameResult: Result of the pipeline
+        """
+        self.budget.observe_frame(
+            time.perf_counter() if timestamp is None else timestamp
+        )
+        return self._fit(frame, backlog)
+
+    def _fit(self, frame: NDArray, backlog: int) -> FrameResult:
+        result = self.pipeline.process(frame, self.budget.budget(backlog))
+        latencies = self.pipeline.latencies
+        self.budget.observe_overhead(
+            latencies.last("total") - latencies.last("bruno")
+        )
+        self.n_frames += 1
+        self.exhausted += result.budget_exhausted
+        return result
+
+    def run(
+        self, frames: Iterable[Tuple[Optional[float], NDArray]]
+    ) -> Iterator[FrameResult]:
+        """Process (timestamp, frame) pairs as they arrive"""
+        for timestamp, frame in frames:
+            yield self.process(frame, timestamp)
+
+    def drain(self, buffer: FrameRingBuffer) -> Iterator[FrameResult]:
+        """Process a ring buffer's frames oldest first, splitting the budget
+        with the frames still waiting so the backlog is caught up. The frame
+        interval isn't observed, since buffered frames' arrival times are
+        unknown"""
+        frame = buffer.pop()
+        while frame is not None:
+            yield self._fit(frame, len(buffer))
+            frame = buffer.pop()
@@ -0,0 +1,221 @@
+import functools
+import json
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import (
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
+
+F = TypeVar("F", bound=Callable)
+
+# Profiler stages report to, None when profiling is off
+_active: Optional["Profiler"] = None
+
+_NULL_CONTEXT = nullcontext()
+
+
+class StageStats:
+    """Timings and allocations recorded for one stage"""
+
+    def __init__(self, history: int) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.bytes_allocated = 0
+        self.durations: Deque[float] = deque(maxlen=history)
+
+    def record(self, seconds: float, nbytes: int) -> None:
+        self.count += 1
+        self.total += seconds
+        self.bytes_allocated += nbytes
+        self.durations.append(seconds)
+
+    def to_dict(self, percentiles: Sequence[float]) -> Dict[str, float]:
+        stats = {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else np.nan,
+            "bytes_allocated": self.bytes_allocated,
+        }
+        durations = np.fromiter(self.durations, dtype=np.float64)
+        for q in percentiles:
+            stats[f"p{q:g}_s"] = (
+                float(np.percentile(durations, q))
+                if durations.size
+                else np.nan
+            )
+        return stats
+
+
+class Profiler:
+    """Registry that instrumented stages report into while it is active
+
+    Stages are the functions decorated with `profiled` and the blocks
+    wrapped in `stage`, e.g. `UCLN.calc_concentrations`, `derivative_fit`,
+    `fminsearchbnd` and `calc_values`. Timings are inclusive, so a stage
+    includes the time of the stages it calls. When no profiler is active a
+    stage costs one global lookup.
+
+    Example:
+        with Profiler(track_memory=True) as profiler:
+            calc_values(...)
+        print(profiler.to_json())
+    """
+
+    def __init__(self, track_memory: bool = False, history: int = 10000):
+        """
+        Args:
+            track_memory (bool, optional): Record the peak bytes allocated in
+            each stage with tracemalloc. This slows Python allocations down
+            considerably. Defaults to False.
+            history (int, optional): Number of most recent durations per stage
+            that percentiles are computed from. Defaults to 10000.
+        """
+        self.track_memory = track_memory
+        self.history = history
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        # [memory at stage start, peak memory seen] of each open stage
+        self._memory_stack: List[List[int]] = []
+        self._previous: Optional[Profiler] = None
+        self._started_tracemalloc = False
+
+    def __enter__(self) -> "Profiler":
+        global _active
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._previous, _active = _active, self
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global _active
+        _active = self._previous
+        self._previous = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def record(self, name: str, seconds: float, nbytes: int = 0) -> None:
+        """Add a measurement for `name`"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(self.history)
+        stats.record(seconds, nbytes)
+
+    @contextmanager
+    def _measure(self, name: str) -> Iterator[None]:
+        tracking = self.track_memory and tracemalloc.is_tracing()
+        if tracking:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._memory_stack:
+                outer = self._memory_stack[-1]
+                outer[1] = max(outer[1], peak)
+            tracemalloc.reset_peak()
+            self._memory_stack.append([current, current])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nbytes = 0
+            if tracking:
+                _, peak = tracemalloc.get_traced_memory()
+                start_memory, seen = self._memory_stack.pop()
+                peak = max(peak, seen)
+                nbytes = peak - start_memory
+                if self._memory_stack:
+                    outer = self._memory_stack[-1]
+                    outer[1] = max(outer[1], peak)
+                tracemalloc.reset_peak()
+            self.record(name, elapsed, nbytes)
+
+    def reset(self) -> None:
+        self.stages.clear()
+        self.counters.clear()
+
+    def to_dict(
+        self, percentiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, Dict[str, float]]:
+        """Summary of each stage, and the counters
+
+        Returns:
+            Dict[str, Dict[str, float]]: count, total_s, mean_s,
+            bytes_allocated and the requested percentiles, e.g. p50_s, keyed
+            by stage, and the counters, e.g. objective_evaluations, under
+            "counters"
+        """
+        summary = {
+            name: stats.to_dict(percentiles)
+            for name, stats in sorted(self.stages.items())
+        }
+        summary["counters"] = dict(sorted(self.counters.items()))
+        return summary
+
+    def to_json(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        percentiles: Sequence[float] = (50, 90, 99),
+    ) -> str:
+        """Summary of each stage and the counters as JSON, optionally
+        written to `path`
+
+        Statistics without samples, NaN in `to_dict`, are written as null so
+        the output stays valid JSON.
+        """
+        stats = {
+            name: {
+                key: None
+                if isinstance(value, float) and np.isnan(value)
+                else value
+                for key, value in summary.items()
+            }
+            for name, summary in self.to_dict(percentiles).items()
+        }
+        text = json.dumps(stats, indent=2, allow_nan=False)
+        if path is not None:
+            Path(path).write_text(text)
+        return text
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Time the enclosed block as stage `name` if a profiler is active"""
+    if _active is None:
+        return _NULL_CONTEXT
+    return _active._measure(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name`, e.g. objective evaluations, if a profiler
+    is active"""
+    if _active is not None:
+        _active.counters[name] = _active.counters.get(name, 0) + n
+
+
+def profiled(name: str) -> Callable[[F], F]:
+    """Decorator timing each call of a function as stage `name`"""
+
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active._measure(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -1,12 +1,50 @@
+from ..profiling import Profiler, profiled, stage
 from .attenuation import calc_attenuation_slope, calc_attenuation_spectra
-from .dpf import calc_dpf, calc_mua, calc_mus
+from .dpf import (
+    OpticalProperties,
+    calc_dpf,
+    calc_dpf_series,
+    calc_mua,
+    calc_mus,
+    calc_optical_properties,
+)
 from .extinction_coefficients import ExtinctionCoefficients
+from .interpolation import (
+    SplineOperator,
+    SplineOperatorCache,
+    check_interpolation_range,
+    cubic_interpolation_matrix,
+    spline_operator,
+    spline_operators,
+)
+from .result_writer import (
+    ConcentrationWriter,
+    FitWriter,
+    read_results,
+    residual_matrix,
+)
 
 __all__ = [
     "calc_dpf",
+    "calc_dpf_series",
+    "calc_optical_properties",
+    "OpticalProperties",
     "calc_mua",
     "calc_mus",
     "calc_attenuation_spectra",
     "calc_attenuation_slope",
     "ExtinctionCoefficients",
+    "check_interpolation_range",
+    "cubic_interpolation_matrix",
+    "SplineOperator",
+    "SplineOperatorCache",
+    "spline_operator",
+    "spline_operators",
+    "Profiler",
+    "profiled",
+    "stage",
+    "ConcentrationWriter",
+    "FitWriter",
+    "read_results",
+    "residual_matrix",
 ]
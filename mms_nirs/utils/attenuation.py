@@ -1,17 +1,25 @@
+from typing import Optional
+
 import numpy as np
-from numpy.linalg import lstsq
-from numpy.typing import NDArray
+from numpy.linalg import pinv
+from numpy.typing import DTypeLike, NDArray
+
+from ..profiling import profiled
 
 
 def calc_attenuation_spectra(
-    intensity_spectra: NDArray, ref_spectra: NDArray
+    intensity_spectra: NDArray,
+    ref_spectra: NDArray,
+    dtype: Optional[DTypeLike] = None,
 ) -> NDArray:
     """Calculate attenuation spectra from intensities
 
     Args:
         intensity_spectra (NDArray): Intensity spectra
-        ref_spectra (NDArray): Re:w
-        ference spectrum
+        ref_spectra (NDArray): Reference spectrum
+        dtype (Optional[DTypeLike], optional): Type to compute and return,
+        e.g. np.float32 for 16-bit counts. Defaults to None, numpy's type
+        promotion of the inputs.
 
     Returns:
         NDArray: Calculated attenuation spectra. Will convert 1D array to 2D
@@ -21,11 +29,15 @@ def calc_attenuation_spectra(
         intensity_spectra = intensity_spectra.reshape(
             -1, len(intensity_spectra)
         )
-    return np.log10(np.divide(ref_spectra, intensity_spectra))
+    attenuation = np.divide(ref_spectra, intensity_spectra, dtype=dtype)
+    return np.log10(attenuation, out=attenuation)
 
 
+@profiled("calc_attenuation_slope")
 def calc_attenuation_slope(
-    attenuation_spectra: NDArray, source_detector_distances: NDArray
+    attenuation_spectra: NDArray,
+    source_detector_distances: NDArray,
+    dtype: Optional[DTypeLike] = None,
 ) -> NDArray:
     """Calculate the attenuation slope via linear regression.
 
@@ -37,6 +49,10 @@ def calc_attenuation_slope(
         `T`x`N`x`k`
         source_detector_distances (NDArray): List of source-detector distances.
         Should be of length `k`
+        dtype (Optional[DTypeLike], optional): Type of the result, e.g.
+        np.float32. The regression weights are always computed in float64.
+        Defaults to None, the type of `attenuation_spectra` (float64 for
+        integers).
 
     Returns:
         NDArray: Matrix of attenuation slope for each timepoint. Shape `T`x`N`
@@ -51,12 +67,18 @@ def calc_attenuation_slope(
                 Got {len(source_detector_distances)} and {k} respectively."
         )
 
-    # Solve for slope of form y = mx + c = Ap
-    def get_slope(attenuations: NDArray, distances: NDArray):
-        A = np.vstack([distances, np.ones(len(distances))]).T
-        m, _ = lstsq(A, attenuations, rcond=None)[0]
-        return m  # type: ignore
-
-    return np.apply_along_axis(
-        get_slope, 0, attenuation_spectra, source_detector_distances
+    # Solve for slope of form y = mx + c = Ap. The least squares slope is
+    # the first row of pinv(A) applied to every wavelength and timepoint
+    A = np.vstack(
+        [source_detector_distances, np.ones(len(source_detector_distances))]
+    ).T
+    weights = pinv(A.astype(np.float64))[0]
+    if dtype is None:
+        dtype = (
+            attenuation_spectra.dtype
+            if np.issubdtype(attenuation_spectra.dtype, np.floating)
+            else np.float64
+        )
+    return np.tensordot(
+        weights.astype(dtype), attenuation_spectra.astype(dtype, copy=False), 1
     )
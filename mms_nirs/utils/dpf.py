@@ -1,6 +1,8 @@
-from typing import Union
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
 
 import numpy as np
+from numpy.typing import DTypeLike
 
 
 def calc_mua(
@@ -73,3 +75,211 @@ def calc_dpf(
         * np.sqrt(3 * mu_s / mu_a)
         * (1 - (1 / (1 + np.sqrt(d * 3 * mu_a * mu_s))))
     )
+
+
+@dataclass
+class OpticalProperties:
+    """`T`x`W` outputs of calc_optical_properties, None where not requested"""
+
+    mua: Optional[np.ndarray]
+    mus: Optional[np.ndarray]
+    dpf: Optional[np.ndarray]
+
+
+def _resample_extinction(
+    extinction_coefficients: np.ndarray, wavelengths: Optional[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    if wavelengths is None:
+        return extinction_coefficients, extinction_coefficients[:, 0]
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    resampled = np.column_stack(
+        [wavelengths]
+        + [
+            np.interp(
+                wavelengths,
+                extinction_coefficients[:, 0],
+                extinction_coefficients[:, i],
+            )
+            for i in range(1, extinction_coefficients.shape[1])
+        ]
+    )
+    return resampled, wavelengths
+
+
+def _output(
+    out: Optional[np.ndarray], shape: Tuple[int, int], dtype: np.dtype
+) -> np.ndarray:
+    if out is None:
+        return np.empty(shape, dtype)
+    if out.shape != shape:
+        raise ValueError(
+            f"Expected out of shape {shape}, got {out.shape} instead"
+        )
+    return out
+
+
+def calc_optical_properties(
+    coefficients: np.ndarray,
+    extinction_coefficients: np.ndarray,
+    d: float,
+    wavelengths: Optional[np.ndarray] = None,
+    chunk_size: int = 4096,
+    mua_out: Optional[np.ndarray] = None,
+    mus_out: Optional[np.ndarray] = None,
+    dpf_out: Optional[np.ndarray] = None,
+    outputs: Tuple[str, ...] = ("dpf",),
+    dtype: DTypeLike = np.float64,
+) -> OpticalProperties:
+    """Calculate mu_a, mu_s and the differential pathlength factor of every
+    frame from fitted BRUNO co-efficients in one pass
+
+    Equivalent to calc_mua, BRUNO's scattering model and calc_dpf, but
+    frames are processed `chunk_size` at a time into the output buffers.
+    Working memory is at most three `chunk_size`x`W` scratch arrays besides
+    the requested outputs, so the outputs dominate for long recordings.
+    mu_a is one matrix product, mu_s = a * exp(-b * log(lambda / 1000)) and
+    the DPF is evaluated in place. Frames whose fit failed (NaN
+    co-efficients) give NaN.
+
+    Args:
+        coefficients (np.ndarray): `T`x5 co-efficients as returned by
+        calc_values, e.g. `BatchFitResult.coefficients`
+        extinction_coefficients (np.ndarray): Extinction co-efficients
+        matrix, first column wavelength, as passed to calc_values
+        d (float): source-detector distance
+        wavelengths (Optional[np.ndarray], optional): Wavelengths to
+        calculate at, within those of `extinction_coefficients`. Defaults to
+        None, the wavelengths of `extinction_coefficients`.
+        chunk_size (int, optional): Frames per chunk. Defaults to 4096.
+        mua_out (Optional[np.ndarray], optional): `T`x`W` array to write mu_a
+        to. Passing it requests mu_a. Defaults to None.
+        mus_out (Optional[np.ndarray], optional): `T`x`W` array to write mu_s
+        to. Passing it requests mu_s. Defaults to None.
+        dpf_out (Optional[np.ndarray], optional): `T`x`W` array to write the
+        DPF to. Passing it requests the DPF. Defaults to None.
+        outputs (Tuple[str, ...], optional): Outputs to allocate and return
+        when no buffer is passed, of "mua", "mus" and "dpf". Defaults to
+        ("dpf",).
+        dtype (DTypeLike, optional): Type the calculation is done in and
+        outputs are allocated as, e.g. np.float32 to halve memory. Defaults
+        to np.float64.
+
+    Raises:
+        ValueError: Error if an output buffer has the wrong shape
+
+    Returns:
+        OpticalProperties: The requested outputs
+    """
+    dtype = np.dtype(dtype)
+    coefficients = np.atleast_2d(coefficients)
+    extinction_coefficients, wavelengths = _resample_extinction(
+        extinction_coefficients, wavelengths
+    )
+    shape = (coefficients.shape[0], wavelengths.size)
+
+    buffers = {"mua": mua_out, "mus": mus_out, "dpf": dpf_out}
+    requested = {
+        name: _output(out, shape, dtype)
+        for name, out in buffers.items()
+        if out is not None or name in outputs
+    }
+
+    # Rows water, HHb and HbO2, so that mu_a = coefficients[:, :3] @ absorbers
+    absorbers = np.stack(
+        [
+            extinction_coefficients[:, 3],
+            np.log(10) * extinction_coefficients[:, 1],
+            np.log(10) * extinction_coefficients[:, 2],
+        ]
+    ).astype(dtype)
+    log_wavelengths = np.log(wavelengths * 0.001).astype(dtype)
+    # Chunk sized stand-ins for the intermediates that aren't outputs
+    rows = min(chunk_size, shape[0])
+    scratch = {
+        name: np.empty((rows, shape[1]), dtype)
+        for name in ("mua", "mus")
+        if name not in requested
+    }
+    # 1 - 1 / (1 + sqrt(3 d mu_a mu_s)), only needed for the DPF
+    term_buffer = np.empty(
+        (rows if "dpf" in requested else 0, shape[1]), dtype
+    )
+
+    for start in range(0, shape[0], chunk_size):
+        chunk = coefficients[start : start + chunk_size].astype(dtype)
+        n = chunk.shape[0]
+        views = {
+            name: out[start : start + n] for name, out in requested.items()
+        }
+        mua = views.get("mua", scratch.get("mua"))[:n]
+        mus = views.get("mus", scratch.get("mus"))[:n]
+
+        np.matmul(chunk[:, :3], absorbers, out=mua)
+
+        np.multiply.outer(-chunk[:, 4], log_wavelengths, out=mus)
+        np.exp(mus, out=mus)
+        mus *= chunk[:, 3, np.newaxis]
+
+        if "dpf" not in requested:
+            continue
+        term = term_buffer[:n]
+        np.multiply(mua, mus, out=term)
+        term *= 3 * d
+        np.sqrt(term, out=term)
+        term += 1
+        np.reciprocal(term, out=term)
+        np.subtract(1, term, out=term)
+
+        dpf = views["dpf"]
+        np.divide(mus, mua, out=dpf)
+        dpf *= 3
+        np.sqrt(dpf, out=dpf)
+        dpf *= 0.5
+        dpf *= term
+
+    return OpticalProperties(
+        requested.get("mua"), requested.get("mus"), requested.get("dpf")
+    )
+
+
+def calc_dpf_series(
+    coefficients: np.ndarray,
+    extinction_coefficients: np.ndarray,
+    d: float,
+    wavelengths: Optional[np.ndarray] = None,
+    chunk_size: int = 4096,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Calculate the differential pathlength factor of every frame from
+    fitted BRUNO co-efficients
+
+    Frames are processed `chunk_size` at a time, see calc_optical_properties.
+    Scattering follows the model BRUNO fits, mu_s = a * (lambda / 1000)^-b.
+    Frames whose fit failed (NaN co-efficients) give NaN.
+
+    Args:
+        coefficients (np.ndarray): `T`x5 co-efficients as returned by
+        calc_values, e.g. `BatchFitResult.coefficients`
+        extinction_coefficients (np.ndarray): Extinction co-efficients
+        matrix, first column wavelength, as passed to calc_values
+        d (float): source-detector distance
+        wavelengths (Optional[np.ndarray], optional): Wavelengths to
+        calculate at, within those of `extinction_coefficients`, e.g.
+        `UCLNConstants.interp_wavelengths`. Defaults to None, the wavelengths
+        of `extinction_coefficients`.
+        chunk_size (int, optional): Frames per chunk. Defaults to 4096.
+        out (Optional[np.ndarray], optional): `T`x`W` array to write to.
+        Defaults to None, allocating one.
+
+    Returns:
+        np.ndarray: `T`x`W` differential pathlength factors
+    """
+    return calc_optical_properties(  # type: ignore
+        coefficients,
+        extinction_coefficients,
+        d,
+        wavelengths,
+        chunk_size,
+        dpf_out=out,
+        dtype=np.float64 if out is None else out.dtype,
+    ).dpf
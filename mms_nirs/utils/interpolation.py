@@ -0,0 +1,270 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.interpolate import BSpline, make_interp_spline
+from scipy.sparse import csr_array
+from scipy.sparse.linalg import splu
+
+
+class SplineOperator:
+    """Cubic spline interpolation from one wavelength grid to another
+
+    Equivalent to `interp1d(kind="cubic")` with not-a-knot end conditions,
+    but factorised instead of dense. Spline co-efficients come from solving
+    the banded `N`x`N` collocation system, whose sparse LU factors are kept,
+    and each target point then depends on just 4 co-efficients, a sparse
+    `M`x`N` evaluation matrix. Storage is O(`N` + `M`) rather than the
+    `M`x`N` of the dense operator. Like make_interp_spline, targets outside
+    the source grid are extrapolated.
+    """
+
+    def __init__(
+        self, source_wavelengths: NDArray, target_wavelengths: NDArray
+    ) -> None:
+        """
+        Args:
+            source_wavelengths (NDArray): Increasing wavelengths the spectra
+            are sampled at, length `N` of at least 4
+            target_wavelengths (NDArray): Wavelengths to interpolate to,
+            length `M`
+        """
+        self.source_wavelengths = np.asarray(
+            source_wavelengths, dtype=np.float64
+        )
+        self.target_wavelengths = np.asarray(
+            target_wavelengths, dtype=np.float64
+        )
+        # Not-a-knot knots, as make_interp_spline chooses them
+        knots = make_interp_spline(
+            self.source_wavelengths, np.zeros(self.source_wavelengths.size)
+        ).t
+        self._collocation = splu(
+            BSpline.design_matrix(self.source_wavelengths, knots, 3).tocsc()
+        )
+        self._evaluation: csr_array = csr_array(
+            BSpline.design_matrix(
+                self.target_wavelengths, knots, 3, extrapolate=True
+            )
+        )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._evaluation.shape  # type: ignore
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the factors"""
+        factors = (self._collocation.L, self._collocation.U, self._evaluation)
+        return sum(
+            factor.data.nbytes + factor.indices.nbytes + factor.indptr.nbytes
+            for factor in factors
+        )
+
+    def apply(
+        self,
+        values: NDArray,
+        out: Optional[NDArray] = None,
+        chunk_size: int = 1024,
+    ) -> NDArray:
+        """Interpolate spectra along their last axis
+
+        Spectra are processed `chunk_size` at a time, so besides `out` the
+        working memory is a few `chunk_size`x`N` blocks and the cost is
+        O(`N` + `M`) per spectrum.
+
+        Args:
+            values (NDArray): `...`x`N` spectra on the source grid
+            out (Optional[NDArray], optional): `...`x`M` array to write to,
+            of any floating type. Defaults to None, allocating float64.
+            chunk_size (int, optional): Spectra per chunk. Defaults to 1024.
+
+        Raises:
+            ValueError: Error if `out` has the wrong shape
+
+        Returns:
+            NDArray: `...`x`M` spectra on the target grid
+        """
+        values = np.asarray(values)
+        shape = (*values.shape[:-1], self.shape[0])
+        if out is None:
+            out = np.empty(shape)
+        elif out.shape != shape:
+            raise ValueError(
+                f"Expected out of shape {shape}, got {out.shape} instead"
+            )
+        rows = values.reshape(-1, values.shape[-1])
+        out_rows = out.reshape(-1, shape[-1])
+        for start in range(0, rows.shape[0], chunk_size):
+            # Columns are the right hand sides of the collocation system
+            columns = np.asfortranarray(
+                rows[start : start + chunk_size].T, dtype=np.float64
+            )
+            coefficients = self._collocation.solve(columns)
+            out_rows[start : start + chunk_size] = (
+                self._evaluation @ coefficients
+            ).T
+        if not np.shares_memory(out_rows, out):
+            # reshape copied a non-contiguous out
+            out[...] = out_rows.reshape(shape)
+        return out
+
+    def fold(self, left: NDArray) -> NDArray:
+        """`left @ todense()` without forming the dense operator
+
+        Used to merge a following linear step, e.g. the UCLN pseudo-inverse,
+        into one `K`x`N` operator in O(`K`(`N` + `M`)) memory.
+
+        Args:
+            left (NDArray): `K`x`M` matrix applied after interpolation
+
+        Returns:
+            NDArray: `K`x`N` matrix
+        """
+        # left B A^-1 = (A^-T (left B)^T)^T
+        projected = np.asfortranarray((self._evaluation.T @ left.T))
+        return self._collocation.solve(projected, trans="T").T
+
+    def todense(self) -> NDArray:
+        """The `M`x`N` dense interpolation matrix"""
+        return self.fold(np.eye(self.shape[0]))
+
+
+class SplineOperatorCache:
+    """Least recently used cache of SplineOperator by source and target grid
+
+    Devices keep the same wavelength grids, so operators are factorised once
+    and shared by every caller. Safe to use from several threads.
+    """
+
+    def __init__(self, maxsize: int = 32) -> None:
+        """
+        Args:
+            maxsize (int, optional): Number of operators kept. Defaults to
+            32.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._operators: OrderedDict[
+            Tuple[bytes, bytes], SplineOperator
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._operators)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(
+                operator.nbytes for operator in self._operators.values()
+            )
+
+    def get(
+        self, source_wavelengths: NDArray, target_wavelengths: NDArray
+    ) -> SplineOperator:
+        """Cached operator between two grids, factorised on a miss"""
+        source = np.ascontiguousarray(source_wavelengths, dtype=np.float64)
+        target = np.ascontiguousarray(target_wavelengths, dtype=np.float64)
+        key = (source.tobytes(), target.tobytes())
+        with self._lock:
+            operator = self._operators.get(key)
+            if operator is not None:
+                self._operators.move_to_end(key)
+                self.hits += 1
+                return operator
+            self.misses += 1
+
+        # Factorise outside the lock, racing threads just duplicate work
+        operator = SplineOperator(source, target)
+        with self._lock:
+            self._operators[key] = operator
+            self._operators.move_to_end(key)
+            while len(self._operators) > self.maxsize:
+                self._operators.popitem(last=False)
+        return operator
+
+    def stats(self) -> dict:
+        """Hits, misses, number and size of the cached operators"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "nbytes": self.nbytes,
+        }
+
+    def clear(self) -> None:
+        """Drop every operator and reset the statistics"""
+        with self._lock:
+            self._operators.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by UCLN, FramePipeline and anything else interpolating spectra
+spline_operators = SplineOperatorCache()
+
+
+def check_interpolation_range(
+    source_wavelengths: NDArray, target_wavelengths: NDArray
+) -> None:
+    """Check the target wavelengths lie within the source grid, beyond
+    which SplineOperator would extrapolate
+
+    Raises:
+        ValueError: Error if a target wavelength is outside the source grid
+    """
+    if np.min(target_wavelengths) < np.min(source_wavelengths) or np.max(
+        target_wavelengths
+    ) > np.max(source_wavelengths):
+        raise ValueError(
+            f"Interpolation wavelengths {np.min(target_wavelengths)} to "
+            f"{np.max(target_wavelengths)} are outside the spectra's range"
+        )
+
+
+def spline_operator(
+    source_wavelengths: NDArray,
+    target_wavelengths: NDArray,
+    cache: Optional[SplineOperatorCache] = None,
+) -> SplineOperator:
+    """Cubic spline operator between two grids from the shared cache
+
+    Args:
+        source_wavelengths (NDArray): Wavelengths the spectra are sampled at
+        target_wavelengths (NDArray): Wavelengths to interpolate to
+        cache (Optional[SplineOperatorCache], optional): Cache to use.
+        Defaults to None, the module wide `spline_operators`.
+
+    Returns:
+        SplineOperator: Cached operator
+    """
+    if cache is None:
+        cache = spline_operators
+    return cache.get(source_wavelengths, target_wavelengths)
+
+
+def cubic_interpolation_matrix(
+    source_wavelengths: NDArray, target_wavelengths: NDArray
+) -> NDArray:
+    """Linear operator equivalent to `interp1d(kind="cubic")`
+
+    Cubic spline interpolation is linear in the data, so interpolating the
+    identity gives a matrix that maps any spectrum on the source grid to the
+    target grid with a single matrix product. Built from the cached
+    SplineOperator of the two grids.
+
+    Args:
+        source_wavelengths (NDArray): Wavelengths the spectra are sampled at,
+        length `N`
+        target_wavelengths (NDArray): Wavelengths to interpolate to, length
+        `M`
+
+    Returns:
+        NDArray: `M`x`N` interpolation matrix
+    """
+    return spline_operator(source_wavelengths, target_wavelengths).todense()
@@ -0,0 +1,345 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numpy.typing import NDArray
+
+if TYPE_CHECKING:
+    from ..BRUNO.batch import BatchFitResult
+
+# Coefficients in the order calc_values returns them, as Boundaries.columns
+FIT_COLUMNS = ("water_frac", "HHb", "HbO2", "a", "b")
+
+
+class _ParquetResultWriter:
+    """Buffers rows and streams them to Parquet one row group at a time
+
+    Every file starts with a `frame` index, an optional `time` and an
+    optional `channel` column followed by the result columns. Frames are
+    counted per channel, so rows of one channel are numbered from 0 however
+    they interleave with other channels.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        fields: List[pa.Field],
+        row_group_size: int,
+        compression: str,
+    ) -> None:
+        self.schema = pa.schema(
+            [
+                pa.field("frame", pa.int64()),
+                pa.field("time", pa.float64()),
+                pa.field("channel", pa.string()),
+                *fields,
+            ]
+        )
+        self.row_group_size = row_group_size
+        self.n_frames = 0
+        self._channel_frames: Dict[Optional[str], int] = {}
+        self._writer = pq.ParquetWriter(
+            path, self.schema, compression=compression
+        )
+        self._buffer: Dict[str, List[pa.Array]] = {
+            name: [] for name in self.schema.names
+        }
+        self._n_buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _append(
+        self,
+        columns: Dict[str, pa.Array],
+        time: Optional[NDArray],
+        channel: Optional[str],
+    ) -> None:
+        n = len(next(iter(columns.values())))
+        first = self._channel_frames.get(channel, 0)
+        columns["frame"] = pa.array(np.arange(first, first + n), pa.int64())
+        self._channel_frames[channel] = first + n
+        columns["time"] = (
+            pa.nulls(n, pa.float64())
+            if time is None
+            else pa.array(np.asarray(time, np.float64))
+        )
+        columns["channel"] = pa.array([channel] * n, pa.string())
+        for name in self.schema.names:
+            self._buffer[name].append(columns[name])
+        self.n_frames += n
+        self._n_buffered += n
+        if self._n_buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered rows to the file"""
+        if self._n_buffered == 0:
+            return
+        table = pa.Table.from_arrays(
+            [
+                pa.concat_arrays(self._buffer[field.name]).cast(field.type)
+                for field in self.schema
+            ],
+            schema=self.schema,
+        )
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self._buffer = {name: [] for name in self.schema.names}
+        self._n_buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+
+class ConcentrationWriter(_ParquetResultWriter):
+    """Stream UCLN concentration time-series to a Parquet file
+
+    Example:
+        with ConcentrationWriter("conc.parquet", ["HbO2", "HHb", "CCO"]) as w:
+            w.write(ucln.calc_concentrations(spectra, wavelengths))
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        species: Sequence[str],
+        row_group_size: int = 65536,
+        compression: str = "zstd",
+    ) -> None:
+        """
+        Args:
+            path (Union[str, Path]): File to write
+            species (Sequence[str]): Names of the concentration columns, in
+            the order UCLN returns them
+            row_group_size (int, optional): Rows per row group. Defaults to
+            65536.
+            compression (str, optional): Parquet compression codec. Defaults
+            to "zstd".
+        """
+        self.species = list(species)
+        super().__init__(
+            path,
+            [pa.field(name, pa.float64()) for name in self.species],
+            row_group_size,
+            compression,
+        )
+
+    def write(
+        self,
+        concentrations: NDArray,
+        time: Optional[NDArray] = None,
+        channel: Optional[str] = None,
+    ) -> None:
+        """Append a `T`x`S` block of concentrations
+
+        Args:
+            concentrations (NDArray): Concentrations, one column per species
+            time (Optional[NDArray], optional): Timestamps of the `T` rows.
+            Defaults to None.
+            channel (Optional[str], optional): Channel the rows belong to.
+            Defaults to None.
+        """
+        concentrations = np.atleast_2d(concentrations)
+        self._append(
+            {
+                name: pa.array(concentrations[:, i])
+                for i, name in enumerate(self.species)
+            },
+            time,
+            channel,
+        )
+
+
+class FitWriter(_ParquetResultWriter):
+    """Stream BRUNO fits (stO2, coefficients and scores) to a Parquet file
+
+    The per-wavelength `residual` and `residual_norm` arrays are only kept
+    when `n_wavelengths` is given. They are stored as fixed size list
+    columns, so they can be skipped when reading the scalar columns back.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        n_wavelengths: Optional[int] = None,
+        residual_dtype: np.dtype = np.dtype(np.float32),
+        row_group_size: int = 65536,
+        compression: str = "zstd",
+    ) -> None:
+        """
+        Args:
+            path (Union[str, Path]): File to write
+            n_wavelengths (Optional[int], optional): Length of the residual
+            arrays. None drops residuals. Defaults to None.
+            residual_dtype (np.dtype, optional): Type residuals are stored
+            as. Defaults to float32.
+            row_group_size (int, optional): Rows per row group. Defaults to
+            65536.
+            compression (str, optional): Parquet compression codec. Defaults
+            to "zstd".
+        """
+        self.n_wavelengths = n_wavelengths
+        fields = [pa.field("stO2", pa.float64())]
+        fields += [pa.field(name, pa.float64()) for name in FIT_COLUMNS]
+        fields += [
+            pa.field("sum_residual", pa.float64()),
+            pa.field("score", pa.float64()),
+        ]
+        if n_wavelengths is not None:
+            residual_type = pa.list_(
+                pa.from_numpy_dtype(residual_dtype), n_wavelengths
+            )
+            fields += [
+                pa.field("residual", residual_type),
+                pa.field("residual_norm", residual_type),
+            ]
+        super().__init__(path, fields, row_group_size, compression)
+
+    def write_batch(
+        self,
+        stO2: NDArray,
+        coefficients: NDArray,
+        sum_residual: NDArray,
+        score: NDArray,
+        residual: Optional[NDArray] = None,
+        residual_norm: Optional[NDArray] = None,
+        time: Optional[NDArray] = None,
+        channel: Optional[str] = None,
+    ) -> None:
+        """Append `T` fits
+
+        Args:
+            stO2 (NDArray): stO2 of each fit, length `T`
+            coefficients (NDArray): `T`x5 fitted coefficients
+            sum_residual (NDArray): Sum of residuals, length `T`
+            score (NDArray): Score of each fit, length `T`
+            residual (Optional[NDArray], optional): `T`x`W` residuals. Only
+            stored if the writer keeps residuals, as NaN if not given.
+            Defaults to None.
+            residual_norm (Optional[NDArray], optional): `T`x`W` normalised
+            residuals, stored as `residual` is. Defaults to None.
+            time (Optional[NDArray], optional): Timestamps of the fits.
+            Defaults to None.
+            channel (Optional[str], optional): Channel the fits belong to.
+            Defaults to None.
+        """
+        stO2 = np.atleast_1d(stO2)
+        coefficients = np.atleast_2d(coefficients)
+        columns = {
+            "stO2": pa.array(stO2, pa.float64()),
+            "sum_residual": pa.array(
+                np.atleast_1d(sum_residual), pa.float64()
+            ),
+            "score": pa.array(np.atleast_1d(score), pa.float64()),
+        }
+        for i, name in enumerate(FIT_COLUMNS):
+            columns[name] = pa.array(coefficients[:, i], pa.float64())
+
+        if self.n_wavelengths is not None:
+            for name, values in (
+                ("residual", residual),
+                ("residual_norm", residual_norm),
+            ):
+                field_type = self.schema.field(name).type
+                # NaN rather than null lists, which Parquet can't store
+                # alongside valid ones
+                if values is None:
+                    values = np.full((len(stO2), self.n_wavelengths), np.nan)
+                values = np.atleast_2d(values).astype(
+                    field_type.value_type.to_pandas_dtype()
+                )
+                columns[name] = pa.FixedSizeListArray.from_arrays(
+                    pa.array(values.ravel()), self.n_wavelengths
+                )
+        self._append(columns, time, channel)
+
+    def write_results(
+        self, results: "BatchFitResult", channel: Optional[str] = None
+    ) -> None:
+        """Append the fits held in a BatchFitResult, with their times"""
+        self.write_batch(
+            results.stO2,
+            results.coefficients,
+            results.sum_residual,
+            results.score,
+            results.residual,
+            results.residual_norm,
+            results.time,
+            channel,
+        )
+
+    def write_fit(
+        self,
+        stO2: float,
+        coefficients: NDArray,
+        residual: NDArray,
+        residual_norm: NDArray,
+        sum_residual: float,
+        score: float,
+        time: Optional[float] = None,
+        channel: Optional[str] = None,
+    ) -> None:
+        """Append the tuple returned by a single `calc_values` call"""
+        self.write_batch(
+            np.array([stO2]),
+            coefficients[np.newaxis],
+            np.array([sum_residual]),
+            np.array([score]),
+            residual[np.newaxis],
+            residual_norm[np.newaxis],
+            None if time is None else np.array([time]),
+            channel,
+        )
+
+
+def read_results(
+    path: Union[str, Path],
+    columns: Optional[Sequence[str]] = None,
+    channel: Optional[str] = None,
+) -> pa.Table:
+    """Read back results written by ConcentrationWriter or FitWriter
+
+    Args:
+        path (Union[str, Path]): File to read
+        columns (Optional[Sequence[str]], optional): Columns to read. Only
+        these are decompressed. Defaults to None, reading all.
+        channel (Optional[str], optional): Only read rows of this channel.
+        Defaults to None.
+
+    Returns:
+        pa.Table: Results. Use `.to_pandas()` for a DataFrame of scalar
+        columns or `residual_matrix` for residual columns
+    """
+    filters = None if channel is None else [("channel", "=", channel)]
+    return pq.read_table(
+        path,
+        columns=None if columns is None else list(columns),
+        filters=filters,
+    )
+
+
+def residual_matrix(table: pa.Table, column: str = "residual") -> NDArray:
+    """Convert a residual column of a results table into a `T`x`W` array
+
+    Rows written without residuals, NaN or null, are NaN here.
+    """
+    residuals = table[column].combine_chunks()
+    valid = residuals.is_valid().to_numpy(zero_copy_only=False)
+    matrix = np.full(
+        (len(residuals), residuals.type.list_size),
+        np.nan,
+        residuals.type.value_type.to_pandas_dtype(),
+    )
+    matrix[valid] = (
+        residuals.filter(residuals.is_valid())
+        .flatten()
+        .to_numpy(zero_copy_only=False)
+        .reshape(-1, residuals.type.list_size)
+    )
+    return matrix
@@ -0,0 +1,92 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import backends
+from mms_nirs.BRUNO.fminsearchbnd import (
+    get_bound_class,
+    xtransform_to_constrained,
+    xtransform_to_unconstrained,
+)
+from mms_nirs.BRUNO.model_types import (
+    ExtrapolatedBoundaryConditions,
+    ZeroBoundaryConditions,
+)
+
+mu_s = np.array([0.5, 1.0, 2.0])
+mu_a = np.array([0.01, 0.02, 0.04])
+d_s = 22.5
+d_l = 45.0
+
+
+class TestModelKernels:
+    def test_zbc_short_separation(self):
+        expected = ZeroBoundaryConditions.attenuation_slope()(mu_s, mu_a, d_s)
+        actual = backends.zbc_attenuation_slope_short(mu_s, mu_a, d_s)
+        npt.assert_allclose(actual, expected, rtol=1e-12)
+
+    def test_zbc_long_separation(self):
+        expected = ZeroBoundaryConditions.attenuation_slope(True)(
+            mu_s, mu_a, d_s, d_l
+        )
+        actual = backends.zbc_attenuation_slope_long(mu_s, mu_a, d_s, d_l)
+        npt.assert_allclose(actual, expected, rtol=1e-12)
+
+    def test_ebc_short_separation(self):
+        expected = ExtrapolatedBoundaryConditions.attenuation_slope()(
+            mu_s, mu_a, d_s
+        )
+        actual = backends.ebc_attenuation_slope_short(mu_s, mu_a, d_s)
+        npt.assert_allclose(actual, expected, rtol=1e-12)
+
+    def test_ebc_long_separation(self):
+        expected = ExtrapolatedBoundaryConditions.attenuation_slope(True)(
+            mu_s, mu_a, d_s, d_l
+        )
+        actual = backends.ebc_attenuation_slope_long(mu_s, mu_a, d_s, d_l)
+        npt.assert_allclose(actual, expected, rtol=1e-12)
+
+
+class TestBoundTransforms:
+    LB = np.array([0.97, 0.0, -np.inf, 2.0, -np.inf])
+    UB = np.array([1.0, 40.0, 3.0, 2.0, np.inf])
+    x0 = np.array([0.98, 20.0, 1.0, 2.0, 5.0])
+
+    def params(self):
+        return {
+            "LB": self.LB,
+            "UB": self.UB,
+            "n": len(self.x0),
+            "BoundClass": [
+                get_bound_class(lb, ub) for lb, ub in zip(self.LB, self.UB)
+            ],
+        }
+
+    def codes(self):
+        return np.array(
+            [backends._BOUND_CODES[bc] for bc in self.params()["BoundClass"]]
+        )
+
+    def test_to_unconstrained_matches_fminsearchbnd(self):
+        expected = xtransform_to_unconstrained(self.x0, self.params())
+        actual = backends.to_unconstrained(
+            self.x0, self.LB, self.UB, self.codes()
+        )
+        npt.assert_allclose(actual, expected)
+
+    def test_to_constrained_matches_fminsearchbnd(self):
+        xu = np.array([0.3, 7.0, 1.5, -2.0])
+        expected = xtransform_to_constrained(xu, self.params())
+        actual = backends.to_constrained(xu, self.LB, self.UB, self.codes())
+        npt.assert_allclose(actual, expected)
+
+
+class TestResolveBackend:
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            backends.resolve_backend("fortran")  # type: ignore
+
+    def test_falls_back_without_numba(self, monkeypatch):
+        monkeypatch.setattr(backends, "NUMBA_AVAILABLE", False)
+        with pytest.warns(RuntimeWarning):
+            assert backends.resolve_backend("numba") == "numpy"
@@ -0,0 +1,154 @@
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO.batch import BatchFitResult, calc_values_batch
+from mms_nirs.BRUNO.calc_values import calc_values
+from mms_nirs.BRUNO.derivative_fit import BoundaryType
+from mms_nirs.BRUNO.screening import FrameScreen
+from mms_nirs.profiling import Profiler
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def function_arguments():
+    return {
+        "extinction": np.genfromtxt(
+            FIXTURE_DIR / "extinctions.csv", delimiter=","
+        ),
+        "wavelengths": np.genfromtxt(
+            FIXTURE_DIR / "wavelengths.csv", delimiter=","
+        ),
+        "boundaries": np.array(
+            [
+                [1.0, 20.0, 20.0, 1.0, 3.0],
+                [0.970000000000000, 0.0, 0.0, 0.0, 0.0],
+                [1.0, 40.0, 40.0, 2.0, 4.0],
+            ]
+        ),
+        "boundary_condition_type": BoundaryType.ZBC,
+        "distance": 22.5,
+    }
+
+
+@pytest.fixture
+def slope():
+    return np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=",")
+
+
+class TestBatchFitResult:
+    def test_set_and_fields(self, slope, function_arguments):
+        fit = calc_values(slope, **function_arguments)
+        result = BatchFitResult(3, n_residuals=len(fit[2]))
+
+        result.set(1, fit)
+
+        npt.assert_array_equal(result.success, [False, True, False])
+        assert result.stO2[1] == fit[0]
+        npt.assert_array_equal(result.coefficients[1], fit[1])
+        npt.assert_allclose(result.residual[1], fit[2], rtol=1e-6)
+        assert result.score[1] == fit[5]
+
+    def test_time_range_is_a_view(self):
+        result = BatchFitResult(10, time=np.linspace(0, 0.9, 10))
+
+        window = result.time_range(0.25, 0.55)
+        window.fits["stO2"] = 50.0
+
+        npt.assert_allclose(window.time, [0.3, 0.4, 0.5])
+        assert np.count_nonzero(result.stO2 == 50.0) == 3
+
+    def test_smaller_than_list_of_tuples(self, slope, function_arguments):
+        stO2, coefficients, _, _, sum_residual, score = calc_values(
+            slope, **function_arguments
+        )
+        result = BatchFitResult(1000)
+        assert result.nbytes == 1000 * 8 * 8
+
+        # The same scalars kept as 1000 calc_values style tuples
+        tracemalloc.start()
+        try:
+            fits = [
+                (
+                    float(stO2),
+                    coefficients.copy(),
+                    float(sum_residual),
+                    float(score),
+                )
+                for _ in range(1000)
+            ]
+            tuples_nbytes = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        assert len(fits) == 1000
+        assert result.nbytes < tuples_nbytes / 2
+
+
+class TestCalcValuesBatch:
+    def test_matches_calc_values(self, slope, function_arguments):
+        expected = calc_values(slope, **function_arguments)
+
+        result = calc_values_batch(
+            np.vstack([slope, slope]),
+            keep_residuals=True,
+            **function_arguments,
+        )
+
+        npt.assert_array_equal(result.stO2, [expected[0]] * 2)
+        npt.assert_array_equal(result.sum_residual, [expected[4]] * 2)
+        assert result.residual.shape == (2, len(slope) - 1)
+
+    def test_fills_preallocated_output(self, slope, function_arguments):
+        out = BatchFitResult(2)
+        out.fits["stO2"] = 0.0
+
+        result = calc_values_batch(
+            np.vstack([slope, slope]),
+            out=out,
+            **function_arguments,
+        )
+
+        assert result is out
+        assert np.all(out.stO2 > 80)
+
+    def test_mismatched_output(self, slope, function_arguments):
+        with pytest.raises(ValueError):
+            calc_values_batch(
+                slope, out=BatchFitResult(2), **function_arguments
+            )
+
+    def test_non_finite_slopes_skip_the_solver(
+        self, slope, function_arguments
+    ):
+        bad = slope.copy()
+        bad[100] = np.nan
+        out = BatchFitResult(2)
+        out.fits["stO2"] = 0.0
+
+        with Profiler() as profiler:
+            result = calc_values_batch(
+                np.vstack([bad, slope]), out=out, **function_arguments
+            )
+
+        npt.assert_array_equal(result.success, [False, True])
+        assert profiler.counters["screen.invalid"] == 1
+        assert profiler.counters["screen.rejected"] == 1
+        # Only the valid slope is fitted
+        assert profiler.stages["calc_values"].count == 1
+
+    def test_given_screen(self, slope, function_arguments):
+        slopes = np.vstack([slope, slope])
+        slopes[0, 120] += 0.01
+        screen = FrameScreen(max_jump=30).screen(
+            slopes, function_arguments["wavelengths"]
+        )
+
+        result = calc_values_batch(slopes, screen=screen, **function_arguments)
+
+        npt.assert_array_equal(result.success, [False, True])
+        with pytest.raises(ValueError):
+            calc_values_batch(slope, screen=screen, **function_arguments)
@@ -0,0 +1,105 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO.batch import calc_values_batch
+from mms_nirs.BRUNO.cache import FitCache
+from mms_nirs.BRUNO.calc_values import calc_values
+from mms_nirs.BRUNO.derivative_fit import BoundaryType
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def function_arguments():
+    return {
+        "extinction": np.genfromtxt(
+            FIXTURE_DIR / "extinctions.csv", delimiter=","
+        ),
+        "wavelengths": np.genfromtxt(
+            FIXTURE_DIR / "wavelengths.csv", delimiter=","
+        ),
+        "boundaries": np.array(
+            [
+                [1.0, 20.0, 20.0, 1.0, 3.0],
+                [0.970000000000000, 0.0, 0.0, 0.0, 0.0],
+                [1.0, 40.0, 40.0, 2.0, 4.0],
+            ]
+        ),
+        "boundary_condition_type": BoundaryType.ZBC,
+        "distance": 22.5,
+    }
+
+
+@pytest.fixture
+def slope():
+    return np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=",")
+
+
+def test_key_depends_on_every_input(slope):
+    key = FitCache.key(slope, BoundaryType.ZBC, 22.5)
+
+    assert key == FitCache.key(slope.copy(), BoundaryType.ZBC, 22.5)
+    assert key != FitCache.key(slope * 1.001, BoundaryType.ZBC, 22.5)
+    assert key != FitCache.key(slope, BoundaryType.EBC, 22.5)
+    assert key != FitCache.key(slope, BoundaryType.ZBC, 25)
+    assert key != FitCache.key(
+        slope.astype(np.float32), BoundaryType.ZBC, 22.5
+    )
+
+
+def test_key_ignores_scalar_types(slope):
+    key = FitCache.key(slope, 1.0, {"maxfev": 100, "xatol": 1e-6}, (1, 2))
+
+    for distance in (1, np.float64(1.0), np.float32(1.0), np.int64(1)):
+        assert key == FitCache.key(
+            slope,
+            distance,
+            {"xatol": np.float64(1e-6), "maxfev": np.int32(100)},
+            [1, 2],
+        )
+    assert key != FitCache.key(slope, None, {"maxfev": 100}, (1, 2))
+
+
+def test_calc_values_reuses_cached_fit(tmp_path, slope, function_arguments):
+    cache = FitCache(tmp_path / "fits.sqlite")
+
+    fit = calc_values(slope, **function_arguments, cache=cache)
+    cached = calc_values(slope, **function_arguments, cache=cache)
+
+    assert (cache.misses, cache.hits) == (1, 1)
+    for computed, stored in zip(fit, cached):
+        npt.assert_array_equal(computed, stored)
+
+    # A new process sees the same store
+    reopened = FitCache(tmp_path / "fits.sqlite")
+    calc_values(slope, **function_arguments, cache=reopened)
+    assert reopened.hits == 1
+
+
+def test_lru_eviction(tmp_path, slope, function_arguments):
+    fit = calc_values(slope, **function_arguments)
+    cache = FitCache(tmp_path / "fits.sqlite")
+    cache.put("a", fit)
+    size = cache.nbytes
+    cache.max_bytes = 2 * size
+    cache.put("b", fit)
+    cache.get("a")
+
+    cache.put("c", fit)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_calc_values_batch_with_cache(tmp_path, slope, function_arguments):
+    cache = FitCache(tmp_path / "fits.sqlite")
+    slopes = np.vstack([slope, slope])
+
+    results = calc_values_batch(slopes, **function_arguments, cache=cache)
+
+    assert (cache.misses, cache.hits) == (1, 1)
+    npt.assert_array_equal(results.fits[0].tolist(), results.fits[1].tolist())
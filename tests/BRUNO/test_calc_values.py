@@ -4,8 +4,9 @@ import numpy as np
 import numpy.testing as npt
 import pytest
 
-from mms_nirs.BRUNO.calc_values import calc_values
+from mms_nirs.BRUNO.calc_values import BudgetedFit, FitBudget, calc_values
 from mms_nirs.BRUNO.derivative_fit import BoundaryType
+from mms_nirs.profiling import Profiler
 
 FIXTURE_DIR = Path(__file__).parent / "fixtures"
 
@@ -41,9 +42,14 @@ def mock_boundaries():
     )
 
 
+@pytest.fixture(params=["numpy", "numba"])
+def backend(request):
+    return request.param
+
+
 @pytest.fixture
 def function_arguments(
-    mock_extinctions, mock_wavelengths, mock_boundaries, mock_slope
+    mock_extinctions, mock_wavelengths, mock_boundaries, mock_slope, backend
 ):
     return {
         "slope": mock_slope,
@@ -51,6 +57,7 @@ def function_arguments(
         "wavelengths": mock_wavelengths,
         "boundaries": mock_boundaries,
         "distance": 22.5,
+        "backend": backend,
     }
 
 
@@ -189,3 +196,96 @@ class TestCalcValues:
         )
         npt.assert_approx_equal(stO2, expected_stO2)
         npt.assert_approx_equal(score, expected_score, significant=4)
+
+
+class TestCoarseToFine:
+    @pytest.mark.parametrize(
+        "boundary_condition_type, distance_max",
+        [
+            (BoundaryType.ZBC, None),
+            (BoundaryType.ZBC, 45.0),
+            (BoundaryType.EBC, None),
+            (BoundaryType.EBC, 45.0),
+        ],
+    )
+    def test_matches_single_resolution_fit(
+        self, function_arguments, boundary_condition_type, distance_max
+    ):
+        single = calc_values(
+            boundary_condition_type=boundary_condition_type,
+            distance_max=distance_max,
+            **function_arguments,
+        )
+        coarse_to_fine = calc_values(
+            boundary_condition_type=boundary_condition_type,
+            distance_max=distance_max,
+            strides=(10, 1),
+            **function_arguments,
+        )
+        assert abs(coarse_to_fine[0] - single[0]) < 1e-4
+        npt.assert_allclose(coarse_to_fine[1], single[1], rtol=1e-3)
+        assert coarse_to_fine[2].shape == single[2].shape
+
+    def test_stages_are_profiled(self, function_arguments):
+        with Profiler() as profiler:
+            calc_values(
+                boundary_condition_type=BoundaryType.ZBC,
+                strides=(10, 1),
+                **function_arguments,
+            )
+        assert "calc_values.stride_10" in profiler.stages
+        assert "calc_values.stride_1" in profiler.stages
+
+    def test_strides_must_end_on_full_grid(self, function_arguments):
+        with pytest.raises(ValueError):
+            calc_values(
+                boundary_condition_type=BoundaryType.ZBC,
+                strides=(10, 5),
+                **function_arguments,
+            )
+
+
+class TestFitBudget:
+    def test_exhausted_budget_returns_best_vertex(self, function_arguments):
+        full = calc_values(
+            boundary_condition_type=BoundaryType.ZBC, **function_arguments
+        )
+        limited = calc_values(
+            boundary_condition_type=BoundaryType.ZBC,
+            budget=FitBudget(max_evaluations=100),
+            **function_arguments,
+        )
+        assert isinstance(limited, BudgetedFit)
+        assert limited.budget_exhausted
+        assert limited.evaluations <= 100
+        assert np.isfinite(limited.score)
+        assert 0 <= limited.stO2 <= 100
+        assert limited.astuple()[2].shape == full[2].shape
+
+    def test_generous_budget_matches_unbudgeted_fit(self, function_arguments):
+        full = calc_values(
+            boundary_condition_type=BoundaryType.EBC, **function_arguments
+        )
+        budgeted = calc_values(
+            boundary_condition_type=BoundaryType.EBC,
+            budget=FitBudget(max_seconds=60.0, max_evaluations=10**6),
+            **function_arguments,
+        )
+        assert not budgeted.budget_exhausted
+        npt.assert_approx_equal(budgeted.stO2, full[0], significant=10)
+        npt.assert_allclose(budgeted.coefficients, full[1])
+
+    def test_time_limit(self, function_arguments):
+        # Compile and build the models outside the time limit
+        calc_values(
+            boundary_condition_type=BoundaryType.ZBC,
+            budget=FitBudget(max_evaluations=10),
+            **function_arguments,
+        )
+        limited = calc_values(
+            boundary_condition_type=BoundaryType.ZBC,
+            budget=FitBudget(max_seconds=0.0),
+            **function_arguments,
+        )
+        assert limited.budget_exhausted
+        assert np.isfinite(limited.score)
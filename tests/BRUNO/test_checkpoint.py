@@ -0,0 +1,162 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO.batch import BatchFitResult, calc_values_batch
+from mms_nirs.BRUNO.checkpoint import (
+    MANIFEST,
+    BatchCheckpoint,
+    calc_values_checkpointed,
+)
+from mms_nirs.BRUNO.derivative_fit import BoundaryType
+from mms_nirs.profiling import Profiler
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def function_arguments():
+    return {
+        "extinction": np.genfromtxt(
+            FIXTURE_DIR / "extinctions.csv", delimiter=","
+        ),
+        "wavelengths": np.genfromtxt(
+            FIXTURE_DIR / "wavelengths.csv", delimiter=","
+        ),
+        "boundaries": np.array(
+            [
+                [1.0, 20.0, 20.0, 1.0, 3.0],
+                [0.970000000000000, 0.0, 0.0, 0.0, 0.0],
+                [1.0, 40.0, 40.0, 2.0, 4.0],
+            ]
+        ),
+        "boundary_condition_type": BoundaryType.ZBC,
+        "distance": 22.5,
+        "backend": "numba",
+    }
+
+
+@pytest.fixture
+def slopes():
+    slope = np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=",")
+    # Distinct rows, one failing, so misordered chunks would show
+    slopes = np.vstack([slope * (1 + 0.01 * i) for i in range(5)])
+    slopes[3, 100] = np.nan
+    return slopes
+
+
+def forget_chunks(directory: Path, completed):
+    manifest = json.loads((directory / MANIFEST).read_text())
+    manifest["completed"] = completed
+    (directory / MANIFEST).write_text(json.dumps(manifest))
+
+
+class TestBatchCheckpoint:
+    def test_save_and_load(self, tmp_path):
+        checkpoint = BatchCheckpoint(tmp_path, "key", 5, 2, n_residuals=3)
+        assert checkpoint.n_chunks == 3
+        assert checkpoint.pending() == [0, 1, 2]
+
+        chunk = BatchFitResult(1, n_residuals=3)
+        chunk.fits["stO2"] = 50.0
+        chunk.residual[:] = 1.0
+        checkpoint.save(2, chunk)
+
+        reopened = BatchCheckpoint(tmp_path, "key", 5, 2, n_residuals=3)
+        assert reopened.pending() == [0, 1]
+        result = reopened.load(time=np.arange(5.0))
+        npt.assert_array_equal(result.success, [0, 0, 0, 0, 1])
+        npt.assert_array_equal(result.residual[4], 1.0)
+        npt.assert_array_equal(result.time, np.arange(5.0))
+        with pytest.raises(ValueError):
+            list(reopened.chunks())
+
+    def test_rejects_other_inputs(self, tmp_path):
+        BatchCheckpoint(tmp_path, "key", 5, 2)
+        with pytest.raises(ValueError):
+            BatchCheckpoint(tmp_path, "other", 5, 2)
+        with pytest.raises(ValueError):
+            BatchCheckpoint(tmp_path, "key", 5, 3)
+        with pytest.raises(ValueError):
+            BatchCheckpoint(tmp_path, "key", 5, 2, n_residuals=3)
+
+    def test_chunk_length_checked(self, tmp_path):
+        checkpoint = BatchCheckpoint(tmp_path, "key", 5, 2)
+        with pytest.raises(ValueError):
+            checkpoint.save(0, BatchFitResult(1))
+
+
+class TestCalcValuesCheckpointed:
+    def test_matches_calc_values_batch(
+        self, tmp_path, slopes, function_arguments
+    ):
+        expected = calc_values_batch(
+            slopes, keep_residuals=True, **function_arguments
+        )
+        result = calc_values_checkpointed(
+            slopes,
+            directory=tmp_path,
+            chunk_size=2,
+            keep_residuals=True,
+            **function_arguments,
+        )
+
+        npt.assert_array_equal(result.stO2, expected.stO2)
+        npt.assert_array_equal(result.residual, expected.residual)
+        assert len(list(tmp_path.glob("chunk_??????.npy"))) == 3
+
+    def test_resumes_from_completed_chunks(
+        self, tmp_path, slopes, function_arguments
+    ):
+        first = calc_values_checkpointed(
+            slopes, directory=tmp_path, chunk_size=2, **function_arguments
+        )
+        forget_chunks(tmp_path, [1, 2])
+        fitted_chunk = (tmp_path / "chunk_000001.npy").stat().st_mtime_ns
+
+        with Profiler() as profiler:
+            resumed = calc_values_checkpointed(
+                slopes, directory=tmp_path, chunk_size=2, **function_arguments
+            )
+
+        # Only the forgotten chunk's two slopes are fitted again
+        assert profiler.stages["calc_values"].count == 2
+        assert (
+            tmp_path / "chunk_000001.npy"
+        ).stat().st_mtime_ns == fitted_chunk
+        npt.assert_array_equal(resumed.stO2, first.stO2)
+        npt.assert_array_equal(resumed.coefficients, first.coefficients)
+
+    def test_order_independent_of_workers(
+        self, tmp_path, slopes, function_arguments
+    ):
+        serial = calc_values_checkpointed(
+            slopes,
+            directory=tmp_path / "serial",
+            chunk_size=1,
+            **function_arguments,
+        )
+        parallel = calc_values_checkpointed(
+            slopes,
+            directory=tmp_path / "parallel",
+            chunk_size=1,
+            n_workers=2,
+            **function_arguments,
+        )
+        npt.assert_array_equal(parallel.stO2, serial.stO2)
+        npt.assert_array_equal(parallel.coefficients, serial.coefficients)
+
+    def test_other_inputs_raise(self, tmp_path, slopes, function_arguments):
+        calc_values_checkpointed(
+            slopes[:2], directory=tmp_path, chunk_size=2, **function_arguments
+        )
+        with pytest.raises(ValueError):
+            calc_values_checkpointed(
+                slopes[:2] * 2,
+                directory=tmp_path,
+                chunk_size=2,
+                **function_arguments,
+            )
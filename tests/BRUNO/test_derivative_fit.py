@@ -9,6 +9,7 @@ from mms_nirs.BRUNO.derivative_fit import (
     BoundaryType,
     QuantityType,
     derivative_fit,
+    get_model,
 )
 
 FIXTURE_DIR = Path(__file__).parent / "fixtures"
@@ -122,5 +123,15 @@ class TestDerivativeFit:
             )
 
 
-# class TestGetModel:
-#     #TO DO
+class TestGetModel:
+    def test_one_model_per_kind_of_separation(self):
+        long_separation = get_model(
+            BoundaryType.ZBC, QuantityType.ATTENUATION_SLOPE, 30.0
+        )
+
+        assert long_separation is get_model(
+            BoundaryType.ZBC, QuantityType.ATTENUATION_SLOPE, 35.0
+        )
+        assert long_separation is not get_model(
+            BoundaryType.ZBC, QuantityType.ATTENUATION_SLOPE, None
+        )
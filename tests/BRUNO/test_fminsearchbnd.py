@@ -26,3 +26,31 @@ class TestFminsearchbnd:
         result = fminsearchbnd(rosen, [3, 3], [2, 2], [np.inf, 3.0])
         assert result["success"]
         npt.assert_array_almost_equal(result["x"], expected_x)
+
+    def test_initial_step(self):
+        # Default step reproduces scipy's starting simplex
+        default = fminsearchbnd(rosen, [3, 3], options={"disp": False})
+        stepped = fminsearchbnd(
+            rosen, [3, 3], options={"disp": False, "initial_step": 0.05}
+        )
+        npt.assert_array_equal(stepped["x"], default["x"])
+        assert stepped["nfev"] == default["nfev"]
+
+        near = fminsearchbnd(
+            rosen,
+            [1.001, 1.001],
+            options={"disp": False, "initial_step": 0.001},
+        )
+        assert near["success"]
+        npt.assert_array_almost_equal(near["x"], [1.0, 1.0], decimal=3)
+
+    def test_max_time_returns_best_vertex(self):
+        full = fminsearchbnd(rosen, [3, 3], options={"disp": False})
+        limited = fminsearchbnd(
+            rosen, [3, 3], options={"disp": False, "max_time": 0.0}
+        )
+        assert not full["budget_exhausted"]
+        assert limited["budget_exhausted"]
+        assert limited["status"] == 3
+        assert limited["nfev"] < full["nfev"]
+        assert limited["fun"] == rosen(limited["x"])
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO.calc_values import smooth
+from mms_nirs.BRUNO.multiresolution import (
+    ResolutionContext,
+    resolution_contexts,
+)
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def extinction():
+    return np.genfromtxt(FIXTURE_DIR / "extinctions.csv", delimiter=",")
+
+
+@pytest.fixture
+def wavelengths():
+    return np.genfromtxt(FIXTURE_DIR / "wavelengths.csv", delimiter=",")
+
+
+@pytest.fixture
+def smoothed_slope():
+    return smooth(np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=","), 5)
+
+
+def test_stride_one_keeps_full_grid(extinction, wavelengths, smoothed_slope):
+    context = ResolutionContext.of(extinction, wavelengths, 1, 710, 900)
+    npt.assert_array_equal(context.wavelengths, wavelengths)
+    npt.assert_array_equal(context.extinction, extinction)
+    assert (context.wave_start, context.wave_end) == (710, 900)
+    npt.assert_array_equal(
+        context.slope_diff(smoothed_slope), np.diff(smoothed_slope)
+    )
+
+
+def test_coarse_window_sums_fine_differences(
+    extinction, wavelengths, smoothed_slope
+):
+    context = ResolutionContext.of(extinction, wavelengths, 10, 710, 900)
+    assert context.wavelengths[0] == 710
+    assert context.wave_end == 900
+    # One wavelength past the window for the last difference
+    assert context.wavelengths[-1] == 910
+    npt.assert_array_equal(context.extinction[:, 0], context.wavelengths)
+
+    fine = np.diff(smoothed_slope)
+    start = int(np.argwhere(wavelengths == 710)[0][0])
+    npt.assert_allclose(
+        context.slope_diff(smoothed_slope)[:3],
+        [fine[start + 10 * i : start + 10 * (i + 1)].sum() for i in range(3)],
+    )
+
+
+def test_window_end_rounds_down_to_stride(extinction, wavelengths):
+    context = ResolutionContext.of(extinction, wavelengths, 7, 710, 900)
+    assert context.wave_end == 710 + 7 * (190 // 7)
+    assert context.wavelengths[-1] == context.wave_end + 7
+
+
+def test_invalid_strides_raise(extinction, wavelengths):
+    with pytest.raises(ValueError):
+        ResolutionContext.of(extinction, wavelengths, 0, 710, 900)
+    with pytest.raises(ValueError):
+        resolution_contexts(extinction, wavelengths, (10, 5), 710, 900)
+    with pytest.raises(ValueError):
+        resolution_contexts(extinction, wavelengths, (), 710, 900)
+
+
+def test_contexts_are_shared(extinction, wavelengths):
+    first = resolution_contexts(extinction, wavelengths, (10, 1), 710, 900)
+    second = resolution_contexts(
+        extinction.copy(), wavelengths.copy(), (5, 1), 710, 900
+    )
+    assert [context.stride for context in first] == [10, 1]
+    assert first[1] is second[1]
@@ -0,0 +1,145 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import multistart
+from mms_nirs.BRUNO.derivative_fit import BoundaryType
+from mms_nirs.BRUNO.multistart import (
+    calc_values_multistart,
+    latin_hypercube_starts,
+)
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def mock_boundaries():
+    return np.array(
+        [
+            [1.0, 20.0, 20.0, 1.0, 3.0],
+            [0.970000000000000, 0.0, 0.0, 0.0, 0.0],
+            [1.0, 40.0, 40.0, 2.0, 4.0],
+        ]
+    )
+
+
+@pytest.fixture
+def function_arguments(mock_boundaries):
+    return {
+        "slope": np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=","),
+        "extinction": np.genfromtxt(
+            FIXTURE_DIR / "extinctions.csv", delimiter=","
+        ),
+        "wavelengths": np.genfromtxt(
+            FIXTURE_DIR / "wavelengths.csv", delimiter=","
+        ),
+        "boundaries": mock_boundaries,
+        "distance": 22.5,
+    }
+
+
+class TestLatinHypercubeStarts:
+    def test_starts_within_bounds(self, mock_boundaries):
+        starts = latin_hypercube_starts(mock_boundaries, 10, seed=0)
+
+        assert starts.shape == (10, 5)
+        assert np.all(starts >= mock_boundaries[1])
+        assert np.all(starts <= mock_boundaries[2])
+
+    def test_one_start_per_stratum(self, mock_boundaries):
+        starts = latin_hypercube_starts(mock_boundaries, 10, seed=0)
+
+        LB, UB = mock_boundaries[1], mock_boundaries[2]
+        strata = np.floor((starts - LB) / (UB - LB) * 10)
+        for column in strata.T:
+            npt.assert_array_equal(np.sort(column), np.arange(10))
+
+
+class TestCalcValuesMultistart:
+    def test_best_fit_matches_single_start_ZBC(self, function_arguments):
+        result = calc_values_multistart(
+            boundary_condition_type=BoundaryType.ZBC,
+            n_starts=3,
+            n_workers=1,
+            min_agreement=None,
+            seed=0,
+            **function_arguments,
+        )
+
+        assert result.n_completed == 3
+        npt.assert_approx_equal(result.stO2, 84.034715681079630, 4)
+        assert result.stO2_spread >= 0
+        assert result.coefficient_spread.shape == (5,)
+
+    def test_stops_once_starts_agree(self, function_arguments):
+        result = calc_values_multistart(
+            boundary_condition_type=BoundaryType.ZBC,
+            n_starts=6,
+            n_workers=1,
+            min_agreement=2,
+            seed=0,
+            **function_arguments,
+        )
+
+        assert result.n_agreeing == 2
+        assert result.n_completed == 2
+        assert result.n_failed == 0
+        npt.assert_array_equal(result.start_indices, [0, 1])
+        npt.assert_approx_equal(result.stO2, 84.034715681079630, 4)
+
+    def test_agreement_on_process_pool(self, function_arguments):
+        result = calc_values_multistart(
+            boundary_condition_type=BoundaryType.ZBC,
+            n_starts=6,
+            n_workers=2,
+            min_agreement=2,
+            seed=0,
+            **function_arguments,
+        )
+
+        assert result.n_agreeing >= 2
+        assert result.n_completed + result.n_failed <= 6
+        assert len(set(result.start_indices)) == result.n_completed
+        assert set(result.start_indices) <= set(range(6))
+        npt.assert_approx_equal(result.stO2, 84.034715681079630, 4)
+
+    def test_counts_failed_starts(self, function_arguments, monkeypatch):
+        solve = multistart._solve_from_start
+        calls = []
+
+        def fail_first_two(*args):
+            x, fun, success = solve(*args)
+            calls.append(x)
+            return x, fun, success and len(calls) > 2
+
+        monkeypatch.setattr(multistart, "_solve_from_start", fail_first_two)
+        result = calc_values_multistart(
+            boundary_condition_type=BoundaryType.ZBC,
+            n_starts=4,
+            n_workers=1,
+            min_agreement=None,
+            seed=0,
+            **function_arguments,
+        )
+
+        assert result.n_failed == 2
+        assert result.n_completed == 2
+        npt.assert_array_equal(result.start_indices, [2, 3])
+
+    def test_all_starts_failing_raises(self, function_arguments, monkeypatch):
+        monkeypatch.setattr(
+            multistart,
+            "_solve_from_start",
+            lambda start, *args: (start, np.inf, False),
+        )
+
+        with pytest.raises(RuntimeError, match="3 starts failed"):
+            calc_values_multistart(
+                boundary_condition_type=BoundaryType.ZBC,
+                n_starts=3,
+                n_workers=1,
+                seed=0,
+                **function_arguments,
+            )
@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO.derivative_fit import BoundaryType
+from mms_nirs.BRUNO.screening import FrameScreen, RejectReason, ScreenResult
+from mms_nirs.BRUNO.synthetic import (
+    SyntheticRecording,
+    physiological_trajectory,
+)
+from mms_nirs.profiling import Profiler
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+@pytest.fixture
+def recording():
+    return SyntheticRecording(
+        np.array([20.0, 25.0, 30.0, 35.0]),
+        BoundaryType.ZBC,
+        intensity_noise=1e-3,
+        seed=0,
+    )
+
+
+@pytest.fixture
+def intensities(recording):
+    # `k`x`T`x`W`
+    parameters = physiological_trajectory(seed=0)(0, 8, 1.0)
+    return recording.intensities(parameters)
+
+
+@pytest.fixture
+def screen():
+    return FrameScreen(saturation=1e3, min_snr=100, max_jump=30)
+
+
+def test_clean_frames_pass(recording, intensities, screen):
+    slopes = recording.measured_slopes(intensities)
+    result = screen.screen(slopes, recording.wavelengths, intensities)
+
+    assert result.valid.all()
+    assert result.counts()["rejected"] == 0
+
+
+def test_rejects_each_reason(recording, intensities, screen):
+    rng = np.random.default_rng(0)
+    intensities[:, 1] = 0.0
+    intensities[0, 2, 150:160] = 1e3
+    intensities[:, 3] = 1e-3 * intensities[:, 3] + np.abs(
+        rng.normal(0, 0.02, intensities[:, 3].shape)
+    )
+    slopes = recording.measured_slopes(np.maximum(intensities, 1e-12))
+    slopes[4, 120] += 0.01
+
+    with Profiler() as profiler:
+        result = screen.screen(slopes, recording.wavelengths, intensities)
+
+    assert result.reasons[1] & RejectReason.INVALID
+    assert result.reasons[2] & RejectReason.SATURATED
+    assert result.reasons[3] == RejectReason.LOW_SNR
+    assert result.reasons[4] == RejectReason.DISCONTINUITY
+    npt.assert_array_equal(result.reasons[5:], 0)
+    assert profiler.counters["screen.rejected"] == 4
+    assert profiler.counters["screen.saturated"] == 1
+
+
+def test_flat_dark_frame_is_low_snr(recording, intensities):
+    slopes = recording.measured_slopes(intensities)
+    # Constant bias counts, no noise for the estimate to measure
+    intensities[:, 2] = 1.0
+    screen = FrameScreen(min_snr=100, min_intensity=5)
+
+    result = screen.screen(slopes, recording.wavelengths, intensities)
+
+    assert result.reasons[2] == RejectReason.LOW_SNR
+    npt.assert_array_equal(np.delete(result.reasons, 2), 0)
+
+
+def test_noise_free_spectra_pass():
+    recording = SyntheticRecording(np.array([20.0, 25.0, 30.0, 35.0]))
+    intensities = recording.intensities(
+        physiological_trajectory(seed=0)(0, 4, 1.0)
+    )
+    # A plateau below saturation as well, with no second differences
+    intensities[:, 1, 100:200] = 1e3
+    slopes = recording.measured_slopes(intensities)
+    screen = FrameScreen(saturation=1e4, min_snr=100, min_intensity=5)
+
+    result = screen.screen(slopes, recording.wavelengths, intensities)
+
+    assert result.valid.all()
+
+
+def test_only_fitting_window_is_checked():
+    wavelengths = np.genfromtxt(FIXTURE_DIR / "wavelengths.csv", delimiter=",")
+    slope = np.genfromtxt(FIXTURE_DIR / "slope.csv", delimiter=",")
+    slopes = np.vstack([slope] * 3)
+    # 704 nm lies beyond the smoothing of the 710 to 900 nm window, 708
+    # and 903 nm within it
+    slopes[0, 0] = np.nan
+    slopes[1, 4] = np.inf
+    slopes[2, 199] = np.nan
+
+    result = FrameScreen().screen(slopes, wavelengths)
+
+    npt.assert_array_equal(
+        result.reasons, [0, RejectReason.INVALID, RejectReason.INVALID]
+    )
+
+
+def test_counts():
+    result = ScreenResult(
+        np.array(
+            [0, RejectReason.INVALID | RejectReason.SATURATED, 8], np.uint8
+        )
+    )
+    assert result.counts() == {
+        "invalid": 1,
+        "saturated": 1,
+        "low_snr": 0,
+        "discontinuity": 1,
+        "rejected": 2,
+    }
+
+
+def test_mismatched_intensities(recording, intensities):
+    slopes = recording.measured_slopes(intensities)
+    with pytest.raises(ValueError):
+        FrameScreen().screen(slopes[:-1], recording.wavelengths, intensities)
@@ -0,0 +1,80 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import Boundaries, BoundaryType, calc_values
+from mms_nirs.BRUNO.synthetic import (
+    SyntheticRecording,
+    physiological_trajectory,
+)
+
+DISTANCES = [20.0, 25.0, 30.0, 35.0]
+
+
+@pytest.fixture
+def parameters():
+    return physiological_trajectory(seed=1)(0, 5, 10.0)
+
+
+def test_trajectory_is_independent_of_chunking():
+    trajectory = physiological_trajectory(seed=3)
+
+    whole = trajectory(0, 10, 10.0)
+    halves = [trajectory(0, 4, 10.0), trajectory(4, 10, 10.0)]
+
+    npt.assert_allclose(
+        np.vstack([half.coefficients for half in halves]), whole.coefficients
+    )
+    assert len(whole[2:5]) == 3
+
+
+@pytest.mark.parametrize("boundary", [BoundaryType.ZBC, BoundaryType.EBC])
+def test_noise_free_slopes_match_model(parameters, boundary):
+    recording = SyntheticRecording(DISTANCES, boundary)
+
+    intensities = recording.intensities(parameters)
+    measured = recording.measured_slopes(intensities)
+
+    assert intensities.shape == (4, 5, len(recording.wavelengths))
+    npt.assert_allclose(
+        measured, recording.model_slopes(parameters), rtol=0.05
+    )
+
+
+def test_resampled_wavelengths(parameters):
+    wavelengths = np.linspace(710, 900, 50)
+    recording = SyntheticRecording(DISTANCES, wavelengths=wavelengths)
+
+    assert recording.attenuation(parameters).shape == (4, 5, 50)
+    npt.assert_array_equal(recording.wavelengths, wavelengths)
+
+
+def test_stream_chunks_and_noise():
+    recording = SyntheticRecording(DISTANCES, intensity_noise=1e-3, seed=0)
+
+    chunks = list(recording.stream(25, chunk_size=10))
+
+    assert [chunk.start for chunk in chunks] == [0, 10, 20]
+    assert [len(chunk.time) for chunk in chunks] == [10, 10, 5]
+    noise_free = SyntheticRecording(DISTANCES).intensities(
+        chunks[0].parameters
+    )
+    relative = chunks[0].intensities / noise_free - 1
+    assert 5e-4 < relative.std() < 2e-3
+
+
+def test_bruno_recovers_ground_truth(parameters):
+    recording = SyntheticRecording(DISTANCES)
+    truth = parameters[:1]
+    slope = recording.model_slopes(truth)[0]
+
+    stO2, coefficients, *_ = calc_values(
+        slope,
+        recording.extinction,
+        recording.wavelengths,
+        Boundaries.boundaries,
+        BoundaryType.ZBC,
+        float(np.mean(DISTANCES)),
+    )
+
+    assert stO2 == pytest.approx(truth.stO2[0], abs=1)
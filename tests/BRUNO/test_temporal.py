@@ -0,0 +1,173 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import (
+    Boundaries,
+    BoundaryType,
+    BatchFitResult,
+    calc_values_batch,
+)
+from mms_nirs.BRUNO.synthetic import SyntheticRecording
+from mms_nirs.BRUNO.temporal import (
+    reduce_slopes,
+    reduction_factor,
+)
+
+
+@pytest.fixture
+def slopes():
+    return np.random.default_rng(0).normal(size=(23, 6))
+
+
+def test_reduction_factor():
+    assert reduction_factor(36000, 600) == 60
+    assert reduction_factor(100, 30) == 4
+    assert reduction_factor(10, 100) == 1
+    with pytest.raises(ValueError):
+        reduction_factor(10, 0)
+
+
+def test_block_means(slopes):
+    reduced = reduce_slopes(slopes, factor=5)
+    assert reduced.slopes.shape == (5, 6)
+    npt.assert_allclose(reduced.slopes[0], slopes[:5].mean(axis=0))
+    # Last, partial block averages its own frames
+    npt.assert_allclose(reduced.slopes[-1], slopes[20:].mean(axis=0))
+    npt.assert_allclose(reduced.time, [2, 7, 12, 17, 21])
+
+
+def test_block_means_skip_non_finite(slopes):
+    slopes[:5, 0] = np.nan
+    slopes[6, 1] = np.nan
+    reduced = reduce_slopes(slopes, factor=5)
+    assert np.isnan(reduced.slopes[0, 0])
+    npt.assert_allclose(reduced.slopes[1, 1], slopes[[5, 7, 8, 9], 1].mean())
+
+
+def test_ema_matches_recursion(slopes):
+    alpha = 0.3
+    reduced = reduce_slopes(slopes, factor=4, method="ema", alpha=alpha)
+    expected = slopes[0].copy()
+    averages = []
+    for frame in slopes:
+        expected = alpha * frame + (1 - alpha) * expected
+        averages.append(expected.copy())
+    npt.assert_allclose(reduced.slopes[:5], np.array(averages)[3::4])
+    npt.assert_allclose(reduced.slopes[-1], averages[-1])
+    npt.assert_allclose(reduced.time, [3, 7, 11, 15, 19, 22])
+
+
+def test_ema_skips_non_finite(slopes):
+    alpha = 0.3
+    slopes[3, 0] = np.nan
+    slopes[0, 1] = np.inf
+    reduced = reduce_slopes(slopes, factor=4, method="ema", alpha=alpha)
+    assert np.isfinite(reduced.slopes).all()
+
+    # Weights of the finite frames, renormalised
+    column = slopes[:8, 0]
+    weights = alpha * (1 - alpha) ** np.arange(7, -1, -1)
+    # The first frame also carries the starting average
+    weights[0] += (1 - alpha) ** 8
+    finite = np.isfinite(column)
+    npt.assert_allclose(
+        reduced.slopes[1, 0],
+        np.sum(weights[finite] * column[finite]) / np.sum(weights[finite]),
+    )
+    # Later frames are untouched by a NaN that has been averaged out
+    unaffected = reduce_slopes(
+        np.nan_to_num(slopes, nan=0.0, posinf=0.0)[:, 2:],
+        factor=4,
+        method="ema",
+        alpha=alpha,
+    )
+    npt.assert_allclose(reduced.slopes[:, 2:], unaffected.slopes)
+
+
+def test_decimate_keeps_middle_frames(slopes):
+    time = np.linspace(0, 2.2, 23)
+    reduced = reduce_slopes(slopes, n_fits=8, method="decimate", time=time)
+    assert reduced.factor == 3
+    # The last, partial block is frames 21 and 22
+    middle = [1, 4, 7, 10, 13, 16, 19, 21]
+    npt.assert_array_equal(reduced.slopes, slopes[middle])
+    npt.assert_allclose(reduced.time, time[middle])
+
+
+def test_invalid_arguments(slopes):
+    with pytest.raises(ValueError):
+        reduce_slopes(slopes)
+    with pytest.raises(ValueError):
+        reduce_slopes(slopes, factor=2, n_fits=3)
+    with pytest.raises(ValueError):
+        reduce_slopes(slopes, factor=2, method="median")
+    with pytest.raises(ValueError):
+        reduce_slopes(slopes, factor=2, time=np.arange(3))
+    for method in ("block", "ema", "decimate"):
+        with pytest.raises(ValueError, match="at least one frame"):
+            reduce_slopes(np.empty((0, 6)), factor=2, method=method)
+
+
+def test_expand_interpolates_to_original_frames(slopes):
+    reduced = reduce_slopes(slopes, factor=5)
+    values = np.column_stack([reduced.time, 2 * reduced.time])
+    expanded = reduced.expand(values)
+    assert expanded.shape == (23, 2)
+    # Linear in time, held beyond the first and last reduced slope
+    npt.assert_allclose(expanded[2:22, 0], np.arange(2, 22))
+    npt.assert_allclose(expanded[:2, 0], 2)
+    npt.assert_allclose(expanded[22], [21, 42])
+
+    held = reduced.expand(values[:, 0], kind="previous")
+    npt.assert_allclose(held[2:7], 2)
+    npt.assert_allclose(held[7], 7)
+
+
+def test_expand_skips_failed_rows(slopes):
+    reduced = reduce_slopes(slopes, factor=5)
+    values = reduced.time.copy()
+    values[1] = np.nan
+    npt.assert_allclose(reduced.expand(values)[2:13], np.arange(2, 13))
+    assert np.isnan(reduced.expand(np.full(5, np.nan))).all()
+    with pytest.raises(ValueError):
+        reduced.expand(values[:3])
+
+
+def test_fits_reduced_series_and_expands():
+    recording = SyntheticRecording(
+        [20.0, 25.0, 30.0, 35.0], intensity_noise=1e-4, seed=0
+    )
+    chunk = next(recording.stream(20, frame_rate=10.0))
+    reduced = reduce_slopes(chunk.slopes, n_fits=2, time=chunk.time)
+
+    fits = calc_values_batch(
+        reduced.slopes,
+        recording.extinction,
+        recording.wavelengths,
+        Boundaries.boundaries,
+        BoundaryType.ZBC,
+        27.5,
+        backend="numba",
+        time=reduced.time,
+    )
+    expanded = reduced.expand_fits(fits)
+
+    assert isinstance(expanded, BatchFitResult) and len(expanded) == 20
+    npt.assert_allclose(expanded.time, chunk.time)
+    npt.assert_allclose(expanded.stO2[:5], fits.stO2[0])
+    npt.assert_allclose(expanded.stO2, chunk.parameters.stO2, atol=1.0)
+
+
+def test_expanded_stO2_matches_expanded_haemoglobin(slopes):
+    reduced = reduce_slopes(slopes[:20], factor=10)
+    fits = BatchFitResult(2)
+    # stO2, water_frac, HHb, HbO2, a, b, sum_residual, score
+    fits.fits[0] = (75.0, 1.0, 10.0, 30.0, 1.0, 3.0, 0.0, 0.0)
+    fits.fits[1] = (50.0, 1.0, 10.0, 10.0, 1.0, 3.0, 0.0, 0.0)
+
+    expanded = reduced.expand_fits(fits)
+
+    hhb, hbo2 = expanded.coefficients[:, 1], expanded.coefficients[:, 2]
+    npt.assert_allclose(expanded.stO2, hbo2 / (hhb + hbo2) * 100)
+    npt.assert_allclose(expanded.stO2[[0, -1]], [75.0, 50.0])
@@ -1,3 +1,4 @@
+import tracemalloc
 from pathlib import Path
 
 import numpy as np
@@ -78,3 +79,284 @@ def test_calculate_concentrations(
     npt.assert_almost_equal(
         conc, true_conc, err_msg="Concentration doesn't match expected value"
     )
+
+
+def test_time_varying_dpf(
+    ucln_constants, spectra, spectra_wavelengths, true_conc
+) -> None:
+    ucln = UCLN(ucln_constants)
+    n_spectra = spectra.shape[0]
+    constant = np.full(n_spectra, ucln_constants.dpf)
+
+    npt.assert_almost_equal(
+        ucln.calc_concentrations(spectra, spectra_wavelengths, constant),
+        true_conc,
+    )
+
+    # A DPF spectrum including the wavelength dependency is equivalent
+    spectrum = np.outer(constant, ucln_constants.wavelength_dependency)
+    npt.assert_almost_equal(
+        ucln.calc_concentrations(spectra, spectra_wavelengths, spectrum),
+        true_conc,
+    )
+
+    # Concentrations scale inversely with each frame's DPF
+    scale = np.linspace(0.5, 2, n_spectra)
+    npt.assert_almost_equal(
+        ucln.calc_concentrations(
+            spectra, spectra_wavelengths, constant * scale
+        ),
+        true_conc / scale[:, np.newaxis],
+    )
+
+
+@pytest.mark.parametrize("shape", [(2,), (2, 121), (121, 3)])
+def test_dpf_shape_mismatch(
+    ucln_constants, spectra, spectra_wavelengths, shape
+) -> None:
+    with pytest.raises(ValueError):
+        UCLN(ucln_constants).calc_concentrations(
+            spectra[:3], spectra_wavelengths, np.ones(shape)
+        )
+
+
+def test_multichannel_matches_single_channel(
+    ucln_constants, spectra, spectra_wavelengths
+) -> None:
+    ucln = UCLN(ucln_constants)
+    drift = np.linspace(1, 0.8, spectra.shape[0])[:, np.newaxis]
+    channels = np.stack([spectra, spectra * drift])
+    optode_dist = np.array([3.0, 4.0])
+    dpf = np.array([4.99, 6.26])
+
+    actual = ucln.calc_concentrations_multichannel(
+        channels, spectra_wavelengths, optode_dist, dpf
+    )
+
+    assert actual.shape == (2, spectra.shape[0], 3)
+    for channel, conc, d, channel_dpf in zip(
+        channels, actual, optode_dist, dpf
+    ):
+        ucln_constants.optode_dist = d
+        expected = ucln.calc_concentrations(
+            channel, spectra_wavelengths, np.full(len(channel), channel_dpf)
+        )
+        npt.assert_allclose(conc, expected, atol=1e-10)
+
+
+def test_multichannel_defaults_and_per_frame_dpf(
+    ucln_constants, spectra, spectra_wavelengths, true_conc
+) -> None:
+    ucln = UCLN(ucln_constants)
+    channels = np.stack([spectra] * 3)
+
+    npt.assert_almost_equal(
+        ucln.calc_concentrations_multichannel(channels, spectra_wavelengths),
+        np.stack([true_conc] * 3),
+    )
+
+    scale = np.linspace(0.5, 2, spectra.shape[0])
+    dpf = np.tile(ucln_constants.dpf * scale, (3, 1))
+    npt.assert_almost_equal(
+        ucln.calc_concentrations_multichannel(
+            channels, spectra_wavelengths, dpf=dpf
+        ),
+        np.stack([true_conc / scale[:, np.newaxis]] * 3),
+    )
+
+
+@pytest.mark.parametrize(
+    "layout,contiguous_axes",
+    [("channel", (1, 2)), ("time", (0, 2)), ("species", (0, 1))],
+)
+def test_multichannel_layout(
+    ucln_constants, spectra, spectra_wavelengths, layout, contiguous_axes
+) -> None:
+    ucln = UCLN(ucln_constants)
+    channels = np.stack([spectra] * 2)
+    expected = ucln.calc_concentrations_multichannel(
+        channels, spectra_wavelengths
+    )
+
+    actual = ucln.calc_concentrations_multichannel(
+        channels, spectra_wavelengths, layout=layout
+    )
+
+    npt.assert_allclose(actual, expected, rtol=1e-12, atol=1e-20)
+    # The two inner axes of the layout form one contiguous block
+    outer = ({0, 1, 2} - set(contiguous_axes)).pop()
+    assert actual.strides[outer] == max(actual.strides)
+    assert actual.strides[outer] == actual.itemsize * np.prod(
+        [actual.shape[axis] for axis in contiguous_axes]
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"optode_dist": np.ones(3)},
+        {"dpf": np.ones(3)},
+        {"dpf": np.ones((2, 3))},
+        {"layout": "row"},
+    ],
+)
+def test_multichannel_mismatch(
+    ucln_constants, spectra, spectra_wavelengths, kwargs
+) -> None:
+    with pytest.raises(ValueError):
+        UCLN(ucln_constants).calc_concentrations_multichannel(
+            np.stack([spectra] * 2), spectra_wavelengths, **kwargs
+        )
+
+
+def test_multichannel_needs_3d_spectra(
+    ucln_constants, spectra, spectra_wavelengths
+) -> None:
+    with pytest.raises(ValueError):
+        UCLN(ucln_constants).calc_concentrations_multichannel(
+            spectra, spectra_wavelengths
+        )
+
+
+def test_multichannel_outside_spectra_range(
+    ucln_constants, spectra, spectra_wavelengths
+) -> None:
+    inside = (spectra_wavelengths >= 790) & (spectra_wavelengths <= 890)
+    with pytest.raises(ValueError, match="outside the spectra's range"):
+        UCLN(ucln_constants).calc_concentrations_multichannel(
+            np.stack([spectra[:, inside]] * 2), spectra_wavelengths[inside]
+        )
+
+
+def test_factorisation_is_cached_per_species(ucln_constants) -> None:
+    full = ucln_constants.factorisation()
+
+    assert ucln_constants.factorisation() is full
+    npt.assert_allclose(
+        full.pinv, np.linalg.pinv(ucln_constants.extinction_coefficients)
+    )
+    haemoglobin = ucln_constants.factorisation([0, 1])
+    assert haemoglobin is not full
+    assert ucln_constants.factorisation((0, 1)) is haemoglobin
+    npt.assert_allclose(
+        haemoglobin.pinv,
+        np.linalg.pinv(ucln_constants.extinction_coefficients[:, :2]),
+    )
+
+
+@pytest.mark.parametrize("species", [None, [0, 1]])
+def test_residual_norms(
+    ucln_constants, spectra, spectra_wavelengths, species
+) -> None:
+    ucln = UCLN(ucln_constants)
+
+    conc, residuals = ucln.calc_concentrations(
+        spectra, spectra_wavelengths, species=species, return_residuals=True
+    )
+
+    extinction = ucln_constants.extinction_coefficients
+    if species is not None:
+        extinction = extinction[:, species]
+    attenuation = ucln.attenuation_interp_wavelength_dependency
+    fitted = conc @ extinction.T * ucln_constants.optode_dist
+    fitted *= ucln_constants.dpf
+    expected = np.linalg.norm(attenuation - fitted, axis=1)
+    assert conc.shape == (spectra.shape[0], extinction.shape[1])
+    npt.assert_allclose(residuals, expected, rtol=1e-6, atol=1e-12)
+    assert residuals[1:].min() > 0
+
+
+def test_float32_matches_float64(
+    ucln_constants, spectra, spectra_wavelengths
+) -> None:
+    ucln = UCLN(ucln_constants)
+    # The fixture spectra are 16-bit spectrometer counts
+    counts = spectra.astype(np.uint16)
+    expected, expected_residuals = ucln.calc_concentrations(
+        counts, spectra_wavelengths, return_residuals=True
+    )
+
+    actual, residuals = ucln.calc_concentrations(
+        counts, spectra_wavelengths, return_residuals=True, dtype=np.float32
+    )
+
+    assert actual.dtype == np.float32
+    assert ucln.attenuation_interp_wavelength_dependency.dtype == np.float32
+    npt.assert_allclose(actual, expected, atol=1e-5 * np.abs(expected).max())
+    npt.assert_allclose(
+        residuals, expected_residuals, atol=1e-4 * expected_residuals.max()
+    )
+
+    multichannel = ucln.calc_concentrations_multichannel(
+        counts[np.newaxis], spectra_wavelengths, dtype=np.float32
+    )
+    assert multichannel.dtype == np.float32
+    npt.assert_allclose(
+        multichannel[0], expected, atol=1e-5 * np.abs(expected).max()
+    )
+
+
+def test_float32_residuals_of_near_exact_fit(ucln_constants) -> None:
+    # Spectra on the fitting wavelengths whose residual is 1e-4 of the
+    # attenuation, where |x|^2 - |U^T x|^2 cancels in float32
+    wavelengths = ucln_constants.interp_wavelengths
+    rng = np.random.default_rng(0)
+    conc = rng.normal(
+        0, 0.02, (20, ucln_constants.extinction_coefficients.shape[1])
+    )
+    attenuation = (
+        conc
+        @ ucln_constants.extinction_coefficients.T
+        * ucln_constants.optode_dist
+        * ucln_constants.dpf
+        * ucln_constants.wavelength_dependency
+    )
+    attenuation += (
+        rng.normal(0, 1e-4 * np.abs(attenuation).max(), attenuation.shape)
+        * ucln_constants.wavelength_dependency
+    )
+    spectra = 1e4 * 10 ** -np.vstack([np.zeros(len(wavelengths)), attenuation])
+    ucln = UCLN(ucln_constants)
+
+    _, expected = ucln.calc_concentrations(
+        spectra, wavelengths, return_residuals=True
+    )
+    _, residuals = ucln.calc_concentrations(
+        spectra, wavelengths, return_residuals=True, dtype=np.float32
+    )
+
+    assert expected[1:].min() > 0
+    npt.assert_allclose(residuals[1:], expected[1:], rtol=1e-3)
+
+
+def test_chunked_interpolation(
+    ucln_constants, spectra, spectra_wavelengths, true_conc
+) -> None:
+    conc = UCLN(ucln_constants, chunk_size=7).calc_concentrations(
+        spectra, spectra_wavelengths
+    )
+
+    npt.assert_almost_equal(conc, true_conc)
+
+
+@pytest.mark.parametrize("layout", ["channel", "time", "species"])
+def test_chunked_multichannel(
+    ucln_constants, spectra, spectra_wavelengths, layout
+) -> None:
+    channels = np.stack([spectra, spectra * 2])
+    expected = UCLN(ucln_constants).calc_concentrations_multichannel(
+        channels, spectra_wavelengths, layout=layout
+    )
+
+    ucln = UCLN(ucln_constants, chunk_size=7)
+    ucln.calc_concentrations_multichannel(channels, spectra_wavelengths)
+    tracemalloc.start()
+    conc = ucln.calc_concentrations_multichannel(
+        channels, spectra_wavelengths, layout=layout
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    npt.assert_allclose(conc, expected, rtol=1e-12)
+    # Well below the 2 x 499 x 1024 attenuation of every frame at once
+    assert peak < channels.nbytes / 4
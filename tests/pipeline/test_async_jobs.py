@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.pipeline import AsyncFitter
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+
+UCLN_DIR = Path(__file__).parent.parent / "UCLN" / "test_data"
+
+
+@pytest.fixture
+def ucln_constants() -> UCLNConstants:
+    defaults = DefaultValues()
+    return UCLNConstants(
+        extinction_coefficients=defaults.extinction_coefficients,
+        wavelength_dependency_of_pathlength=defaults.wavelength_dependency,
+        optode_dist=3,
+        dpf_type="baby_head",
+        wavelengths=(780.0, 900.0),
+    )
+
+
+def blocking_fitter(release: threading.Event, max_pending: int):
+    # One worker occupied by a job that waits for `release`
+    fitter = AsyncFitter(
+        max_workers=1,
+        max_pending=max_pending,
+        executor=ThreadPoolExecutor(1),
+    )
+    return fitter, release.wait
+
+
+class TestAsyncFitter:
+    def test_ucln_result_matches_sync(self, ucln_constants):
+        spectra = np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")
+        wavelengths = np.genfromtxt(
+            UCLN_DIR / "wavelengths.csv", delimiter=","
+        )
+
+        async def run():
+            async with AsyncFitter(executor=ThreadPoolExecutor(1)) as fitter:
+                future = await fitter.submit_ucln(
+                    ucln_constants, spectra[:10], wavelengths
+                )
+                return await future
+
+        expected = UCLN(ucln_constants).calc_concentrations(
+            spectra[:10], wavelengths
+        )
+        npt.assert_allclose(asyncio.run(run()), expected)
+
+    def test_newer_job_supersedes_waiting_job(self):
+        release = threading.Event()
+
+        async def run():
+            fitter, block = blocking_fitter(release, max_pending=4)
+            async with fitter:
+                running = await fitter.submit(block)
+                await asyncio.sleep(0.01)
+                stale = await fitter.submit(abs, -1, key="channel")
+                fresh = await fitter.submit(abs, -2, key="channel")
+                release.set()
+                await running
+                assert stale.cancelled()
+                assert fitter.superseded == 1
+                return await fresh
+
+        assert asyncio.run(run()) == 2
+
+    def test_full_queue_applies_backpressure(self):
+        release = threading.Event()
+
+        async def run():
+            fitter, block = blocking_fitter(release, max_pending=1)
+            async with fitter:
+                await fitter.submit(block)
+                await asyncio.sleep(0.01)
+                await fitter.submit(abs, -1)
+                with pytest.raises(asyncio.TimeoutError):
+                    await asyncio.wait_for(fitter.submit(abs, -2), 0.05)
+                release.set()
+
+        asyncio.run(run())
+
+    def test_exceptions_are_propagated(self):
+        async def run():
+            async with AsyncFitter(executor=ThreadPoolExecutor(1)) as fitter:
+                future = await fitter.submit(int, "not a number")
+                with pytest.raises(ValueError):
+                    await future
+
+        asyncio.run(run())
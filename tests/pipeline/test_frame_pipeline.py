@@ -0,0 +1,171 @@
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import BoundaryType, FrameScreen, RejectReason, calc_values
+from mms_nirs.pipeline import FramePipeline, FrameRingBuffer
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+
+ROOT_DIR = Path(__file__).parent.parent
+UCLN_DIR = ROOT_DIR / "UCLN" / "test_data"
+BRUNO_DIR = ROOT_DIR / "BRUNO" / "fixtures"
+
+
+@pytest.fixture
+def ucln_constants() -> UCLNConstants:
+    defaults = DefaultValues()
+    return UCLNConstants(
+        extinction_coefficients=defaults.extinction_coefficients,
+        wavelength_dependency_of_pathlength=defaults.wavelength_dependency,
+        optode_dist=3,
+        dpf_type="baby_head",
+        wavelengths=(780.0, 900.0),
+    )
+
+
+@pytest.fixture
+def extinction():
+    return np.genfromtxt(BRUNO_DIR / "extinctions.csv", delimiter=",")
+
+
+@pytest.fixture
+def attenuations():
+    # W x k, columns ordered from furthest to nearest 5mm apart
+    return np.genfromtxt(BRUNO_DIR / "attenuations.csv", delimiter=",").T
+
+
+class TestFrameRingBuffer:
+    def test_pops_oldest_first(self):
+        buffer = FrameRingBuffer(3, (2,))
+        for i in range(3):
+            buffer.push(np.full(2, i))
+
+        npt.assert_array_equal(buffer.pop(), [0, 0])
+        assert len(buffer) == 2
+
+    def test_overwrites_oldest_when_full(self):
+        buffer = FrameRingBuffer(2, (1,))
+        for i in range(3):
+            buffer.push(np.array([i]))
+
+        assert buffer.dropped == 1
+        npt.assert_array_equal(buffer.pop(), [1])
+        npt.assert_array_equal(buffer.pop(), [2])
+        assert buffer.pop() is None
+
+
+class TestFramePipeline:
+    def test_ucln_matches_calc_concentrations(self, ucln_constants):
+        spectra = np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")
+        wavelengths = np.genfromtxt(
+            UCLN_DIR / "wavelengths.csv", delimiter=","
+        )
+        expected = UCLN(ucln_constants).calc_concentrations(
+            spectra[:20], wavelengths
+        )
+
+        pipeline = FramePipeline(
+            wavelengths,
+            reference_spectra=spectra[:1],
+            distances=np.array([3.0]),
+            ucln_constants=ucln_constants,
+        )
+        actual = np.array(
+            [
+                pipeline.process(frame[np.newaxis]).concentrations
+                for frame in spectra[:20]
+            ]
+        )
+
+        npt.assert_allclose(actual, expected, atol=1e-12)
+
+    def test_bruno_matches_calc_values(self, extinction, attenuations):
+        distances = np.array([35.0, 30.0, 25.0, 20.0])
+        reference = np.ones_like(attenuations)
+        frame = 10 ** (-attenuations)
+
+        pipeline = FramePipeline(
+            extinction[:, 0],
+            reference_spectra=reference,
+            distances=distances,
+            extinction=extinction,
+            bruno_distance=22.5,
+        )
+        result = pipeline.process(frame)
+
+        slope = np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=",")
+        expected_stO2, *_ = calc_values(
+            slope,
+            extinction,
+            extinction[:, 0],
+            pipeline.boundaries,
+            BoundaryType.ZBC,
+            22.5,
+        )
+        npt.assert_approx_equal(result.stO2, expected_stO2, significant=5)
+
+    def test_latency_percentiles(self, extinction, attenuations):
+        pipeline = FramePipeline(
+            extinction[:, 0],
+            reference_spectra=np.ones_like(attenuations),
+            distances=np.array([35.0, 30.0, 25.0, 20.0]),
+            extinction=extinction,
+        )
+        buffer = FrameRingBuffer(4, attenuations.shape)
+        for _ in range(3):
+            buffer.push(10 ** (-attenuations))
+
+        results = pipeline.process_buffer(buffer)
+        percentiles = pipeline.latency_percentiles((50, 99))
+
+        assert len(results) == 3
+        assert set(percentiles) == {"attenuation", "slope", "bruno", "total"}
+        assert percentiles["total"][99] >= percentiles["bruno"][50] > 0
+
+    def test_screen_skips_saturated_frames(self, extinction, attenuations):
+        pipeline = FramePipeline(
+            extinction[:, 0],
+            reference_spectra=np.ones_like(attenuations),
+            distances=np.array([35.0, 30.0, 25.0, 20.0]),
+            extinction=extinction,
+            screen=FrameScreen(saturation=0.95),
+        )
+        frame = 10 ** (-attenuations)
+
+        fitted = pipeline.process(frame)
+        frame[0, 100] = 1.0
+        rejected = pipeline.process(frame)
+
+        assert fitted.rejected == 0 and fitted.stO2 is not None
+        assert rejected.rejected == RejectReason.SATURATED
+        assert rejected.stO2 is None
+
+    def test_distance_mismatch(self, extinction):
+        with pytest.raises(ValueError):
+            FramePipeline(
+                extinction[:, 0],
+                reference_spectra=np.ones((2, extinction.shape[0])),
+                distances=np.array([1.0, 2.0, 3.0]),
+            )
+
+    def test_ucln_outside_spectra_range(self, ucln_constants):
+        wavelengths = np.linspace(790.0, 890.0, 101)
+        with pytest.raises(ValueError, match="outside the spectra's range"):
+            FramePipeline(
+                wavelengths,
+                reference_spectra=np.ones((1, wavelengths.size)),
+                distances=np.array([3.0]),
+                ucln_constants=ucln_constants,
+            )
+
+    def test_bruno_outside_spectra_range(self, extinction):
+        wavelengths = extinction[5:-5, 0]
+        with pytest.raises(ValueError, match="outside the spectra's range"):
+            FramePipeline(
+                wavelengths,
+                reference_spectra=np.ones((2, wavelengths.size)),
+                distances=np.array([1.0, 2.0]),
+                extinction=extinction,
+            )
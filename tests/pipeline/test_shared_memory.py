@@ -0,0 +1,105 @@
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from mms_nirs.BRUNO import Boundaries, BoundaryType, calc_values_batch
+from mms_nirs.pipeline import (
+    SharedArrays,
+    calc_concentrations_shared,
+    calc_values_shared,
+)
+from mms_nirs.pipeline.shared_memory import _ucln_rows
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+
+TEST_DIR = Path(__file__).parent.parent
+UCLN_DIR = TEST_DIR / "UCLN" / "test_data"
+BRUNO_DIR = TEST_DIR / "BRUNO" / "fixtures"
+
+
+def test_shared_arrays_round_trip():
+    data = np.arange(12.0).reshape(3, 4)
+    with SharedArrays() as arrays:
+        handle, view = arrays.copy_from(data)
+        block, attached = handle.attach()
+        attached[1] = -1
+        npt.assert_array_equal(view[1], -1)
+        del attached
+        block.close()
+
+
+def test_shared_arrays_unlinked_on_error():
+    with pytest.raises(KeyboardInterrupt):
+        with SharedArrays() as arrays:
+            arrays.create((4, 4), np.float64, fill=0)
+            names = arrays.names
+            raise KeyboardInterrupt
+
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            SharedMemory(name=name)
+
+
+def test_calc_concentrations_shared():
+    spectra = np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")
+    wavelengths = np.genfromtxt(UCLN_DIR / "wavelengths.csv", delimiter=",")
+    spectra = spectra[:20]
+    defaults = DefaultValues()
+    constants = UCLNConstants(
+        defaults.extinction_coefficients,
+        defaults.wavelength_dependency,
+        3,
+        "baby_head",
+        (780, 900),
+    )
+
+    concentrations = calc_concentrations_shared(
+        constants, spectra, wavelengths, workers=2, chunk_size=6
+    )
+
+    expected = UCLN(constants).calc_concentrations(spectra, wavelengths)
+    npt.assert_allclose(concentrations, expected, rtol=1e-10)
+
+
+def test_worker_error_not_masked_on_close():
+    spectra = np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")
+    wavelengths = np.genfromtxt(UCLN_DIR / "wavelengths.csv", delimiter=",")
+    defaults = DefaultValues()
+    # Outside the spectra's wavelengths, so calc_concentrations raises
+    constants = UCLNConstants(
+        defaults.extinction_coefficients,
+        defaults.wavelength_dependency,
+        3,
+        "baby_head",
+        (500, 900),
+    )
+
+    with SharedArrays() as arrays:
+        spectra_handle, _ = arrays.copy_from(spectra[:6])
+        out_handle, _ = arrays.create((6, 3), np.float64)
+        with pytest.raises(ValueError, match="outside the spectra's range"):
+            _ucln_rows(
+                spectra_handle, out_handle, (0, 6), constants, wavelengths
+            )
+
+
+def test_calc_values_shared():
+    slope = np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=",")
+    slopes = np.vstack([slope, slope * 1.05, slope * 0.95])
+    args = (
+        np.genfromtxt(BRUNO_DIR / "extinctions.csv", delimiter=","),
+        np.genfromtxt(BRUNO_DIR / "wavelengths.csv", delimiter=","),
+        Boundaries.boundaries,
+        BoundaryType.ZBC,
+        22.5,
+    )
+
+    results = calc_values_shared(
+        slopes, *args, keep_residuals=True, workers=2, chunk_size=1
+    )
+
+    expected = calc_values_batch(slopes, *args, keep_residuals=True)
+    npt.assert_allclose(results.fits.tolist(), expected.fits.tolist())
+    npt.assert_allclose(results.residual, expected.residual)
@@ -0,0 +1,107 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mms_nirs.pipeline import (
+    AdaptiveBudget,
+    FramePipeline,
+    FrameRingBuffer,
+    StreamingFitter,
+)
+
+BRUNO_DIR = Path(__file__).parent.parent / "BRUNO" / "fixtures"
+
+
+@pytest.fixture
+def extinction():
+    return np.genfromtxt(BRUNO_DIR / "extinctions.csv", delimiter=",")
+
+
+@pytest.fixture
+def attenuations():
+    return np.genfromtxt(BRUNO_DIR / "attenuations.csv", delimiter=",").T
+
+
+@pytest.fixture
+def pipeline(extinction, attenuations):
+    return FramePipeline(
+        extinction[:, 0],
+        reference_spectra=np.ones_like(attenuations),
+        distances=np.array([35.0, 30.0, 25.0, 20.0]),
+        extinction=extinction,
+    )
+
+
+class TestAdaptiveBudget:
+    def test_unbudgeted_until_interval_known(self):
+        budget = AdaptiveBudget()
+        assert budget.budget() is None
+        budget.observe_frame(1.0)
+        assert budget.budget() is None
+        budget.observe_frame(1.1)
+        assert budget.seconds() == pytest.approx(0.08)
+
+    def test_follows_frame_interval(self):
+        budget = AdaptiveBudget(utilisation=1.0, smoothing=0.5, interval=0.1)
+        budget.observe_frame(0.0)
+        budget.observe_frame(0.3)
+        assert budget.interval == pytest.approx(0.2)
+
+    def test_overhead_and_backlog_share_the_interval(self):
+        budget = AdaptiveBudget(
+            utilisation=1.0, interval=0.1, min_seconds=1e-3
+        )
+        budget.observe_overhead(0.02)
+        assert budget.seconds() == pytest.approx(0.08)
+        assert budget.seconds(backlog=3) == pytest.approx(0.02)
+        assert budget.seconds(backlog=1000) == 1e-3
+        assert budget.budget().max_seconds == pytest.approx(0.08)
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            AdaptiveBudget(utilisation=0)
+        with pytest.raises(ValueError):
+            AdaptiveBudget(smoothing=1.5)
+
+
+class TestStreamingFitter:
+    def test_counts_exhausted_frames(self, pipeline, attenuations):
+        frame = 10 ** (-attenuations)
+        # Warm up outside the budget
+        pipeline.process(frame)
+
+        fitter = StreamingFitter(
+            pipeline, AdaptiveBudget(interval=1e-9, min_seconds=0.0)
+        )
+        results = list(fitter.run((None, frame) for _ in range(3)))
+
+        assert fitter.n_frames == 3
+        assert fitter.exhausted == 3
+        assert all(result.budget_exhausted for result in results)
+        assert all(np.isfinite(result.stO2) for result in results)
+        assert fitter.budget.overhead > 0
+
+    def test_generous_budget_converges(self, pipeline, attenuations):
+        frame = 10 ** (-attenuations)
+        expected = pipeline.process(frame).stO2
+
+        fitter = StreamingFitter(pipeline, AdaptiveBudget(interval=60.0))
+        result = fitter.process(frame, timestamp=0.0)
+
+        assert not result.budget_exhausted
+        assert fitter.exhausted == 0
+        assert result.stO2 == pytest.approx(expected)
+        assert pipeline.latencies.last("bruno") > 0
+
+    def test_drain_empties_buffer(self, pipeline, attenuations):
+        buffer = FrameRingBuffer(4, attenuations.shape)
+        for _ in range(3):
+            buffer.push(10 ** (-attenuations))
+
+        fitter = StreamingFitter(pipeline, AdaptiveBudget(interval=60.0))
+        results = list(fitter.drain(buffer))
+
+        assert len(results) == 3
+        assert len(buffer) == 0
+        assert fitter.n_frames == 3
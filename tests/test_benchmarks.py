@@ -0,0 +1,80 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.accuracy import format_table, run_accuracy
+from benchmarks.suite import compare_results, run_benchmarks
+from benchmarks.workloads import WORKLOADS, Workload, intensity_spectra
+
+
+def test_workload_shapes():
+    workload = Workload(T=7, W=50, k=3, channels=2, n_fits=1)
+
+    assert intensity_spectra(workload).shape == (2, 7, 50)
+
+
+def test_run_benchmarks_records_timings_and_memory():
+    results = run_benchmarks(
+        [WORKLOADS["smoke"]],
+        ["UCLN.calc_concentrations", "derivative_fit"],
+        repeat=2,
+    )
+
+    assert len(results["results"]) == 2
+    for result in results["results"].values():
+        assert len(result["times_s"]) == 2
+        assert 0 < result["min_s"] <= result["median_s"]
+        assert result["peak_bytes"] >= 0
+
+
+def test_compare_flags_slowdowns():
+    def results(seconds):
+        return {"results": {"a": {"min_s": seconds}, "b": {"min_s": 1.0}}}
+
+    comparisons = compare_results(results(1.0), results(1.5), threshold=0.2)
+
+    assert [c.key for c in comparisons if c.regressed] == ["a"]
+
+
+def test_cli_run_and_compare(tmp_path, capsys):
+    output = tmp_path / "results.json"
+    args = ["run", "--workload", "smoke", "--benchmark", "derivative_fit"]
+    assert main([*args, "--repeat", "1", "-o", str(output)]) == 0
+
+    slower = json.loads(output.read_text())
+    for result in slower["results"].values():
+        result["min_s"] *= 2
+    (tmp_path / "slower.json").write_text(json.dumps(slower))
+
+    assert main(["compare", str(output), str(output)]) == 0
+    assert main(["compare", str(output), str(tmp_path / "slower.json")]) == 1
+    assert "SLOWER" in capsys.readouterr().out
+
+
+def test_accuracy_against_matlab_and_synthetic(capsys):
+    rows = run_accuracy(["calc_values[numpy]"], n_synthetic=2)
+    assert [row["dataset"] for row in rows] == [
+        "matlab",
+        "synthetic-ZBC",
+        "synthetic-EBC",
+    ]
+    matlab = rows[0]
+    assert matlab["fits"] == 4 and matlab["failures"] == 0
+    assert matlab["stO2_err_max"] < 1e-3
+    assert matlab["coef_rel_err_max"] < 1e-3
+    assert all(row["fits_per_s"] > 0 for row in rows)
+    assert all(row["evals_per_fit"] > 1 for row in rows)
+
+    table = format_table(rows)
+    assert len(table.splitlines()) == 4
+    assert "evals_per_fit" in table
+
+
+def test_accuracy_reports_differences_to_reference():
+    rows = run_accuracy(
+        ["calc_values[numpy]"], n_synthetic=1, reference="calc_values[numpy]"
+    )
+    assert all(row["stO2_diff_max"] == 0 for row in rows)
+    assert (
+        "stO2_diff_max"
+        not in run_accuracy(["calc_values[numpy]"], n_synthetic=1)[0]
+    )
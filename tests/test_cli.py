@@ -0,0 +1,196 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as npt
+import pyarrow.parquet as pq
+import pytest
+
+from mms_nirs.BRUNO import Boundaries, BoundaryType, calc_values
+from mms_nirs.cli import main, read_chunks
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+
+TEST_DIR = Path(__file__).parent
+UCLN_DIR = TEST_DIR / "UCLN" / "test_data"
+BRUNO_DIR = TEST_DIR / "BRUNO" / "fixtures"
+
+
+@pytest.fixture
+def spectra():
+    return np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")[:25]
+
+
+def test_read_chunks_csv_and_npy(tmp_path, spectra):
+    np.savetxt(tmp_path / "spectra.csv", spectra, delimiter=",")
+    np.save(tmp_path / "spectra.npy", spectra)
+
+    for name in ("spectra.csv", "spectra.npy"):
+        chunks = list(read_chunks(tmp_path / name, 10))
+        assert [chunk.shape[0] for chunk in chunks] == [10, 10, 5]
+        npt.assert_allclose(np.vstack(chunks), spectra)
+
+
+@pytest.mark.parametrize("name", ["spectra.csv", "spectra.npy"])
+def test_ucln_empty_spectra(tmp_path, spectra, name):
+    (tmp_path / "spectra.csv").touch()
+    np.save(tmp_path / "spectra.npy", spectra[:0])
+
+    assert list(read_chunks(tmp_path / name, 10)) == []
+    with pytest.raises(SystemExit, match="No spectra in"):
+        main(
+            [
+                "ucln",
+                str(tmp_path / name),
+                "--wavelengths",
+                str(UCLN_DIR / "wavelengths.csv"),
+                "--output",
+                str(tmp_path / "conc.parquet"),
+            ]
+        )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ucln_matches_single_batch(tmp_path, spectra, workers, capsys):
+    np.save(tmp_path / "spectra.npy", spectra)
+    output = tmp_path / "conc.parquet"
+
+    main(
+        [
+            "ucln",
+            str(tmp_path / "spectra.npy"),
+            "--wavelengths",
+            str(UCLN_DIR / "wavelengths.csv"),
+            "--output",
+            str(output),
+            "--dpf-type",
+            "baby_head",
+            "--chunk-size",
+            "7",
+            "--workers",
+            str(workers),
+        ]
+    )
+
+    defaults = DefaultValues()
+    expected = UCLN(
+        UCLNConstants(
+            defaults.extinction_coefficients,
+            defaults.wavelength_dependency,
+            3,
+            "baby_head",
+            (780.0, 900.0),
+        )
+    ).calc_concentrations(
+        spectra,
+        np.genfromtxt(UCLN_DIR / "wavelengths.csv", delimiter=","),
+    )
+    table = pq.read_table(output)
+    npt.assert_array_equal(table["frame"], np.arange(25))
+    npt.assert_allclose(
+        np.column_stack([table[name] for name in ["HbO2", "HHb", "CCO"]]),
+        expected,
+    )
+    assert "spectra/s" in capsys.readouterr().out
+
+
+def test_bruno(tmp_path):
+    slope = np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=",")
+    np.savetxt(tmp_path / "slopes.csv", [slope, slope], delimiter=",")
+    output = tmp_path / "fits.parquet"
+
+    main(
+        [
+            "bruno",
+            str(tmp_path / "slopes.csv"),
+            "--wavelengths",
+            str(BRUNO_DIR / "wavelengths.csv"),
+            "--extinction",
+            str(BRUNO_DIR / "extinctions.csv"),
+            "--distance",
+            "22.5",
+            "--output",
+            str(output),
+        ]
+    )
+
+    expected_stO2, *_ = calc_values(
+        slope,
+        np.genfromtxt(BRUNO_DIR / "extinctions.csv", delimiter=","),
+        np.genfromtxt(BRUNO_DIR / "wavelengths.csv", delimiter=","),
+        Boundaries.boundaries,
+        BoundaryType.ZBC,
+        22.5,
+    )
+    table = pq.read_table(output)
+    assert {"frame", "stO2", "water_frac", "score"} <= set(table.column_names)
+    npt.assert_allclose(table["stO2"], [expected_stO2] * 2)
+
+
+def test_bruno_frames_per_fit(tmp_path):
+    slope = np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=",")
+    np.savetxt(tmp_path / "slopes.csv", [slope] * 6, delimiter=",")
+    output = tmp_path / "fits.parquet"
+
+    main(
+        [
+            "bruno",
+            str(tmp_path / "slopes.csv"),
+            "--wavelengths",
+            str(BRUNO_DIR / "wavelengths.csv"),
+            "--extinction",
+            str(BRUNO_DIR / "extinctions.csv"),
+            "--distance",
+            "22.5",
+            "--output",
+            str(output),
+            "--chunk-size",
+            "3",
+            "--frames-per-fit",
+            "3",
+            "--backend",
+            "numba",
+        ]
+    )
+
+    table = pq.read_table(output)
+    npt.assert_array_equal(table["frame"], np.arange(6))
+    npt.assert_allclose(table["stO2"], 84.034715681079630, rtol=1e-6)
+
+
+def test_bruno_checkpoint_resumes(tmp_path, capsys):
+    slope = np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=",")
+    np.savetxt(tmp_path / "slopes.csv", [slope] * 3, delimiter=",")
+    output = tmp_path / "fits.parquet"
+    checkpoint = tmp_path / "fits.ckpt"
+    argv = [
+        "bruno",
+        str(tmp_path / "slopes.csv"),
+        "--wavelengths",
+        str(BRUNO_DIR / "wavelengths.csv"),
+        "--extinction",
+        str(BRUNO_DIR / "extinctions.csv"),
+        "--distance",
+        "22.5",
+        "--output",
+        str(output),
+        "--chunk-size",
+        "2",
+        "--backend",
+        "numba",
+        "--checkpoint",
+        str(checkpoint),
+    ]
+
+    main(argv)
+    # Forget the second chunk, as if the job died while fitting it
+    manifest = json.loads((checkpoint / "manifest.json").read_text())
+    manifest["completed"] = [0]
+    (checkpoint / "manifest.json").write_text(json.dumps(manifest))
+    output.unlink()
+    capsys.readouterr()
+    main(argv)
+
+    assert "Processed 1 spectra" in capsys.readouterr().out
+    table = pq.read_table(output)
+    npt.assert_array_equal(table["frame"], np.arange(3))
+    npt.assert_allclose(table["stO2"], 84.034715681079630, rtol=1e-6)
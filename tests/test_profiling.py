@@ -0,0 +1,133 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from mms_nirs.BRUNO import Boundaries, BoundaryType, calc_values
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+from mms_nirs import profiling
+from mms_nirs.profiling import Profiler, profiled, stage
+
+TEST_DIR = Path(__file__).parent
+UCLN_DIR = TEST_DIR / "UCLN" / "test_data"
+BRUNO_DIR = TEST_DIR / "BRUNO" / "fixtures"
+
+
+@profiled("square")
+def square(x):
+    return x**2
+
+
+def test_records_counts_and_percentiles():
+    with Profiler() as profiler:
+        for i in range(10):
+            square(i)
+        with stage("block"):
+            square(2)
+
+    stats = profiler.to_dict(percentiles=(50, 95))
+    assert stats["square"]["count"] == 11
+    assert stats["block"]["count"] == 1
+    assert stats["square"]["p50_s"] <= stats["square"]["p95_s"]
+    assert stats["block"]["total_s"] >= 0
+    assert profiling._active is None
+
+
+def test_off_records_nothing():
+    profiler = Profiler()
+    square(3)
+    assert profiler.stages == {}
+
+
+def test_bytes_allocated_of_nested_stages():
+    with Profiler(track_memory=True) as profiler:
+        with stage("outer"):
+            with stage("inner"):
+                data = np.ones(2**20)
+            del data
+
+    stats = profiler.to_dict()
+    assert stats["inner"]["bytes_allocated"] >= 8 * 2**20
+    assert stats["outer"]["bytes_allocated"] >= 8 * 2**20
+
+
+def test_pipeline_stages_and_json(tmp_path):
+    spectra = np.genfromtxt(UCLN_DIR / "test_spectra.csv", delimiter=",")
+    wavelengths = np.genfromtxt(UCLN_DIR / "wavelengths.csv", delimiter=",")
+    defaults = DefaultValues()
+    ucln = UCLN(
+        UCLNConstants(
+            defaults.extinction_coefficients,
+            defaults.wavelength_dependency,
+            3,
+            "baby_head",
+            (780, 900),
+        )
+    )
+
+    with Profiler() as profiler:
+        ucln.calc_concentrations(spectra[:5], wavelengths)
+        calc_values(
+            np.genfromtxt(BRUNO_DIR / "slope.csv", delimiter=","),
+            np.genfromtxt(BRUNO_DIR / "extinctions.csv", delimiter=","),
+            np.genfromtxt(BRUNO_DIR / "wavelengths.csv", delimiter=","),
+            Boundaries.boundaries,
+            BoundaryType.ZBC,
+            22.5,
+        )
+
+    stats = json.loads(profiler.to_json(tmp_path / "profile.json"))
+    assert stats == json.loads((tmp_path / "profile.json").read_text())
+    for name in (
+        "UCLN.calc_concentrations",
+        "UCLN.interpolation",
+        "UCLN.pinv",
+        "calc_values",
+        "calc_values.score",
+        "fminsearchbnd",
+    ):
+        assert stats[name]["count"] == 1
+    assert stats["derivative_fit"]["count"] > 1
+    assert stats["fminsearchbnd"]["total_s"] <= stats["calc_values"]["total_s"]
+    assert (
+        stats["counters"]["objective_evaluations"]
+        == profiler.counters["objective_evaluations"]
+        == stats["derivative_fit"]["count"]
+    )
+
+
+@pytest.mark.parametrize("track_memory", [False, True])
+def test_profilers_nest(track_memory):
+    with Profiler(track_memory=track_memory) as outer:
+        square(1)
+        with Profiler() as inner:
+            square(2)
+        square(3)
+
+    assert outer.stages["square"].count == 2
+    assert inner.stages["square"].count == 1
+
+
+def test_json_of_stage_without_samples():
+    profiler = Profiler()
+    profiler.stages["empty"] = profiling.StageStats(profiler.history)
+
+    stats = json.loads(profiler.to_json(), parse_constant=pytest.fail)
+    assert stats["empty"]["count"] == 0
+    assert stats["empty"]["mean_s"] is None
+    assert stats["empty"]["p50_s"] is None
+
+
+def test_counters_round_trip_through_json():
+    with Profiler() as profiler:
+        profiling.count("screen.rejected", 3)
+        profiling.count("objective_evaluations")
+        profiling.count("objective_evaluations", 4)
+
+    stats = json.loads(profiler.to_json())
+    assert stats["counters"] == {
+        "objective_evaluations": 5,
+        "screen.rejected": 3,
+    }
+    assert stats == profiler.to_dict()
@@ -64,3 +64,36 @@ class TestAttenuationSlope:
         actual = calc_attenuation_slope(mock_attenuation, distances)
 
         npt.assert_array_almost_equal(expected, actual)
+
+
+class TestAttenuationDtype:
+    def test_float32_spectra(self):
+        rng = np.random.default_rng(0)
+        intensities = rng.integers(1000, 60000, (10, 64)).astype(np.uint16)
+
+        expected = calc_attenuation_spectra(intensities, intensities[0])
+        actual = calc_attenuation_spectra(
+            intensities, intensities[0], dtype=np.float32
+        )
+
+        assert expected.dtype == np.float64
+        assert actual.dtype == np.float32
+        npt.assert_allclose(actual, expected, atol=1e-6)
+
+    def test_float32_slope(self, mock_attenuation):
+        distances = np.array([1, 2, 3, 4])
+
+        expected = calc_attenuation_slope(mock_attenuation, distances)
+        actual = calc_attenuation_slope(
+            mock_attenuation, distances, dtype=np.float32
+        )
+
+        assert expected.dtype == np.float64
+        assert actual.dtype == np.float32
+        npt.assert_allclose(actual, expected, rtol=1e-6)
+        assert (
+            calc_attenuation_slope(
+                mock_attenuation.astype(np.float32), distances
+            ).dtype
+            == np.float32
+        )
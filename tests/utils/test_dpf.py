@@ -1,8 +1,16 @@
+import tracemalloc
+
 import numpy as np
 import numpy.testing as npt
 import pytest
 
-from mms_nirs.utils.dpf import calc_dpf, calc_mua, calc_mus
+from mms_nirs.utils.dpf import (
+    calc_dpf,
+    calc_dpf_series,
+    calc_mua,
+    calc_mus,
+    calc_optical_properties,
+)
 
 
 class TestDpf:
@@ -72,3 +80,158 @@ class TestMus:
         wavelengths = np.array([100.0, 101.0, 102.0])
         actual = calc_mus(a=a, b=b, wavelengths=wavelengths)
         npt.assert_array_almost_equal(actual, expected)
+
+
+class TestDpfSeries:
+    @pytest.fixture
+    def coefficients(self):
+        return np.array(
+            [
+                [0.99, 5.0, 20.0, 0.15, 2.5],
+                [0.97, 4.0, 25.0, 0.2, 2.0],
+                [np.nan] * 5,
+                [0.98, 6.0, 18.0, 0.25, 2.2],
+            ]
+        )
+
+    @pytest.fixture
+    def extinction(self):
+        wavelengths = np.arange(700.0, 905.0, 5.0)
+        return np.column_stack(
+            [
+                wavelengths,
+                np.linspace(3e-4, 1e-4, wavelengths.size),
+                np.linspace(5e-5, 2e-4, wavelengths.size),
+                np.linspace(1e-3, 3e-3, wavelengths.size),
+            ]
+        )
+
+    def test_matches_per_frame_dpf(self, coefficients, extinction):
+        actual = calc_dpf_series(coefficients, extinction, 30.0, chunk_size=3)
+
+        wavelengths = extinction[:, 0]
+        for frame, (water_frac, hhb, hbo2, a, b) in zip(actual, coefficients):
+            mu_a = calc_mua(
+                np.array([water_frac]),
+                np.array([hhb]),
+                np.array([hbo2]),
+                extinction,
+            )[0]
+            mu_s = a * (wavelengths * 0.001) ** -b
+            npt.assert_allclose(frame, calc_dpf(mu_s, mu_a, 30.0))
+        assert np.isnan(actual[2]).all()
+
+    def test_chunking_and_out(self, coefficients, extinction):
+        expected = calc_dpf_series(coefficients, extinction, 30.0)
+
+        out = np.zeros_like(expected)
+        actual = calc_dpf_series(
+            coefficients, extinction, 30.0, chunk_size=1, out=out
+        )
+
+        assert actual is out
+        npt.assert_array_equal(actual, expected)
+
+    def test_resamples_to_wavelengths(self, coefficients, extinction):
+        wavelengths = np.arange(780.0, 901.0)
+
+        actual = calc_dpf_series(
+            coefficients, extinction, 30.0, wavelengths=wavelengths
+        )
+
+        assert actual.shape == (4, wavelengths.size)
+        # Matches exactly on the extinction table's own wavelengths
+        full = calc_dpf_series(coefficients, extinction, 30.0)
+        npt.assert_allclose(actual[:, ::5], full[:, extinction[:, 0] >= 780])
+
+    def test_out_shape_mismatch(self, coefficients, extinction):
+        with pytest.raises(ValueError):
+            calc_dpf_series(
+                coefficients, extinction, 30.0, out=np.zeros((4, 3))
+            )
+
+
+class TestOpticalProperties:
+    @pytest.fixture
+    def coefficients(self):
+        return np.array(
+            [
+                [0.99, 5.0, 20.0, 0.15, 2.5],
+                [0.97, 4.0, 25.0, 0.2, 2.0],
+                [0.98, 6.0, 18.0, 0.25, 2.2],
+            ]
+            * 5
+        )
+
+    @pytest.fixture
+    def extinction(self):
+        wavelengths = np.arange(700.0, 905.0, 5.0)
+        return np.column_stack(
+            [
+                wavelengths,
+                np.linspace(3e-4, 1e-4, wavelengths.size),
+                np.linspace(5e-5, 2e-4, wavelengths.size),
+                np.linspace(1e-3, 3e-3, wavelengths.size),
+            ]
+        )
+
+    def test_matches_separate_calculations(self, coefficients, extinction):
+        water_frac, hhb, hbo2, a, b = coefficients.T
+        wavelengths = extinction[:, 0]
+        mua = calc_mua(water_frac, hhb, hbo2, extinction)
+        mus = a[:, np.newaxis] * (wavelengths * 0.001) ** -b[:, np.newaxis]
+
+        actual = calc_optical_properties(
+            coefficients,
+            extinction,
+            30.0,
+            chunk_size=4,
+            outputs=("mua", "mus", "dpf"),
+        )
+
+        npt.assert_allclose(actual.mua, mua)
+        npt.assert_allclose(actual.mus, mus)
+        npt.assert_allclose(actual.dpf, calc_dpf(mus, mua, 30.0))
+
+    def test_writes_to_buffers(self, coefficients, extinction):
+        shape = (coefficients.shape[0], extinction.shape[0])
+        mus_out = np.zeros(shape)
+        dpf_out = np.zeros(shape)
+
+        actual = calc_optical_properties(
+            coefficients,
+            extinction,
+            30.0,
+            chunk_size=4,
+            mus_out=mus_out,
+            dpf_out=dpf_out,
+        )
+
+        assert actual.mua is None
+        assert actual.mus is mus_out and actual.dpf is dpf_out
+        npt.assert_array_equal(
+            dpf_out, calc_dpf_series(coefficients, extinction, 30.0)
+        )
+
+    def test_float32(self, coefficients, extinction):
+        expected = calc_dpf_series(coefficients, extinction, 30.0)
+
+        actual = calc_optical_properties(
+            coefficients, extinction, 30.0, dtype=np.float32
+        ).dpf
+
+        assert actual.dtype == np.float32
+        npt.assert_allclose(actual, expected, rtol=1e-5)
+
+    def test_peak_memory_is_bounded_by_chunks(self, extinction):
+        coefficients = np.tile([0.99, 5.0, 20.0, 0.15, 2.5], (20000, 1))
+        dpf_out = np.empty((coefficients.shape[0], extinction.shape[0]))
+
+        tracemalloc.start()
+        calc_optical_properties(
+            coefficients, extinction, 30.0, chunk_size=500, dpf_out=dpf_out
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert peak < dpf_out.nbytes / 4
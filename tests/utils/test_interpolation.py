@@ -0,0 +1,146 @@
+import tracemalloc
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+from scipy.interpolate import interp1d, make_interp_spline
+
+from mms_nirs.UCLN import UCLN, DefaultValues, UCLNConstants
+from mms_nirs.utils.interpolation import (
+    SplineOperator,
+    SplineOperatorCache,
+    cubic_interpolation_matrix,
+    spline_operators,
+)
+
+
+@pytest.fixture
+def source():
+    # Non-uniform, non-integer grid like a real spectrometer
+    rng = np.random.default_rng(0)
+    return np.sort(rng.uniform(650.5, 950.5, 400))
+
+
+@pytest.fixture
+def target():
+    return np.arange(780.0, 901.0)
+
+
+class TestSplineOperator:
+    def test_matches_interp1d(self, source, target):
+        spectra = np.sin(source / np.array([[20.0], [35.0], [50.0]]))
+
+        actual = SplineOperator(source, target).apply(spectra)
+
+        expected = interp1d(source, spectra, kind="cubic")(target)
+        npt.assert_allclose(actual, expected, atol=1e-10)
+
+    def test_dense_matches_spline_of_identity(self, source, target):
+        operator = SplineOperator(source, target)
+
+        expected = make_interp_spline(source, np.eye(source.size), k=3)(target)
+        npt.assert_allclose(operator.todense(), expected, atol=1e-10)
+        npt.assert_allclose(
+            cubic_interpolation_matrix(source, target), expected, atol=1e-10
+        )
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+    def test_chunked_apply_into_out(self, source, target, chunk_size):
+        operator = SplineOperator(source, target)
+        spectra = np.sin(source / np.arange(10, 20)[:, np.newaxis])
+        expected = spectra @ operator.todense().T
+
+        out = np.empty((spectra.shape[0], target.size), np.float32)
+        actual = operator.apply(spectra, out=out, chunk_size=chunk_size)
+
+        assert actual is out
+        npt.assert_allclose(actual, expected, rtol=1e-6, atol=1e-6)
+        npt.assert_allclose(operator.apply(spectra[0]), expected[0])
+        with pytest.raises(ValueError):
+            operator.apply(spectra, out=np.empty((10, 3)))
+
+    def test_fold(self, source, target):
+        operator = SplineOperator(source, target)
+        left = np.random.default_rng(1).normal(size=(3, target.size))
+
+        npt.assert_allclose(
+            operator.fold(left), left @ operator.todense(), atol=1e-10
+        )
+
+    def test_scales_with_grids_not_their_product(self):
+        # A high resolution spectrometer
+        source = np.linspace(500.0, 1100.0, 8000)
+        operator = SplineOperator(source, np.arange(780.0, 901.0))
+        spectra = np.cos(source / 40.0)[np.newaxis].repeat(256, axis=0)
+        out = np.empty((256, 121))
+
+        tracemalloc.start()
+        operator.apply(spectra, out=out, chunk_size=8)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        dense_bytes = 121 * source.size * 8
+        assert operator.nbytes < dense_bytes / 10
+        assert peak < dense_bytes / 4
+        npt.assert_allclose(
+            out[0], np.cos(np.arange(780.0, 901.0) / 40.0), atol=1e-9
+        )
+
+    def test_factors_are_smaller_than_dense(self, source, target):
+        operator = SplineOperator(source, target)
+
+        assert operator.shape == (target.size, source.size)
+        assert operator.nbytes < target.size * source.size * 8 / 10
+
+
+class TestSplineOperatorCache:
+    def test_hits_misses_and_eviction(self, source, target):
+        cache = SplineOperatorCache(maxsize=2)
+
+        first = cache.get(source, target)
+        assert cache.get(source.copy(), target) is first
+        cache.get(source, target[:10])
+        cache.get(source, target)  # Most recently used again
+        cache.get(source, target[:20])  # Evicts target[:10]
+
+        assert (cache.hits, cache.misses, len(cache)) == (2, 3, 2)
+        assert cache.get(source, target) is first
+        cache.get(source, target[:10])
+        assert cache.misses == 4
+        stats = cache.stats()
+        assert stats["size"] == 2 and stats["nbytes"] > 0
+
+        cache.clear()
+        assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+    def test_shared_across_ucln_instances(self, source):
+        defaults = DefaultValues()
+        constants = UCLNConstants(
+            defaults.extinction_coefficients,
+            defaults.wavelength_dependency,
+            3,
+            "baby_head",
+            (780, 900),
+        )
+        spectra = 1000 + np.cos(source / np.arange(1, 6)[:, np.newaxis])
+        spline_operators.clear()
+
+        UCLN(constants).calc_concentrations(spectra, source)
+        UCLN(constants).calc_concentrations(spectra, source)
+
+        assert spline_operators.misses == 1
+        assert spline_operators.hits == 1
+
+    def test_ucln_rejects_extrapolation(self, source):
+        defaults = DefaultValues()
+        constants = UCLNConstants(
+            defaults.extinction_coefficients,
+            defaults.wavelength_dependency,
+            3,
+            "baby_head",
+            (780, 900),
+        )
+        spectra = np.ones((3, 50))
+
+        with pytest.raises(ValueError):
+            UCLN(constants).calc_concentrations(spectra, source[:50])
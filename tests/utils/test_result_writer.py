@@ -0,0 +1,147 @@
+import numpy as np
+import numpy.testing as npt
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from mms_nirs.BRUNO import Boundaries
+from mms_nirs.utils.result_writer import (
+    FIT_COLUMNS,
+    ConcentrationWriter,
+    FitWriter,
+    read_results,
+    residual_matrix,
+)
+
+
+@pytest.fixture
+def fits():
+    rng = np.random.default_rng(0)
+    T, W = 10, 6
+    return {
+        "stO2": rng.uniform(60, 80, T),
+        "coefficients": rng.uniform(0, 1, (T, 5)),
+        "sum_residual": rng.uniform(0, 1, T),
+        "score": rng.uniform(0, 1, T),
+        "residual": rng.uniform(0, 1, (T, W)),
+        "residual_norm": rng.uniform(0, 1, (T, W)),
+    }
+
+
+class TestConcentrationWriter:
+    def test_appends_in_row_groups(self, tmp_path):
+        conc = np.arange(30.0).reshape(10, 3)
+        path = tmp_path / "conc.parquet"
+
+        with ConcentrationWriter(path, ["HbO2", "HHb", "CCO"], 4) as writer:
+            for block in np.split(conc, 5):
+                writer.write(block, channel="A")
+
+        table = read_results(path)
+        assert pq.ParquetFile(path).num_row_groups == 3
+        npt.assert_array_equal(table["frame"], np.arange(10))
+        npt.assert_array_equal(table["HHb"], conc[:, 1])
+        assert table["channel"].to_pylist() == ["A"] * 10
+
+    def test_frames_counted_per_channel(self, tmp_path):
+        path = tmp_path / "conc.parquet"
+        with ConcentrationWriter(path, ["HbO2"]) as writer:
+            for _ in range(2):
+                writer.write(np.ones((2, 1)), channel="A")
+                writer.write(np.ones((3, 1)), channel="B")
+
+        table = read_results(path)
+        assert table["frame"].to_pylist() == [0, 1, 0, 1, 2, 2, 3, 3, 4, 5]
+        npt.assert_array_equal(
+            read_results(path, channel="B")["frame"], np.arange(6)
+        )
+
+    def test_reads_selected_channel_and_columns(self, tmp_path):
+        path = tmp_path / "conc.parquet"
+        with ConcentrationWriter(path, ["HbO2"]) as writer:
+            writer.write(
+                np.ones((2, 1)), time=np.array([0.0, 0.1]), channel="A"
+            )
+            writer.write(np.zeros((3, 1)), channel="B")
+
+        table = read_results(path, columns=["HbO2"], channel="B")
+        assert table.column_names == ["HbO2"]
+        npt.assert_array_equal(table["HbO2"], np.zeros(3))
+
+
+class TestFitWriter:
+    def test_columns_follow_boundaries(self):
+        assert list(FIT_COLUMNS) == Boundaries.columns
+
+    def test_drops_residuals_by_default(self, tmp_path, fits):
+        path = tmp_path / "fits.parquet"
+        with FitWriter(path) as writer:
+            writer.write_batch(
+                fits["stO2"],
+                fits["coefficients"],
+                fits["sum_residual"],
+                fits["score"],
+                fits["residual"],
+            )
+
+        table = read_results(path)
+        assert "residual" not in table.column_names
+        npt.assert_array_equal(table["stO2"], fits["stO2"])
+        npt.assert_array_equal(table["b"], fits["coefficients"][:, 4])
+
+    def test_round_trips_residuals(self, tmp_path, fits):
+        path = tmp_path / "fits.parquet"
+        with FitWriter(path, n_wavelengths=6) as writer:
+            for i in range(len(fits["stO2"])):
+                writer.write_fit(
+                    fits["stO2"][i],
+                    fits["coefficients"][i],
+                    fits["residual"][i],
+                    fits["residual_norm"][i],
+                    fits["sum_residual"][i],
+                    fits["score"][i],
+                )
+
+        table = read_results(path, columns=["residual"])
+        npt.assert_allclose(
+            residual_matrix(table), fits["residual"], rtol=1e-6
+        )
+        assert pq.ParquetFile(path).num_row_groups == 1
+
+    def test_residuals_of_chunks_without_them_are_nan(self, tmp_path, fits):
+        path = tmp_path / "fits.parquet"
+        with FitWriter(path, n_wavelengths=6) as writer:
+            for rows, residual in (
+                (slice(0, 4), fits["residual"][:4]),
+                (slice(4, 7), None),
+                (slice(7, 10), fits["residual"][7:]),
+            ):
+                writer.write_batch(
+                    fits["stO2"][rows],
+                    fits["coefficients"][rows],
+                    fits["sum_residual"][rows],
+                    fits["score"][rows],
+                    residual,
+                )
+
+        residuals = residual_matrix(read_results(path))
+        expected = fits["residual"].copy()
+        expected[4:7] = np.nan
+        assert residuals.shape == (10, 6)
+        npt.assert_allclose(residuals, expected, rtol=1e-6)
+
+    def test_null_residual_rows_are_nan(self):
+        residual_type = pa.list_(pa.float32(), 3)
+        residuals = pa.concat_arrays(
+            [
+                pa.FixedSizeListArray.from_arrays(
+                    pa.array(np.arange(6, dtype=np.float32)), 3
+                ),
+                pa.nulls(1, residual_type),
+            ]
+        )
+
+        matrix = residual_matrix(pa.table({"residual": residuals}))
+        npt.assert_array_equal(
+            matrix, [[0, 1, 2], [3, 4, 5], [np.nan, np.nan, np.nan]]
+        )